@@ -26,6 +26,21 @@ Example usage scenarios are supplied with this package, e.g.
     spec.then(spec.send_notification())
     spec.should_collaborate_with(observer.notify(observable))
     
+- counting calls to a real collaborator, e.g. to catch N+1 queries:
+    spy = lancelot.SpySpec(database)
+    spec = lancelot.Spec(Report(spy))
+    spec.when(spec.summarise(ids))
+    spy.query.should_be_called(at_most=1)
+
+- statistical timings of an action (see lancelot.benchmarking):
+    spec = lancelot.Spec(parser)
+    spec.benchmark(spec.parse(payload)).should_have(p99 < 2 * ms)
+
+- throughput of an action under concurrent load (see lancelot.loadtesting):
+    spec = lancelot.Spec(cache)
+    spec.under_load(spec.get(key), workers=8, duration=0.5, each=value)
+    spec.should_sustain(ops_per_sec > 10000, p99 < 1 * ms)
+
 Additional ways to specify argument or return values in collaborations or 
     constraints are available in the lancelot.comparators sub-package. 
     
@@ -36,8 +51,9 @@ Copyright 2009 by the author(s). All rights reserved
 
 __version__ = "1.0"
 
-from lancelot.specification import MockSpec, Spec
-from lancelot.verification import grouping, verifiable, verify
+from lancelot.specification import MockSpec, Spec, SpySpec
+from lancelot.verification import grouping, verifiable, verify, verify_iter
 
-__all__ = ['MockSpec', 'Spec', 'grouping', 'verifiable', 'verify']
+__all__ = ['MockSpec', 'Spec', 'SpySpec', 'grouping', 'verifiable', 'verify',
+           'verify_iter']
 
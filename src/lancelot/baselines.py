@@ -0,0 +1,276 @@
+'''
+Functionality for storing the timings measured by spec.benchmark() as
+baselines (in a JSON file that can be versioned with the code), and for
+failing a benchmark only if it is significantly slower than its baseline,
+e.g. record baselines with
+    AllVerifiable([ConsoleListener(), BaselineStore('benchmarks.json',
+                                                    mode='record')])
+and later compare with them, reporting regressions and improvements, with
+    AllVerifiable([ConsoleListener(), BaselineStore('benchmarks.json')])
+The file is only written when recording: benchmarks with no baseline yet
+are reported as new when comparing, until they are recorded.
+
+Benchmarks are checked within the verifying process, so a BaselineStore
+refuses (with a ValueError) to listen to a run using an isolated executor
+(see lancelot.execution), whose benchmarks it would never see.
+
+A benchmark has regressed when a one-sided Mann-Whitney U test finds its
+samples slower than the baseline's with p < alpha, and its median is
+slower by more than min_effect (a fraction of the baseline median).
+Improvements are found in the same way. Each benchmark is keyed by the
+qualified name of the verifiable function measuring it (followed by its
+name, or a count if there are several in the function).
+
+Intended public interface:
+ Classes: BaselineStore, Comparison
+ Functions: mann_whitney_u()
+ Variables: MODES
+
+Intended for internal use:
+ Functions: active(), check_baseline()
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import collections
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from lancelot.verification import UnmetSpecification, qualified_name, \
+                                  running
+
+MODES = ('compare', 'record')
+
+Comparison = collections.namedtuple(
+    'Comparison', 'key status baseline_median median change p_value')
+Comparison.__doc__ = ''' The comparison of a benchmark with its baseline.
+status is 'regressed', 'improved', 'unchanged', 'new' (no baseline) or
+'recorded'; change is the relative change in median (0.1 is 10% slower)
+and p_value that of the test for a change in that direction. '''
+
+_ACTIVE = []  # the BaselineStores of the verification runs in progress
+_ACTIVE_LOCK = threading.Lock()
+
+
+def mann_whitney_u(samples, baseline_samples):
+    ''' (U statistic, one-sided p-value) of the Mann-Whitney U test that
+    samples tend to be greater than baseline_samples, using the normal
+    approximation with continuity and tie corrections '''
+    n1 = len(samples)
+    n2 = len(baseline_samples)
+    if not n1 or not n2:
+        raise ValueError('both sets of samples are needed')
+    combined = sorted([(value, 0) for value in samples]
+                      + [(value, 1) for value in baseline_samples])
+    rank_sum = 0.0
+    ties = 0.0
+    start = 0
+    while start < len(combined):
+        end = start
+        while end + 1 < len(combined) \
+        and combined[end + 1][0] == combined[start][0]:
+            end += 1
+        count = end - start + 1
+        rank = (start + end) / 2.0 + 1
+        rank_sum += rank * sum(1 for _, group in combined[start:end + 1]
+                               if group == 0)
+        ties += count ** 3 - count
+        start = end + 1
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1.0)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2.0 - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def active():
+    ''' The BaselineStore of the verification run in progress, or None '''
+    with _ACTIVE_LOCK:
+        return _ACTIVE[-1] if _ACTIVE else None
+
+
+def check_baseline(result, name=None):
+    ''' Check a BenchmarkResult against the active BaselineStore, if any.
+    Returns the result, unless it has significantly regressed. '''
+    store = active()
+    if store is not None:
+        store.check(result, name)
+    return result
+
+
+class BaselineStore:
+    ''' Listener that, during a verification run, records the samples of
+    each spec.benchmark() as its baseline or compares them with the stored
+    baseline, then saves the baselines and reports the comparisons '''
+
+    def __init__(self, path, mode='compare', alpha=0.01, min_effect=0.05,
+                 output=sys.stdout):
+        ''' path is the JSON file of baselines. mode is one of MODES:
+        'compare' fails benchmarks that have regressed (and reports those
+        with no baseline yet as new), 'record' replaces every baseline.
+        alpha is the significance level and min_effect the smallest
+        relative change in median regarded as a regression (or
+        improvement). The report is written to output (if not None). '''
+        if mode not in MODES:
+            msg = 'mode %r is not one of %s' % (mode, ', '.join(MODES))
+            raise ValueError(msg)
+        self._path = path
+        self._mode = mode
+        self._alpha = alpha
+        self._min_effect = min_effect
+        self._output = output
+        self._lock = threading.Lock()
+        self._baselines = {}
+        self._keys = set()
+        self._is_changed = False
+        self.comparisons = []
+
+    def all_verifiable_starting(self, all_verifiable):
+        ''' A verification run is starting: check benchmarks against this,
+        unless they are verified outside of the verifying process '''
+        executor = all_verifiable.executor()
+        if getattr(executor, 'isolated', False):
+            msg = 'benchmarks verified by %s cannot be checked against ' \
+                  'baselines in the verifying process'
+            raise ValueError(msg % type(executor).__name__)
+        self.start()
+
+    def all_verifiable_ending(self, all_verifiable, outcome):
+        ''' A verification run is ending: save any baselines recorded and
+        report the comparisons '''
+        self.finish()
+        if self._output is not None:
+            self.report(self._output)
+
+    def __getattr__(self, name):
+        ''' Ignore other verification messages '''
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args: None
+
+    def start(self):
+        ''' Load the baselines, and check benchmarks against them until
+        finish() is called '''
+        self._baselines = self._load()
+        self._keys = set()
+        self._is_changed = False
+        self.comparisons = []
+        with _ACTIVE_LOCK:
+            _ACTIVE.append(self)
+
+    def finish(self):
+        ''' Stop checking benchmarks, and save the baselines if recording '''
+        with _ACTIVE_LOCK:
+            if self in _ACTIVE:
+                _ACTIVE.remove(self)
+        if self._is_changed:
+            self._save()
+
+    def check(self, result, name=None):
+        ''' Record or compare a BenchmarkResult, raising UnmetSpecification
+        if it has significantly regressed from its baseline '''
+        comparison = self._compare(self._key(name), result)
+        with self._lock:
+            self.comparisons.append(comparison)
+        if comparison.status == 'regressed':
+            msg = 'should not be slower than baseline: %s' % \
+                _describe(comparison)
+            raise UnmetSpecification(msg)
+
+    def report(self, output=sys.stdout):
+        ''' Write the regressions and improvements found to output '''
+        for status in ('regressed', 'improved'):
+            for comparison in self.comparisons:
+                if comparison.status == status:
+                    print('%s: %s' % (status, _describe(comparison)),
+                          file=output)
+        counts = collections.Counter(comparison.status
+                                     for comparison in self.comparisons)
+        print('Benchmarks: %s' % ', '.join('%d %s' % (count, status)
+                                           for status, count
+                                           in sorted(counts.items())),
+              file=output)
+
+    def _key(self, name):
+        ''' The key of a benchmark in the verifiable being verified '''
+        verification = running()
+        base = name or 'benchmark'
+        if verification is not None:
+            base = qualified_name(verification[1])
+            if name:
+                base = '%s:%s' % (base, name)
+        with self._lock:
+            key = base
+            count = 1
+            while key in self._keys:
+                count += 1
+                key = '%s#%d' % (base, count)
+            self._keys.add(key)
+        return key
+
+    def _compare(self, key, result):
+        ''' Compare a result with its baseline, recording it if need be '''
+        current = statistics.median(result.samples)
+        with self._lock:
+            baseline = self._baselines.get(key)
+            if self._mode == 'record':
+                self._record(key, result)
+                return Comparison(key, 'recorded', None, current, None, None)
+            if baseline is None:
+                return Comparison(key, 'new', None, current, None, None)
+        baseline_samples = baseline['samples']
+        baseline_median = statistics.median(baseline_samples)
+        change = current / baseline_median - 1 if baseline_median else 0.0
+        if change >= 0:
+            _, p_value = mann_whitney_u(result.samples, baseline_samples)
+            is_significant = change > self._min_effect
+            status = 'regressed'
+        else:
+            _, p_value = mann_whitney_u(baseline_samples, result.samples)
+            is_significant = -change > self._min_effect
+            status = 'improved'
+        if not is_significant or p_value >= self._alpha:
+            status = 'unchanged'
+        return Comparison(key, status, baseline_median, current, change,
+                          p_value)
+
+    def _record(self, key, result):
+        ''' Make a result the baseline for key '''
+        self._baselines[key] = {'samples': list(result.samples),
+                                'iterations': result.iterations,
+                                'recorded': time.strftime('%Y-%m-%d'),
+                                'python': platform.python_version()}
+        self._is_changed = True
+
+    def _load(self):
+        ''' The stored baselines, {key: baseline} '''
+        if not os.path.exists(self._path):
+            return {}
+        with open(self._path, encoding='utf-8') as stored:
+            return json.load(stored).get('benchmarks', {})
+
+    def _save(self):
+        ''' Store the baselines (atomically, sorted for readable diffs) '''
+        directory = os.path.dirname(os.path.abspath(self._path))
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as stored:
+            json.dump({'version': 1, 'benchmarks': self._baselines}, stored,
+                      indent=1, sort_keys=True)
+            stored.write('\n')
+        os.replace(temp_path, self._path)
+
+
+def _describe(comparison):
+    ''' Describe the change in a benchmark from its baseline '''
+    return '%s median %.3gs -> %.3gs (%+.1f%%, p=%.2g)' % \
+        (comparison.key, comparison.baseline_median, comparison.median,
+         comparison.change * 100, comparison.p_value)
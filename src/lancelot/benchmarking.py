@@ -0,0 +1,181 @@
+'''
+Functionality for measuring how long an action takes, statistically,
+so that timings can be specified without one noisy measurement deciding
+the outcome, e.g.
+    spec = Spec(Parser())
+    spec.benchmark(spec.parse(payload)).should_have(p99 < 2 * ms)
+    spec.benchmark(spec.parse(payload)).should_have(median=LessThan(1 * ms))
+
+The action is called in batches of calibrated size, so that each batch
+takes long enough to time accurately, after some warmup batches whose
+timings are discarded. Each sample is the mean time per call in a batch.
+
+Intended public interface:
+ Classes: BenchmarkResult, Statistic
+ Functions: measure(), percentile()
+ Variables: minimum, maximum, mean, median, stddev, p90, p99 [Statistics
+     used as e.g. "p99 < 2 * ms"], s, ms, us, ns [units of time, in seconds]
+
+Intended for internal use:
+ -
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import gc
+import math
+import time
+
+from lancelot.comparators import AttributeValue, GreaterThan, \
+                                 GreaterThanOrEqual, LessThan, LessThanOrEqual
+
+s = 1.0
+ms = 1e-3
+us = 1e-6
+ns = 1e-9
+
+
+class BenchmarkResult:
+    ''' The samples (mean seconds per call, in each batch) measured for an
+    action, and statistics derived from them '''
+
+    def __init__(self, samples, iterations):
+        ''' samples measured in batches of iterations calls '''
+        if not samples:
+            raise ValueError('a benchmark needs at least one sample')
+        self.samples = list(samples)
+        self.iterations = iterations
+        self._sorted = sorted(self.samples)
+        self.min = self._sorted[0]
+        self.max = self._sorted[-1]
+        self.mean = math.fsum(self.samples) / len(self.samples)
+        self.median = self.percentile(50)
+        self.p90 = self.percentile(90)
+        self.p99 = self.percentile(99)
+        variance = 0.0
+        if len(self.samples) > 1:
+            variance = math.fsum((sample - self.mean) ** 2
+                                 for sample in self.samples) \
+                       / (len(self.samples) - 1)
+        self.stddev = math.sqrt(variance)
+
+    def percentile(self, q):
+        ''' The q-th percentile of the samples (interpolated linearly) '''
+        if not 0 <= q <= 100:
+            raise ValueError('percentile %r is not within 0..100' % (q,))
+        position = (len(self._sorted) - 1) * q / 100.0
+        lower = math.floor(position)
+        upper = min(lower + 1, len(self._sorted) - 1)
+        fraction = position - lower
+        return self._sorted[lower] \
+            + (self._sorted[upper] - self._sorted[lower]) * fraction
+
+    def __repr__(self):
+        ''' Summarise the statistics, in a form useful in unmet messages '''
+        return '<benchmark of %d samples x %d calls: min %s, median %s, ' \
+               'p90 %s, p99 %s, max %s, stddev %s>' % \
+               (len(self.samples), self.iterations,
+                _format_seconds(self.min), _format_seconds(self.median),
+                _format_seconds(self.p90), _format_seconds(self.p99),
+                _format_seconds(self.max), _format_seconds(self.stddev))
+
+
+def _format_seconds(seconds):
+    ''' Seconds in the most readable unit '''
+    for unit, name in ((s, 's'), (ms, 'ms'), (us, 'us')):
+        if seconds >= unit:
+            return '%.3g%s' % (seconds / unit, name)
+    return '%.3gns' % (seconds / ns)
+
+
+def measure(action, samples=100, warmup=5, min_batch_time=1 * ms,
+            max_iterations=1000000, disable_gc=True,
+            timer=time.perf_counter):
+    ''' Call action repeatedly, returning a BenchmarkResult of samples
+    batches. The number of calls in each batch is calibrated so that a
+    batch takes at least min_batch_time (up to max_iterations calls), and
+    warmup batches are run, but not measured, first. If disable_gc is True
+    (as in timeit) then garbage collection is disabled while measuring. '''
+    gc_was_enabled = gc.isenabled()
+    if disable_gc:
+        gc.disable()
+    try:
+        iterations = _calibrate(action, min_batch_time, max_iterations,
+                                timer)
+        for _ in range(warmup):
+            _time_batch(action, iterations, timer)
+        measured = [_time_batch(action, iterations, timer) / iterations
+                    for _ in range(samples)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return BenchmarkResult(measured, iterations)
+
+
+def _calibrate(action, min_batch_time, max_iterations, timer):
+    ''' The number of calls to action taking at least min_batch_time '''
+    iterations = 1
+    while iterations < max_iterations:
+        elapsed = _time_batch(action, iterations, timer)
+        if elapsed >= min_batch_time:
+            break
+        if elapsed <= 0:
+            iterations *= 10
+        else:
+            iterations = int(iterations * min(10, max(
+                2, 1.2 * min_batch_time / elapsed)))
+    return min(iterations, max_iterations)
+
+
+def _time_batch(action, iterations, timer):
+    ''' Seconds taken to call action iterations times '''
+    calls = range(iterations)
+    started = timer()
+    for _ in calls:
+        action()
+    return timer() - started
+
+
+class Statistic:
+    ''' A named statistic of a BenchmarkResult that comparisons can be made
+    against in should_have(), e.g. "p99 < 2 * ms" '''
+
+    def __init__(self, name, value_of=None):
+        ''' value_of(result) is the statistic's value, by default the
+        attribute of the BenchmarkResult with the same name '''
+        self._name = name
+        self._value_of = value_of
+
+    def _compare(self, comparator):
+        ''' A comparator of this statistic of a result '''
+        return AttributeValue(self._name, comparator, self._value_of)
+
+    def __lt__(self, limit):
+        ''' The statistic should be < limit '''
+        return self._compare(LessThan(limit))
+
+    def __le__(self, limit):
+        ''' The statistic should be <= limit '''
+        return self._compare(LessThanOrEqual(limit))
+
+    def __gt__(self, limit):
+        ''' The statistic should be > limit '''
+        return self._compare(GreaterThan(limit))
+
+    def __ge__(self, limit):
+        ''' The statistic should be >= limit '''
+        return self._compare(GreaterThanOrEqual(limit))
+
+
+def percentile(q):
+    ''' The Statistic for the q-th percentile, e.g. percentile(99.9) '''
+    return Statistic('p%s' % q, lambda result: result.percentile(q))
+
+
+minimum = Statistic('min')
+maximum = Statistic('max')
+mean = Statistic('mean')
+median = Statistic('median')
+stddev = Statistic('stddev')
+p90 = Statistic('p90')
+p99 = Statistic('p99')
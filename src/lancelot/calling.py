@@ -2,19 +2,19 @@
 Functionality for wrapping / deferring / mocking __call__() invocations 
 
 Intended public interface:
- Classes: WrapFunction, MockCall
+ Classes: WrapFunction, MockCall, SpyCall
  Functions: -
  Variables: -
 
 Intended for internal use:
  Classes: MockResult
- Functions: _format_args()
+ Functions: _format_args(), argument_items()
 
 Copyright 2009 by the author(s). All rights reserved 
 '''
 
 from lancelot.verification import UnmetSpecification
-import logging, types
+import functools, logging, threading, time, types
 
 class WrapFunction:
     ''' Wraps a callable that is invoked later for its result() '''
@@ -45,6 +45,15 @@ class WrapFunction:
             return call(*self._args, **self._kwds)
         return self._target(*self._args, **self._kwds)
 
+    def deferred(self):
+        ''' A callable performing the invocation without logging it, for
+        repeated invocations (e.g. when benchmarking) '''
+        if self._name:
+            call = getattr(self._target, self._name)
+        else:
+            call = self._target
+        return functools.partial(call, *self._args, **self._kwds)
+
 def _format_args(args, kwds):
     ''' Format args for prettier display '''
     formatted_args = ['%s' % repr(arg) for arg in args]
@@ -55,14 +64,23 @@ def _format_args(args, kwds):
 class MockCall:
     ''' Wraps an instance of a collaboration for a Mock Specification '''
       
-    def __init__(self, mock_spec, name):
+    def __init__(self, mock_spec, name, lock=None):
         ''' An instance is created by a "mock_spec" for a given method "name" 
-        A default instance will_return(None), and expects invocation once() '''
+        A default instance will_return(None), and expects invocation once().
+        lock (by default, its own) guards its state in collaboration mode,
+        so that it may be collaborated with from several threads '''
         self._mock_spec = mock_spec
         self._name = name
         self._specified_args = ()
         self._specified_kwds = {}
         self._specified_result = MockResult(self)
+        self._durations = [0]
+        self._lock = lock or threading.RLock()
+        self._max_concurrent = None
+        self._min_concurrent = None
+        self._in_flight = 0
+        self.max_in_flight = 0
+        self._unmet = None
         
     def __call__(self, *args, **kwds):
         ''' Receive the args specified in a should_collaborate() block 
@@ -87,6 +105,26 @@ class MockCall:
         self._specified_result.raises(*exceptions)
         return self
     
+    def will_take(self, *seconds):
+        ''' Specify the time the collaboration takes: the mock spec's
+        clock is advanced (instantly, for a VirtualClock) when it occurs.
+        If a list of values is given they will be iterated over on each
+        occasion the collaboration occurs, otherwise the same value will be
+        used every time. Raises ValueError if the mock spec has no clock. '''
+        self._mock_spec.virtual_clock()
+        self._durations = list(seconds)
+        return self
+
+    def concurrently(self, at_most=None, at_least=None):
+        ''' Specify that at most at_most occasions of the collaboration
+        (from different threads, or tasks) should be in progress at once,
+        and that at some point at least at_least should be, e.g. to check
+        that asynchronous calls are issued concurrently rather than awaited
+        one after another '''
+        self._max_concurrent = at_most
+        self._min_concurrent = at_least
+        return self
+
     def once(self):
         ''' Specify that the collaboration will happen once (the default) '''
         return self.times(1)
@@ -121,26 +159,103 @@ class MockCall:
             raise UnmetSpecification(msg)
         return self._current_result
     
+    def matches(self, name, args, kwds):
+        ''' Whether a collaboration, name(*args, **kwds), is as specified '''
+        return name == self._name \
+            and self._mock_spec.comparable_args(self._specified_args) == args \
+            and self._mock_spec.comparable_kwds(self._specified_kwds) == kwds
+
+    def unmet_description(self, name, args, kwds):
+        ''' Describe the unmet specification of a collaboration '''
+        return '%s, not %s.%s%s' % (self.description(),
+                                    self._mock_spec.name(),
+                                    name,
+                                    _format_args(args, kwds))
+
     def _verify(self, *args, **kwds):
         ''' Check that the collaboration is as specified '''
-        if self._mock_spec.comparable_args(self._specified_args) != args \
-        or self._mock_spec.comparable_kwds(self._specified_kwds) != kwds:
-            supplied = _format_args(args, kwds)
-            msg = '%s, not %s.%s%s' % (self.description(), 
-                                       self._mock_spec.name(), 
-                                       self._name, 
-                                       supplied)
+        if not self.matches(self._name, args, kwds):
+            msg = self.unmet_description(self._name, args, kwds)
             raise UnmetSpecification(msg)
 
     def _current_result(self, *args, **kwds):
         ''' The current will_return value for this collaboration '''
-        self._verify(*args, **kwds)
+        with self._lock:
+            self._verify(*args, **kwds)
+            outcome = self.consume()
+        return self.deliver(outcome)
+
+    def consume(self):
+        ''' Consume an occasion of the (verified) collaboration, returning
+        its outcome for deliver(). Call with the lock held. '''
         try:
-            result = self._specified_result.next()
-            return result
+            result = self._specified_result.next_outcome()
         finally:
             if self._specified_result.times_remaining() == 0:
                 self._mock_spec.collaboration_over(self)
+        duration = self._durations[0]
+        if len(self._durations) > 1:
+            self._durations.pop(0)
+        return result + (duration,)
+
+    def deliver(self, outcome):
+        ''' Take the time specified for an occasion of the collaboration
+        (without the lock held), then return or raise its outcome '''
+        is_raising, value, duration = outcome
+        self._begin()
+        try:
+            if duration:
+                self._mock_spec.virtual_clock().advance(duration)
+        finally:
+            self._end()
+        if is_raising:
+            raise value
+        return value
+
+    async def deliver_async(self, outcome):
+        ''' As deliver(), but awaitable: the time is taken by sleeping in
+        the event loop (which takes no real time in a VirtualClock's
+        event_loop()). It always yields to the event loop, so that other
+        occasions can be in progress at the same time even if it takes no
+        time. '''
+        import asyncio  # already imported by the running event loop
+        is_raising, value, duration = outcome
+        self._begin()
+        try:
+            await asyncio.sleep(duration or 0)
+        finally:
+            self._end()
+        if is_raising:
+            raise value
+        return value
+
+    def _begin(self):
+        ''' An occasion of the collaboration is starting '''
+        with self._lock:
+            if self._max_concurrent is not None \
+            and self._in_flight >= self._max_concurrent:
+                self._unmet = '%s at most %d at once, not %d' % \
+                    (self.description(), self._max_concurrent,
+                     self._in_flight + 1)
+                raise UnmetSpecification(self._unmet)
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    def _end(self):
+        ''' An occasion of the collaboration has finished '''
+        with self._lock:
+            self._in_flight -= 1
+
+    def verify_concurrency(self):
+        ''' Check that the collaboration was never in progress too many
+        times at once, nor too few '''
+        if self._unmet is not None:
+            raise UnmetSpecification(self._unmet)
+        if self._min_concurrent is not None \
+        and self.max_in_flight < self._min_concurrent:
+            msg = '%s at least %d at once, not %d' % \
+                (self.description(), self._min_concurrent, self.max_in_flight)
+            raise UnmetSpecification(msg)
 
 class MockResult:
     ''' Class responsible for supplying result values for a MockCall '''
@@ -184,11 +299,109 @@ class MockResult:
     
     def next(self):
         ''' Supply the next result value '''
+        is_raising, next_value = self.next_outcome()
+        if is_raising:
+            raise next_value
+        return next_value
+
+    def next_outcome(self):
+        ''' The next result value, as (whether it is raised, value) '''
         if self.times_remaining() == 0:
             msg = '%s only %s successive times' % \
                 (self._mock_call.description(), self.specified_times())
             raise UnmetSpecification(msg)
-        next_value = self._values.pop(0)
-        if self._is_raising:
-            raise next_value
-        return next_value
\ No newline at end of file
+        return self._is_raising, self._values.pop(0)
+
+def argument_items(args, kwds):
+    ''' The number of items in args: the length of each sized arg (other
+    than strings), or 1 for any other arg '''
+    items = 0
+    for arg in args + tuple(kwds.values()):
+        if isinstance(arg, (str, bytes)) or not hasattr(arg, '__len__'):
+            items += 1
+        else:
+            items += len(arg)
+    return items
+
+class SpyCall:
+    ''' Wraps a method of the real object spied on by a SpySpec, forwarding
+    each call to it while recording (cheaply) how often it's called, the
+    argument items supplied and the time taken '''
+
+    def __init__(self, spy_name, target, name, record=None):
+        ''' An instance is created by a SpySpec (named spy_name, for
+        messages) for a method "name" of its target. record(name, args,
+        kwds, outcome, raised), if not None, is also called after each call
+        with its outcome: the result it returned or (if raised) the
+        exception it raised '''
+        self._spy_name = spy_name
+        self._target = target
+        self._name = name
+        self._record = record
+        self.reset()
+
+    def reset(self):
+        ''' Forget the calls recorded so far '''
+        self.calls = 0
+        self.duration = 0.0
+        self.max_duration = 0.0
+        self.items = 0
+        self.max_items = 0
+
+    def __call__(self, *args, **kwds):
+        ''' Forward a call to the real method, recording it '''
+        items = argument_items(args, kwds)
+        outcome = raised = None
+        started = time.perf_counter()
+        try:
+            outcome = getattr(self._target, self._name)(*args, **kwds)
+            raised = False
+            return outcome
+        except Exception as exception:
+            outcome = exception
+            raised = True
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self.calls += 1
+            self.duration += duration
+            self.items += items
+            if duration > self.max_duration:
+                self.max_duration = duration
+            if items > self.max_items:
+                self.max_items = items
+            if self._record is not None and raised is not None:
+                self._record(self._name, args, kwds, outcome, raised)
+
+    def should_be_called(self, times=None, at_least=None, at_most=None):
+        ''' Specify how many calls should have been recorded so far, e.g.
+        should_be_called(at_most=1) to catch N+1 access patterns '''
+        limits = []
+        if times is not None:
+            limits.append(('%s times' % times, self.calls == times))
+        if at_least is not None:
+            limits.append(('at least %s times' % at_least,
+                           self.calls >= at_least))
+        if at_most is not None:
+            limits.append(('at most %s times' % at_most,
+                           self.calls <= at_most))
+        if not limits:
+            raise ValueError('no number of calls specified')
+        for limit, is_met in limits:
+            if not is_met:
+                msg = '%s should be called %s, not %r' % \
+                    (self.description(), limit, self)
+                raise UnmetSpecification(msg)
+        return self
+
+    def description(self):
+        ''' Describe the method spied on '''
+        return '%s.%s()' % (self._spy_name, self._name)
+
+    def __repr__(self):
+        ''' Summarise the calls recorded, in a form useful in unmet
+        messages '''
+        return '<%d calls to %s: %.3gs in all (up to %.3gs), %d argument ' \
+               'items in all (up to %d)>' % \
+               (self.calls, self.description(), self.duration,
+                self.max_duration, self.items, self.max_items)
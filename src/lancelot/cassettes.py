@@ -0,0 +1,201 @@
+'''
+Functionality for recording the traffic with a real (slow) collaborator
+into a cassette file, and replaying it in later runs as a MockSpec, so
+that specs using the collaborator no longer need it, e.g.
+    cassette = Cassette('specs/users.cassette', inputs=FIXTURE_USERS)
+    client = cassette.collaborator(lambda: UserClient(URL), name='users')
+    spec = Spec(Directory(client))
+    spec.lookup('arthur').should_be(KING)
+    cassette.finish()
+
+When recording, the collaborator is created by its factory and wrapped in
+a SpySpec that records the name, args and result (or exception raised) of
+each method call, copied as they were when it returned (so that mutating
+them later doesn't change the cassette). Only method calls can be
+replayed: reading any other attribute of the collaborator while recording
+raises a ValueError. When replaying, a MockSpec is built whose collaborations
+are those recorded, in order, with will_return() or will_raise() results;
+finish() then verifies that they all occurred. Consecutive identical calls
+are stored (and replayed) as one collaboration happening times(n).
+
+A cassette is stale, and in 'auto' mode is re-recorded, if it doesn't
+exist or if the inputs it was recorded with (anything that can be
+represented as JSON, e.g. the fixture data sent to the collaborator) have
+changed. Args and results are stored with pickle (compressed), and so
+should be picklable and comparable with == once unpickled.
+
+Intended public interface:
+ Classes: Cassette
+ Functions: -
+ Variables: MODES
+
+Intended for internal use:
+ Classes: RecordingSpy
+ Functions: fingerprint()
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import copy
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+from lancelot.calling import SpyCall
+from lancelot.specification import MockSpec, SpySpec
+from lancelot.verification import UnmetSpecification
+
+MODES = ('auto', 'record', 'replay')
+
+_VERSION = 1
+
+
+def fingerprint(inputs):
+    ''' A digest of inputs, which changes if they do '''
+    encoded = json.dumps(inputs, sort_keys=True, default=repr)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class RecordingSpy(SpySpec):
+    ''' A SpySpec whose collaborator's attributes other than methods can't
+    be read, because reading them can't be replayed by a MockSpec '''
+
+    def __getattr__(self, name):
+        ''' Return a SpyCall for a method of the target, recording calls to
+        it, or else raise a ValueError '''
+        attribute = super().__getattr__(name)
+        if not isinstance(attribute, SpyCall):
+            msg = 'reading %s.%s cannot be replayed: only method calls can'
+            raise ValueError(msg % (self._name, name))
+        return attribute
+
+
+class Cassette:
+    ''' The recorded traffic with one or more named collaborators, stored
+    in a file '''
+
+    def __init__(self, path, mode='auto', inputs=None):
+        ''' path is the cassette file. mode is one of MODES: 'auto' replays
+        the cassette unless it is stale (when it is recorded instead),
+        'record' always records and 'replay' always replays. inputs are
+        what the recorded traffic depends on. '''
+        if mode not in MODES:
+            msg = 'mode %r is not one of %s' % (mode, ', '.join(MODES))
+            raise ValueError(msg)
+        self._path = path
+        self._fingerprint = fingerprint(inputs)
+        self._recorded = None
+        if mode == 'auto':
+            self._recorded = self._load(check_stale=False)
+        elif mode == 'replay':
+            self._recorded = self._load(check_stale=True)
+        self._traffic = {}  # name -> [(method, args, kwds, raised, value)]
+        self._mock_specs = []
+
+    def is_recording(self):
+        ''' Whether the traffic is being recorded (not replayed) '''
+        return self._recorded is None
+
+    def collaborator(self, factory, name='collaborator'):
+        ''' The named collaborator: when recording, a SpySpec on the real
+        object created by factory(), otherwise a MockSpec replaying the
+        recorded traffic (and factory isn't called) '''
+        if name in self._traffic:
+            raise ValueError('collaborator %r is already in use' % (name,))
+        self._traffic[name] = []
+        if self.is_recording():
+            return RecordingSpy(factory(), name, self._recorder(name))
+        mock_spec = self._replay(name, self._recorded.get(name, []))
+        self._mock_specs.append(mock_spec)
+        return mock_spec
+
+    def finish(self):
+        ''' Save the traffic recorded, or verify that all the traffic
+        replayed has occurred '''
+        if self.is_recording():
+            self._save()
+            return
+        for mock_spec in self._mock_specs:
+            mock_spec.verify()
+
+    def __enter__(self):
+        ''' Use the cassette in a with statement, finishing it at the end '''
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        ''' Finish the cassette, unless an exception was raised '''
+        if exc_type is None:
+            self.finish()
+        return False
+
+    def _recorder(self, name):
+        ''' A record callback for a SpySpec, appending to the traffic '''
+        traffic = self._traffic[name]
+
+        def record(method, args, kwds, outcome, raised):
+            ''' Record (a copy of) a call, merging it with an identical
+            previous one '''
+            args, kwds, outcome = copy.deepcopy((args, kwds, outcome))
+            if traffic and traffic[-1][:4] == (method, args, kwds, raised):
+                traffic[-1][4].append(outcome)
+            else:
+                traffic.append((method, args, kwds, raised, [outcome]))
+        return record
+
+    def _replay(self, name, traffic):
+        ''' A MockSpec, collaborating as in the recorded traffic '''
+        mock_spec = MockSpec(name)
+        for method, args, kwds, raised, outcomes in traffic:
+            if hasattr(MockSpec, method):
+                msg = '%s.%s() cannot be replayed by a MockSpec'
+                raise ValueError(msg % (name, method))
+            mock_call = getattr(mock_spec, method)(*args, **kwds)
+            mock_call.times(len(outcomes))
+            if raised:
+                mock_call.will_raise(*outcomes)
+            else:
+                mock_call.will_return(*outcomes)
+        mock_spec.start_collaborating()
+        return mock_spec
+
+    def _load(self, check_stale):
+        ''' The recorded traffic, {name: traffic}, or None if stale. If
+        check_stale, a stale cassette is an UnmetSpecification instead. '''
+        stale = None
+        if not os.path.exists(self._path):
+            stale = 'has not been recorded'
+        else:
+            with gzip.open(self._path, 'rb') as stored:
+                cassette = pickle.load(stored)
+            if cassette.get('version') != _VERSION:
+                stale = 'is an unknown version'
+            elif cassette.get('inputs') != self._fingerprint:
+                stale = 'was recorded with other inputs'
+        if stale is None:
+            return cassette['collaborators']
+        if check_stale:
+            msg = 'cassette %s %s: re-record it' % (self._path, stale)
+            raise UnmetSpecification(msg)
+        return None
+
+    def _save(self):
+        ''' Store the traffic recorded (atomically) '''
+        cassette = {'version': _VERSION,
+                    'inputs': self._fingerprint,
+                    'recorded': time.strftime('%Y-%m-%d'),
+                    'collaborators': self._traffic}
+        try:
+            data = pickle.dumps(cassette, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as error:
+            msg = 'traffic cannot be stored in cassette %s: %s'
+            raise ValueError(msg % (self._path, error))
+        directory = os.path.dirname(os.path.abspath(self._path))
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as raw, \
+             gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as stored:
+            stored.write(data)
+        os.replace(temp_path, self._path)
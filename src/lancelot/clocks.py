@@ -0,0 +1,150 @@
+'''
+Functionality for simulating the passing of time, so that timeout, retry
+and backoff behaviour can be specified without waiting for it, e.g.
+    clock = VirtualClock()
+    service = MockSpec(clock=clock)
+    service.fetch().will_take(5.0).will_raise(TimeoutError)
+    service.fetch().will_return('data')
+    service.start_collaborating()
+    client = RetryingClient(service, sleep=clock.sleep, now=clock.monotonic)
+    Spec(client).fetch().should_be('data')
+    Spec(clock.sleeps).it().should_be([1.0])
+
+The clock only moves when told to: by sleep() (as the code under test
+would call time.sleep), by advance(), by a MockCall that will_take() some
+time, or by an event loop from event_loop() whenever it would otherwise
+wait for a timer. Code that reads the time module's functions, rather than
+having them injected, can be run within patched().
+
+Where collaborations should really take the time they will_take() (e.g.
+so that they overlap in several threads), a MockSpec can be given
+clock=REAL_TIME instead.
+
+Intended public interface:
+ Classes: VirtualClock, VirtualTimeEventLoop, RealClock
+ Functions: -
+ Variables: REAL_TIME
+
+Intended for internal use:
+ -
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import asyncio
+import contextlib
+import selectors
+import threading
+import time
+
+
+class RealClock:
+    ''' A clock reading, and taking, real time '''
+
+    def monotonic(self):
+        ''' The current time, in seconds, from time.monotonic() '''
+        return time.monotonic()
+
+    def advance(self, seconds):
+        ''' Let seconds pass, waiting for them '''
+        if seconds < 0:
+            raise ValueError('time cannot go back %r seconds' % (seconds,))
+        time.sleep(seconds)
+
+    sleep = advance
+
+
+REAL_TIME = RealClock()
+
+
+class VirtualClock:
+    ''' A clock whose time only passes when it is advanced '''
+
+    def __init__(self, start=0.0):
+        ''' The clock reads start seconds, until advanced '''
+        self._now = start
+        self._lock = threading.Lock()
+        self.sleeps = []
+
+    def monotonic(self):
+        ''' The current time, in seconds: for time.monotonic() '''
+        return self._now
+
+    perf_counter = monotonic
+    time = monotonic
+
+    def advance(self, seconds):
+        ''' Let seconds pass '''
+        if seconds < 0:
+            raise ValueError('time cannot go back %r seconds' % (seconds,))
+        with self._lock:
+            self._now += seconds
+
+    def sleep(self, seconds):
+        ''' Let seconds pass, instantly, recording them in sleeps: for
+        time.sleep() '''
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+    @contextlib.contextmanager
+    def patched(self):
+        ''' Within a with statement, replace the time module's monotonic(),
+        perf_counter(), time() and sleep() with this clock's (this doesn't
+        affect names imported from time before then) '''
+        names = ('monotonic', 'perf_counter', 'time', 'sleep')
+        originals = dict((name, getattr(time, name)) for name in names)
+        for name in names:
+            setattr(time, name, getattr(self, name))
+        try:
+            yield self
+        finally:
+            for name, original in originals.items():
+                setattr(time, name, original)
+
+    def event_loop(self):
+        ''' A new asyncio event loop running in this clock's time '''
+        return VirtualTimeEventLoop(self)
+
+    def run(self, coroutine):
+        ''' Run a coroutine to completion in a new event_loop(), returning
+        its result: for asyncio.run() '''
+        loop = self.event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    ''' Selector that, rather than waiting for a timeout with no I/O ready,
+    advances a VirtualClock by the timeout '''
+
+    def __init__(self, clock):
+        ''' A selector advancing clock '''
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout=None):
+        ''' The I/O events ready now, advancing the clock by the timeout
+        if there are none (or waiting for some, if there is no timeout) '''
+        events = super().select(0)
+        if events or timeout is not None and timeout <= 0:
+            return events
+        if timeout is None:
+            return super().select(None)
+        self._clock.advance(timeout)
+        return events
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    ''' Event loop whose time is that of a VirtualClock, so that sleeps and
+    timeouts take no time at all '''
+
+    def __init__(self, clock):
+        ''' A loop running in clock's time '''
+        super().__init__(_VirtualTimeSelector(clock))
+        self._clock = clock
+
+    def time(self):
+        ''' The current time, according to the clock '''
+        return self._clock.monotonic()
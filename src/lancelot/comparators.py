@@ -7,7 +7,7 @@ Intended public interface:
  Classes: EqualsEquals, SameAs, LessThan, GreaterThan, StrEquals, 
      ReprEquals, NoneValue, NotNoneValue, Anything, ExceptionValue, FloatValue
      Contain, NotContain, Empty, Length, Type,
-     LessThanOrEqual, GreaterThanOrEqual
+     LessThanOrEqual, GreaterThanOrEqual, AttributeValue
  Functions: -
  Variables: -
 
@@ -312,4 +312,31 @@ class GreaterThanOrEqual(OrComparator):
         
     def description(self):
         ''' Describe this comparator '''
-        return '=> %s' % repr(self._prototype)
\ No newline at end of file
+        return '=> %s' % repr(self._prototype)
+
+class AttributeValue(Comparator):
+    ''' Comparator for comparing a named attribute of other instances. '''
+
+    def __init__(self, name, comparator, value_of=None):
+        ''' Compare the attribute called name using comparator (or, if
+        specified, the value returned by value_of(other) instead) '''
+        super().__init__(comparator)
+        self._name = name
+        self._value_of = value_of
+
+    def value(self, other):
+        ''' The value of other's attribute '''
+        if self._value_of is not None:
+            return self._value_of(other)
+        return getattr(other, self._name)
+
+    def compares_to(self, other):
+        ''' True iff the comparator compares_to the other's attribute '''
+        try:
+            return self._prototype.compares_to(self.value(other))
+        except AttributeError:
+            return False
+
+    def description(self):
+        ''' Describe this comparator '''
+        return '%s %s' % (self._name, self._prototype.description())
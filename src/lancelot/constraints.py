@@ -2,22 +2,44 @@
 Functionality for expressing the constraints on behaviour (with should...)
 
 Intended public interface:
- Classes:  Raise, Not, CollaborateWith
+ Classes:  Raise, Not, CollaborateWith, Have, CollectAtMost, CreateAtMost,
+           Lazy, Source, OpenAtMost, ReadAtMost, SpawnAtMost, NoNetwork,
+           NotBlockLoop, Sustain
  Functions: -
  Variables: -
 
 Intended for internal use:
- Classes: Constraint
+ Classes: Constraint, GcActivity, IoActivity, LoopMonitor
+ Variables: NETWORK_EVENTS, PROCESS_EVENTS
 
 Copyright 2009 by the author(s). All rights reserved
 '''
 
+import gc
+import os
+import sys
+import threading
+import time
+import traceback
+
 from lancelot.comparators import (Nothing,
                                   Anything,
+                                  AttributeValue,
+                                  Comparator,
                                   EqualsEquals,
                                   ExceptionValue)
 from lancelot.verification import UnmetSpecification
 
+NETWORK_EVENTS = ('socket.connect', 'socket.getaddrinfo',
+                  'socket.gethostbyname', 'socket.gethostbyaddr',
+                  'socket.getnameinfo', 'socket.sendmsg', 'socket.sendto')
+PROCESS_EVENTS = ('subprocess.Popen', 'os.system', 'os.posix_spawn',
+                  'os.spawn', 'os.exec', 'os.fork', 'os.startfile')
+
+_IO_RECORDING = threading.local()  # IoActivities recording in each thread
+_AUDIT_LOCK = threading.Lock()
+_AUDITING = []  # the audit hook, once it has been added
+
 
 class Constraint:
     ''' Base constraint class '''
@@ -132,3 +154,517 @@ class CollaborateWith(Constraint):
         descriptions = [collaboration.description()
                         for collaboration in self._collaborations]
         return ','.join(descriptions)
+
+
+class Have(Constraint):
+    ''' Constraint specifying should... "have attributes..." behaviour '''
+
+    def __init__(self, *comparators, **attributes):
+        ''' Specify comparators the result should meet, and attributes
+        (comparators or values) the result should have '''
+        super().__init__()
+        self._comparators = list(comparators)
+        for name, value in sorted(attributes.items()):
+            if not isinstance(value, Comparator):
+                value = EqualsEquals(value)
+            self._comparators.append(AttributeValue(name, value))
+
+    def verify(self, callable_result):
+        ''' Check that each comparator is met, in turn '''
+        value_to_verify = self._invoke(callable_result)
+        for comparator in self._comparators:
+            if not comparator.compares_to(value_to_verify):
+                msg = 'should have %s, not %r' % (comparator.description(),
+                                                  value_to_verify)
+                raise UnmetSpecification(msg)
+
+    def describe_constraint(self):
+        ''' Describe this constraint '''
+        descriptions = [comparator.description()
+                        for comparator in self._comparators]
+        return 'should have %s' % ' and '.join(descriptions)
+
+
+class Sustain(Have):
+    ''' Constraint specifying should... "sustain load..." behaviour, of a
+    lancelot.loadtesting.LoadResult: none of its calls should have failed,
+    and it should have the specified statistics '''
+
+    def verify(self, callable_result):
+        ''' Check that no call failed, then that each comparator is met '''
+        load = self._invoke(callable_result)
+        if load.failures:
+            msg = 'should sustain load without failures, not %d failures ' \
+                  '(first: %s) in %r' % (load.failures, load.first_failure,
+                                         load)
+            raise UnmetSpecification(msg)
+        super().verify(lambda: load)
+
+    def describe_constraint(self):
+        ''' Describe this constraint '''
+        descriptions = [comparator.description()
+                        for comparator in self._comparators]
+        return 'should sustain load with %s' % \
+               (' and '.join(descriptions) or 'no failures')
+
+
+class GcActivity:
+    ''' Counts the garbage collections of each generation, and the net
+    number of objects tracked by the garbage collector, while within a
+    with statement. Collections in other threads are counted too. '''
+
+    def __init__(self):
+        ''' No activity yet '''
+        self.collections = [0] * len(gc.get_stats())
+        self.collected = 0
+        self.objects = 0
+        self._callback = self._collecting
+        self._tracked = 0
+
+    def __enter__(self):
+        ''' Start counting, after a full collection so that earlier garbage
+        is neither counted nor collected '''
+        gc.collect()
+        self._tracked = len(gc.get_objects())
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc_info):
+        ''' Stop counting '''
+        gc.callbacks.remove(self._callback)
+        self.objects = len(gc.get_objects()) - self._tracked
+        return False
+
+    def _collecting(self, phase, info):
+        ''' gc.callbacks hook: count a collection and the objects it
+        collected '''
+        if phase == 'start':
+            self.collections[info['generation']] += 1
+        else:
+            self.collected += info['collected']
+
+    def count(self, name):
+        ''' The count of gen0, gen1, ... collections, or of objects '''
+        if name == 'objects':
+            return self.objects
+        return self.collections[int(name[3:])]
+
+    def __repr__(self):
+        ''' Summarise the activity, in a form useful in unmet messages '''
+        return '<gc activity: %s collections (%d objects collected), ' \
+               '%+d objects>' % (', '.join('%d gen%d' % (count, generation)
+                                          for generation, count
+                                          in enumerate(self.collections)),
+                                 self.collected, self.objects)
+
+
+class _ActivityLimit(Constraint):
+    ''' Base constraint specifying limits on the activity (e.g. GcActivity)
+    while an action is invoked '''
+
+    def __init__(self, verb, limits, activity=GcActivity):
+        ''' Specify the (name, limit) pairs the activity should not exceed,
+        the verb describing it, and the activity class that measures it '''
+        super().__init__()
+        if not limits:
+            raise ValueError('no limit specified')
+        self._verb = verb
+        self._limits = limits
+        self._activity = activity
+
+    def verify(self, callable_result):
+        ''' Invoke callable_result() and check its activity '''
+        with self._activity() as activity:
+            self._invoke(callable_result)
+        for name, limit in self._limits:
+            count = activity.count(name)
+            if count is None:
+                msg = '%s, but %s could not be measured' % \
+                    (self.describe_constraint(), name)
+                raise UnmetSpecification(msg)
+            if count > limit:
+                msg = '%s, not %r' % (self.describe_constraint(), activity)
+                raise UnmetSpecification(msg)
+
+    def describe_constraint(self):
+        ''' Describe this constraint '''
+        return 'should %s at most %s' % \
+            (self._verb, ', '.join('%s=%d' % limit for limit in self._limits))
+
+
+class CollectAtMost(_ActivityLimit):
+    ''' Constraint specifying should... "collect at most..." behaviour '''
+
+    def __init__(self, gen0=None, gen1=None, gen2=None):
+        ''' Specify the most garbage collections of each generation that
+        may occur, e.g. CollectAtMost(gen2=0) '''
+        limits = [('gen%d' % generation, limit)
+                  for generation, limit in enumerate((gen0, gen1, gen2))
+                  if limit is not None]
+        super().__init__('collect', limits)
+
+
+class CreateAtMost(_ActivityLimit):
+    ''' Constraint specifying should... "create at most..." behaviour '''
+
+    def __init__(self, objects):
+        ''' Specify the most (net) objects tracked by the garbage collector
+        that may be created '''
+        super().__init__('create', [('objects', objects)])
+
+
+class Source:
+    ''' Instrumented iterator, to be supplied to an action as its input,
+    counting how many items have been consumed from it '''
+
+    def __init__(self, iterable=None):
+        ''' Iterate over iterable: by default range(10000), so that an action
+        consuming all its input still returns '''
+        if iterable is None:
+            iterable = range(10000)
+        self._iterator = iter(iterable)
+        self.consumed = 0
+
+    def __iter__(self):
+        ''' A Source is its own iterator '''
+        return self
+
+    def __next__(self):
+        ''' The next item, counting it as consumed '''
+        item = next(self._iterator)
+        self.consumed += 1
+        return item
+
+    def __repr__(self):
+        ''' Summarise the items consumed so far '''
+        return '<source: %d items consumed>' % self.consumed
+
+
+class Lazy(Constraint):
+    ''' Constraint specifying should... "be lazy" behaviour: an action
+    returning an iterable should only consume its input Source as its own
+    items are pulled '''
+
+    def __init__(self, source, on_call=0, per_output=1, outputs=10):
+        ''' Specify the Source the action is given, the most items it may
+        consume before returning, and the most it may have consumed after m
+        of its own items are pulled (for m up to outputs): per_output(m) if
+        callable, otherwise on_call + per_output * m '''
+        super().__init__()
+        self._source = source
+        self._on_call = on_call
+        self._outputs = outputs
+        if callable(per_output):
+            self._most_consumed = per_output
+            self._description = 'then as specified per output'
+        else:
+            self._most_consumed = lambda m: on_call + per_output * m
+            self._description = 'then %s per output' % per_output
+
+    def verify(self, callable_result):
+        ''' Invoke callable_result(), then pull items from the iterable it
+        returns, checking how much of the source has been consumed '''
+        consumed_before = self._source.consumed
+        result = self._invoke(callable_result)
+        consumed = self._source.consumed - consumed_before
+        if consumed > self._on_call:
+            msg = '%s, not %d items consumed on call' % \
+                (self.describe_constraint(), consumed)
+            raise UnmetSpecification(msg)
+        try:
+            iterator = iter(result)
+        except TypeError:
+            msg = '%s, not %r' % (self.describe_constraint(), result)
+            raise UnmetSpecification(msg)
+        for pulled in range(1, self._outputs + 1):
+            try:
+                next(iterator)
+            except StopIteration:
+                return
+            consumed = self._source.consumed - consumed_before
+            if consumed > self._most_consumed(pulled):
+                msg = '%s, not %d items consumed for %d outputs' % \
+                    (self.describe_constraint(), consumed, pulled)
+                raise UnmetSpecification(msg)
+
+    def describe_constraint(self):
+        ''' Describe this constraint '''
+        return 'should be lazy, consuming at most %d items on call, %s' % \
+            (self._on_call, self._description)
+
+
+def _audit(event, args):
+    ''' Audit hook: record an event in the IoActivities recording in the
+    current thread, if any '''
+    activities = getattr(_IO_RECORDING, 'activities', None)
+    if activities:
+        for activity in activities:
+            activity.record(event, args)
+
+
+def _rchar():
+    ''' The bytes read by this process so far (on Linux), or None '''
+    try:
+        with open('/proc/self/io', 'rb') as stats:
+            for line in stats:
+                if line.startswith(b'rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class IoActivity:
+    ''' Records the files opened, network activity and processes spawned
+    (by audit events raised in the current thread) and the bytes read (by
+    the whole process, where /proc/self/io is available), while within a
+    with statement. An audit hook is added to the interpreter the first
+    time; it can't be removed, but is cheap when nothing is recording. '''
+
+    def __init__(self):
+        ''' No activity yet '''
+        self.files = []
+        self.network = []
+        self.processes = []
+        self.bytes_read = None
+        self._started = None
+        self._popen_argv = None
+
+    def __enter__(self):
+        ''' Start recording '''
+        with _AUDIT_LOCK:
+            if not _AUDITING:
+                sys.addaudithook(_audit)
+                _AUDITING.append(_audit)
+        before = _rchar()
+        self._started = _rchar()
+        if self._started is not None:
+            self._started += self._started - before  # for reading them again
+        if not hasattr(_IO_RECORDING, 'activities'):
+            _IO_RECORDING.activities = []
+        _IO_RECORDING.activities.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        ''' Stop recording '''
+        _IO_RECORDING.activities.remove(self)
+        finished = _rchar()
+        if self._started is not None and finished is not None:
+            self.bytes_read = finished - self._started
+        return False
+
+    def record(self, event, args):
+        ''' Record an audit event, if it's one of interest '''
+        if event == 'open':
+            self.files.append(args[0])
+        elif event in NETWORK_EVENTS:
+            self.network.append('%s%r' % (event, args[:2]))
+        elif event.startswith(PROCESS_EVENTS):
+            argv = args[1] if len(args) > 1 else args
+            if event != 'subprocess.Popen' and argv == self._popen_argv:
+                return  # the same process, spawned by subprocess.Popen
+            self._popen_argv = argv if event == 'subprocess.Popen' else None
+            self.processes.append('%s(%r)' % (event, argv))
+
+    def count(self, name):
+        ''' The count of files, network events, processes or bytes read
+        (None if they couldn't be measured) '''
+        if name == 'bytes':
+            return self.bytes_read
+        return len(getattr(self, name))
+
+    def __repr__(self):
+        ''' Summarise the activity, in a form useful in unmet messages '''
+        details = []
+        for name in ('files', 'network', 'processes'):
+            recorded = getattr(self, name)
+            detail = '%d %s' % (len(recorded), name)
+            if recorded:
+                detail += ' (%s)' % ', '.join(str(item)
+                                              for item in recorded[:5])
+            details.append(detail)
+        if self.bytes_read is not None:
+            details.append('%d bytes read' % self.bytes_read)
+        return '<io activity: %s>' % ', '.join(details)
+
+
+class OpenAtMost(_ActivityLimit):
+    ''' Constraint specifying should... "open at most..." behaviour '''
+
+    def __init__(self, files):
+        ''' Specify the most files (or other paths) that may be opened '''
+        super().__init__('open', [('files', files)], IoActivity)
+
+
+class ReadAtMost(_ActivityLimit):
+    ''' Constraint specifying should... "read at most..." behaviour '''
+
+    def __init__(self, bytes):
+        ''' Specify the most bytes that may be read (by the whole process,
+        in any thread). Raises ValueError where they can't be measured. '''
+        if _rchar() is None:
+            raise ValueError('should read at most bytes=%d cannot be '
+                             'verified here: bytes read are only measured '
+                             'where /proc/self/io can be read' % bytes)
+        super().__init__('read', [('bytes', bytes)], IoActivity)
+
+
+class SpawnAtMost(_ActivityLimit):
+    ''' Constraint specifying should... "spawn at most..." behaviour '''
+
+    def __init__(self, processes):
+        ''' Specify the most processes that may be spawned '''
+        super().__init__('spawn', [('processes', processes)], IoActivity)
+
+
+class NoNetwork(_ActivityLimit):
+    ''' Constraint specifying should... "not touch network" behaviour '''
+
+    def __init__(self):
+        ''' Specify that no connections, name lookups or datagrams sent
+        should occur '''
+        super().__init__('touch', [('network', 0)], IoActivity)
+
+    def describe_constraint(self):
+        ''' Describe this constraint '''
+        return 'should not touch the network'
+
+
+class LoopMonitor:
+    ''' Times each step run by an event loop made by new_event_loop() (each
+    callback it calls, e.g. each step of a task), recording the steps that
+    block it for longer than threshold, while a watchdog thread samples the
+    stack of the loop's thread during any step running for too long '''
+
+    def __init__(self, threshold):
+        ''' Watch for steps blocking the loop for more than threshold
+        seconds '''
+        self.threshold = threshold
+        self.blocked = []  # [(seconds, stack lines)]
+        self._thread_id = None
+        self._steps = 0
+        self._running = None  # (step number, start time) of the step
+        self._stacks = {}  # step number -> stack lines sampled while long
+        self._stopped = threading.Event()
+
+    def new_event_loop(self):
+        ''' A new event loop, whose steps are timed '''
+        return _monitored_event_loop(self)
+
+    def run(self, loop, awaitable):
+        ''' Run awaitable to completion in loop (made by new_event_loop()),
+        monitoring it meanwhile '''
+        self._thread_id = threading.get_ident()
+        watchdog = threading.Thread(target=self._watch, daemon=True)
+        watchdog.start()
+        try:
+            return loop.run_until_complete(awaitable)
+        finally:
+            self._stopped.set()
+            watchdog.join()
+
+    def timed(self, callback):
+        ''' callback, wrapped to time each call of it as a step '''
+        def step(*args):
+            ''' Call the callback, recording it if it blocks too long '''
+            self._steps += 1
+            number = self._steps
+            started = time.monotonic()
+            self._running = number, started
+            try:
+                return callback(*args)
+            finally:
+                self._running = None
+                seconds = time.monotonic() - started
+                if seconds > self.threshold:
+                    self.blocked.append((seconds,
+                                         self._stacks.pop(number, [])))
+        return step
+
+    def _watch(self):
+        ''' Watchdog: sample the stack of the loop's thread, once, while a
+        step is running for too long '''
+        while not self._stopped.wait(self.threshold / 8.0):
+            running = self._running
+            if running is None or running[0] in self._stacks \
+            or time.monotonic() - running[1] <= self.threshold:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self._stacks[running[0]] = _format_stack(frame)
+
+
+def _monitored_event_loop(monitor):
+    ''' A new event loop timing each callback scheduled on it with monitor
+    (asyncio is only imported when an event loop is monitored, as it is
+    slow to import) '''
+    import asyncio
+
+    class MonitoredEventLoop(asyncio.SelectorEventLoop):
+        ''' Event loop timing each callback scheduled on it '''
+
+        def call_soon(self, callback, *args, context=None):
+            ''' Schedule a timed callback '''
+            return super().call_soon(monitor.timed(callback), *args,
+                                     context=context)
+
+        def call_soon_threadsafe(self, callback, *args, context=None):
+            ''' Schedule a timed callback, from any thread '''
+            return super().call_soon_threadsafe(monitor.timed(callback),
+                                                *args, context=context)
+
+        def call_at(self, when, callback, *args, context=None):
+            ''' Schedule a timed callback, at a time '''
+            return super().call_at(when, monitor.timed(callback), *args,
+                                   context=context)
+
+    return MonitoredEventLoop()
+
+
+def _format_stack(frame):
+    ''' The formatted stack of frame, from the step run by the loop (less
+    the monitor's frames) '''
+    import asyncio  # already imported by the event loop monitored
+    entries = traceback.extract_stack(frame)
+    asyncio_directory = os.path.dirname(asyncio.__file__)
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index].filename.startswith(asyncio_directory):
+            entries = entries[index + 1:]
+            break
+    return traceback.format_list([entry for entry in entries
+                                  if entry.filename != __file__])
+
+
+class NotBlockLoop(Constraint):
+    ''' Constraint specifying should... "not block event loop" behaviour '''
+
+    def __init__(self, threshold=0.1):
+        ''' Specify the longest (in seconds) that any single step of the
+        action (an awaitable) may run for without yielding to the loop '''
+        super().__init__()
+        self._threshold = threshold
+
+    def verify(self, callable_result):
+        ''' Invoke callable_result(), and run the awaitable it returns in a
+        new event loop, monitoring it for steps that block the loop '''
+        awaitable = self._invoke(callable_result)
+        if not hasattr(awaitable, '__await__'):
+            msg = '%s, not %r' % (self.describe_constraint(), awaitable)
+            raise UnmetSpecification(msg)
+        monitor = LoopMonitor(self._threshold)
+        loop = monitor.new_event_loop()
+        try:
+            monitor.run(loop, awaitable)
+        finally:
+            loop.close()
+        if monitor.blocked:
+            seconds, stack = max(monitor.blocked, key=lambda step: step[0])
+            msg = '%s, not %.3gs' % (self.describe_constraint(), seconds)
+            if stack:
+                msg += ', blocked at:\n' + ''.join(stack).rstrip()
+            raise UnmetSpecification(msg)
+
+    def describe_constraint(self):
+        ''' Describe this constraint '''
+        return 'should not block the event loop for more than %ss' % \
+            self._threshold
@@ -0,0 +1,383 @@
+'''
+Functionality for distributing verification across worker processes that
+request work from a coordinator as they become free, e.g.
+    AllVerifiable.verify(executor=DistributedExecution(workers=4))
+or, with workers on other hosts or in containers that join the run,
+    DistributedExecution(address=('0.0.0.0', 7777), workers=0)
+    python -m lancelot.distribution coordinator-host:7777
+
+The coordinator owns the functions to verify and hands them out, as
+(key, module name, qualified name, timeout) entries, to each worker that
+asks for more: faster workers therefore take on more of the work. The
+methods of a grouping are handed out together, so that its setup and
+teardown are run once, by one worker. Entries held by a worker that
+disconnects (e.g. as it crashed) are requeued for another worker, up to
+max_attempts times, and otherwise reported as WorkerCrashed. If no
+worker is connected (or starting locally) for connect_timeout seconds,
+the entries left are reported as WorkerCrashed rather than waited for.
+Outcomes stream back as they happen and are reported to the
+coordinator's listener. Messages are JSON lines over a TCP socket or,
+for an address that is a path, a Unix socket:
+    worker -> coordinator: {"type": "hello", "pid": .., "host": ..}
+                           {"type": "request"}
+                           {"type": "record", "record": {..}}
+    coordinator -> worker: {"type": "work", "entries": [[..]..]}
+                           {"type": "done"}
+
+Intended public interface:
+ Classes: DistributedExecution
+ Functions: work [used as "python -m lancelot.distribution ADDRESS"]
+ Variables: -
+
+Intended for internal use:
+ Classes: Coordinator
+ Functions: parse_address(), format_address()
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import collections
+import json
+import os
+import select
+import socket
+import subprocess
+import sys
+import time
+
+from lancelot.execution import WorkerCrashed, encode_outcome, \
+                               verify_shard, _ShardedExecution, _units
+
+
+def parse_address(address):
+    ''' A socket address from "host:port" (TCP) or a path (Unix socket) '''
+    if not isinstance(address, str):
+        return tuple(address)
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit() and os.sep not in address:
+        return (host or '127.0.0.1', int(port))
+    return address
+
+
+def format_address(address):
+    ''' The inverse of parse_address() '''
+    if isinstance(address, str):
+        return address
+    return '%s:%d' % address[:2]
+
+
+def _socket_for(address):
+    ''' A new stream socket of the right family for address '''
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_INET6 if ':' in address[0]
+                         else socket.AF_INET, socket.SOCK_STREAM)
+
+
+def work(address):
+    ''' Run a worker: connect to the coordinator at address, then verify
+    the entries it hands out until it has no more '''
+    connection = _socket_for(parse_address(address))
+    connection.connect(parse_address(address))
+    stream = connection.makefile('rwb')
+
+    def send(message):
+        ''' Send a message to the coordinator as a JSON line '''
+        line = json.dumps(message, default=repr) + '\n'
+        stream.write(line.encode('utf-8'))
+        stream.flush()
+
+    try:
+        send({'type': 'hello', 'pid': os.getpid(),
+              'host': socket.gethostname()})
+        while True:
+            send({'type': 'request'})
+            line = stream.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message['type'] != 'work':
+                break
+            entries = [tuple(entry) for entry in message['entries']]
+            verify_shard(entries,
+                         lambda record: send({'type': 'record',
+                                              'record': record}))
+    except ConnectionError:
+        pass  # the coordinator has gone: there is no more work
+    finally:
+        try:
+            stream.close()
+        except ConnectionError:
+            pass
+        connection.close()
+
+
+class _Worker:
+    ''' The coordinator's view of a connected worker '''
+
+    def __init__(self, connection):
+        ''' A worker connected through connection, not yet asking for
+        work '''
+        self.connection = connection
+        self.unread = b''
+        self.pid = None
+        self.idle = False
+        self.busy = False
+        self.assigned = {}  # key -> entry
+
+
+class Coordinator:
+    ''' Hands out entries to workers connecting to a listening socket,
+    yielding the records they send back '''
+
+    def __init__(self, server, entries, batch_size=1, max_attempts=2,
+                 spawn=None):
+        ''' server is a listening socket. entries are handed out in units
+        (a function, or all the methods of a grouping), batch_size units
+        at a time. spawn, if not None, is called to start a
+        replacement local worker when one is lost with work remaining. '''
+        self._server = server
+        self._pending = collections.deque(_units(entries))  # [[entry..]..]
+        self._batch_size = max(1, batch_size)
+        self._max_attempts = max_attempts
+        self._spawn = spawn
+        self._attempts = collections.Counter()
+        self._workers = {}  # socket -> _Worker
+        self._unconnected_since = time.monotonic()
+        self.seen_pids = set()
+
+    def unfinished(self):
+        ''' Whether any entries are waiting for, or held by, a worker
+        (which holds them until it asks for more work) '''
+        return bool(self._pending) \
+            or any(worker.busy for worker in self._workers.values())
+
+    def unconnected_for(self):
+        ''' The seconds since a worker was last connected (0 while one
+        is) '''
+        if self._unconnected_since is None:
+            return 0.0
+        return time.monotonic() - self._unconnected_since
+
+    def worker_pids(self):
+        ''' The process ids of the connected workers (None if not yet
+        known) '''
+        return [worker.pid for worker in self._workers.values()]
+
+    def abandon(self, reason):
+        ''' Yield crashed records for every entry not yet handed out '''
+        while self._pending:
+            for entry in self._pending.popleft():
+                yield dict(encode_outcome(WorkerCrashed(reason)),
+                           id=entry[0])
+
+    def records(self, poll=None, interval=1.0):
+        ''' Yield records until every entry has an outcome. poll, if not
+        None, is called every interval seconds and may yield records. '''
+        try:
+            while self.unfinished():
+                sockets = [self._server] + list(self._workers)
+                ready, _, _ = select.select(sockets, [], [], interval)
+                for ready_socket in ready:
+                    if ready_socket is self._server:
+                        self._accept()
+                    elif ready_socket in self._workers:
+                        yield from self._receive(self._workers[ready_socket])
+                self._dispatch()
+                if poll is not None:
+                    yield from poll()
+        finally:
+            for worker in list(self._workers.values()):
+                self._send(worker, {'type': 'done'})
+                self._close(worker)
+
+    def _accept(self):
+        ''' Accept a connection from a new worker '''
+        connection, _ = self._server.accept()
+        self._workers[connection] = _Worker(connection)
+        self._unconnected_since = None
+
+    def _receive(self, worker):
+        ''' Yield the records in whatever a worker has sent '''
+        try:
+            chunk = worker.connection.recv(65536)
+        except OSError:
+            chunk = b''
+        if not chunk:
+            yield from self._lost(worker)
+            return
+        lines = (worker.unread + chunk).split(b'\n')
+        worker.unread = lines.pop()
+        for line in lines:
+            message = json.loads(line)
+            if message['type'] == 'hello':
+                worker.pid = message.get('pid')
+                self.seen_pids.add(worker.pid)
+            elif message['type'] == 'request':
+                worker.idle = True
+                worker.busy = False
+            elif message['type'] == 'record':
+                record = message['record']
+                worker.assigned.pop(record['id'], None)
+                yield record
+
+    def _dispatch(self):
+        ''' Hand out pending entries to idle workers '''
+        for worker in list(self._workers.values()):
+            if not self._pending:
+                return
+            if not worker.idle:
+                continue
+            batch = []
+            for _ in range(min(self._batch_size, len(self._pending))):
+                batch.extend(self._pending.popleft())
+            worker.assigned = dict((entry[0], entry) for entry in batch)
+            worker.idle = False
+            worker.busy = True
+            self._send(worker, {'type': 'work', 'entries': batch})
+
+    def _send(self, worker, message):
+        ''' Send a message to a worker (a lost worker is noticed when its
+        connection is next read) '''
+        line = json.dumps(message) + '\n'
+        try:
+            worker.connection.sendall(line.encode('utf-8'))
+        except OSError:
+            pass
+
+    def _lost(self, worker):
+        ''' A worker has disconnected: requeue the entries it held, or
+        yield a crashed record for those already attempted enough times '''
+        self._close(worker)
+        requeued = []
+        for key, entry in worker.assigned.items():
+            self._attempts[key] += 1
+            if self._attempts[key] < self._max_attempts:
+                requeued.append(entry)
+                continue
+            crashed = WorkerCrashed('worker %s was lost %d times verifying '
+                                    'this function' % (worker.pid or '?',
+                                                       self._attempts[key]))
+            yield dict(encode_outcome(crashed), id=key)
+        self._pending.extendleft(reversed(_units(requeued)))
+        worker.assigned = {}
+        if self._spawn is not None and self.unfinished():
+            self._spawn(worker.pid)
+
+    def _close(self, worker):
+        ''' Forget about a worker and close its connection '''
+        self._workers.pop(worker.connection, None)
+        worker.connection.close()
+        if not self._workers and self._unconnected_since is None:
+            self._unconnected_since = time.monotonic()
+
+
+class DistributedExecution(_ShardedExecution):
+    ''' Executor whose coordinator hands out functions to workers as they
+    ask for more, starting local worker processes and accepting others
+    that connect to its address '''
+
+    def __init__(self, address=None, workers=None, batch_size=1,
+                 max_attempts=2, connect_timeout=60.0):
+        ''' address is where workers connect: ("host", port), "host:port"
+        or a Unix socket path (by default, a free port on 127.0.0.1).
+        workers is the number of local worker processes to start (by
+        default, the number of CPUs), which may be 0 if workers on other
+        hosts will connect. Each worker is handed batch_size functions (or
+        groupings, with all their methods) at a time, and a function is
+        attempted max_attempts times before a
+        worker lost while verifying it is reported as WorkerCrashed. The
+        functions left are reported as WorkerCrashed if no worker has been
+        connected for connect_timeout seconds (None to wait forever). '''
+        super().__init__(shards=1)
+        self._address = parse_address(address or ('127.0.0.1', 0))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self._local_workers = workers
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._connect_timeout = connect_timeout
+        self._processes = {}  # pid -> subprocess.Popen
+        self.address = None
+
+    def _records(self, shards, timeout):
+        ''' Yield the records sent by workers, coordinating them until
+        every function has an outcome '''
+        entries = [entry for shard in shards for entry in shard]
+        if not entries:
+            return
+        server = self._listen()
+        coordinator = Coordinator(server, entries, self._batch_size,
+                                  self._max_attempts, self._replace)
+        try:
+            for _ in range(min(self._local_workers, len(entries))):
+                self._start_worker()
+            interval = 1.0
+            if self._connect_timeout is not None:
+                interval = min(interval, self._connect_timeout)
+            yield from coordinator.records(
+                poll=lambda: self._check_started(coordinator),
+                interval=interval)
+        finally:
+            for pid, process in self._processes.items():
+                if pid not in coordinator.seen_pids:
+                    process.terminate()
+            server.close()
+            if isinstance(self.address, str):
+                os.unlink(self.address)
+            for process in self._processes.values():
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            self._processes.clear()
+
+    def _listen(self):
+        ''' A socket listening at the address, which is then recorded in
+        the address attribute (with the actual port, if 0 was given) '''
+        server = _socket_for(self._address)
+        if not isinstance(self._address, str):
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(self._address)
+        server.listen()
+        self.address = server.getsockname()
+        return server
+
+    def _start_worker(self):
+        ''' Start a local worker process, with the same import path '''
+        environment = dict(os.environ)
+        environment['PYTHONPATH'] = os.pathsep.join(
+            path for path in sys.path if path)
+        command = [sys.executable, '-m', 'lancelot.distribution',
+                   format_address(self.address)]
+        process = subprocess.Popen(command, env=environment)
+        self._processes[process.pid] = process
+
+    def _replace(self, pid):
+        ''' A worker was lost with work remaining: if it was one of ours,
+        reap it and start another in its place '''
+        process = self._processes.pop(pid, None)
+        if process is not None:
+            process.wait()
+            self._start_worker()
+
+    def _check_started(self, coordinator):
+        ''' Reap local workers that exited without connecting, and give up
+        on the remaining work if that leaves no worker at all, or if no
+        worker has connected within the connect timeout '''
+        connected = coordinator.worker_pids()
+        for pid, process in list(self._processes.items()):
+            if pid not in connected and process.poll() is not None:
+                del self._processes[pid]
+        if self._local_workers and not self._processes and not connected:
+            yield from coordinator.abandon('no worker processes could be '
+                                           'started')
+        if self._connect_timeout is not None and not self._processes \
+        and coordinator.unconnected_for() >= self._connect_timeout:
+            yield from coordinator.abandon('no worker connected within %gs'
+                                           % self._connect_timeout)
+
+
+if __name__ == '__main__':
+    work(sys.argv[1])
@@ -0,0 +1,801 @@
+'''
+Functionality for verifying functions outside of the verifying process,
+for isolation from crashes and leaked global state, or for parallelism
+(including in threads of the verifying process), e.g.
+    AllVerifiable.verify(executor=ForkServerExecution())
+    AllVerifiable.verify(executor=SubinterpreterExecution(shards=4))
+    AllVerifiable.verify(executor=ThreadedExecution(workers=8))
+
+Executors have a verify_each(all_verifiable, verifiable_fns, timeout)
+method, returning an iterator of 1 (verified) or 0 (unverified) for each
+function in turn, as AllVerifiable.verify_fn() does. Outcomes in other
+processes are sent back to the verifying process as JSON records, and
+reported to its listener from there. Executors other than
+ForkServerExecution and ThreadedExecution import the functions by module
+and qualified name in their workers, so functions that cannot be imported
+that way (e.g. in __main__, or nested in other functions) are verified in
+the verifying process instead. Executors verifying functions outside of
+the verifying interpreter have an isolated attribute that is True, so
+that listeners collecting state within it (e.g. BaselineStore) can refuse
+to work with them.
+
+Intended public interface:
+ Classes: ForkServerExecution, ThreadedExecution,
+     SubinterpreterExecution, ProcessPoolExecution, RemoteException,
+     WorkerCrashed (defined in lancelot.verification)
+ Functions: -
+ Variables: -
+
+Intended for internal use:
+ Classes: WorkerListener
+ Functions: encode_outcome(), decode_outcome(), report_record(),
+     verify_shard(), write_record(), subinterpreters()
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import builtins
+import concurrent.futures
+import gc
+import importlib
+import json
+import os
+import select
+import signal
+import sys
+import threading
+import time
+import warnings
+
+from lancelot.verification import AllVerifiable, MultiListener, \
+                                  UnmetSpecification, VerificationTimeout, \
+                                  WorkerCrashed, format_teardown_failure, \
+                                  format_traceback
+
+
+class RemoteException(Exception):
+    ''' Stand-in for an exception raised in another process, whose type
+    could not be recreated in the verifying process '''
+
+    def __init__(self, type_name, message):
+        ''' The qualified name of the type, and str() of the exception '''
+        super().__init__('%s: %s' % (type_name, message))
+        self.type_name = type_name
+
+
+def encode_outcome(exception, statistics=None, duration=None):
+    ''' Encode the outcome of calling a verifiable function (the exception
+    raised if any) as a JSON-compatible record '''
+    record = {'status': 'met', 'statistics': statistics or {}}
+    if duration is not None:
+        record['duration'] = duration
+    if exception is None:
+        return record
+    if isinstance(exception, UnmetSpecification):
+        record['status'] = 'unmet'
+    else:
+        record['status'] = 'unexpected'
+    exception_type = type(exception)
+    record['type'] = '%s.%s' % (exception_type.__module__,
+                                exception_type.__qualname__)
+    record['message'] = str(exception)
+    try:
+        record['args'] = json.loads(json.dumps(exception.args))
+    except (TypeError, ValueError):
+        record['args'] = None
+    record['traceback'] = format_traceback(exception)
+    return record
+
+
+def decode_outcome(record):
+    ''' Recreate the exception from an encoded outcome record, or None.
+    The exception's remote_traceback holds the original traceback. '''
+    if record['status'] in ('met', 'timed_out'):
+        return None
+    if record['status'] == 'unmet':
+        exception = UnmetSpecification(record['message'])
+    else:
+        exception = _recreate(record)
+    exception.remote_traceback = record.get('traceback', [])
+    return exception
+
+
+def _recreate(record):
+    ''' Recreate an unexpected exception: as its own type if builtin '''
+    module, _, name = record['type'].rpartition('.')
+    exception_type = getattr(builtins, name, None)
+    if module == 'builtins' and isinstance(exception_type, type) \
+    and issubclass(exception_type, Exception) and record['args'] is not None:
+        try:
+            return exception_type(*record['args'])
+        except Exception:
+            pass
+    if record['type'] == WorkerCrashed.__module__ + '.WorkerCrashed':
+        return WorkerCrashed(record['message'])
+    return RemoteException(record['type'], record['message'])
+
+
+def _with_teardown_failure(record, teardown_failure):
+    ''' An encoded outcome record, with the exception raised tearing down
+    the function's group: its outcome, if it was met, else reported after
+    its own traceback '''
+    if record['status'] == 'met':
+        return encode_outcome(teardown_failure)
+    if record['status'] != 'timed_out':
+        record['traceback'] = record.get('traceback', []) \
+            + format_teardown_failure(teardown_failure)
+    return record
+
+
+def report_record(all_verifiable, verifiable_fn, record):
+    ''' Report an encoded outcome record to all_verifiable's listener,
+    returning 1 if the function was verified, otherwise 0 '''
+    return all_verifiable.report_outcome(verifiable_fn,
+                                         decode_outcome(record),
+                                         record.get('timeout'),
+                                         record.get('statistics'),
+                                         record.get('duration'))
+
+
+def _describe_exit(status):
+    ''' Describe how a process exited, from its os.waitpid() status '''
+    code = os.waitstatus_to_exitcode(status)
+    if code < 0:
+        try:
+            return 'killed by signal %s' % signal.Signals(-code).name
+        except ValueError:
+            return 'killed by signal %d' % -code
+    return 'exited with status %d' % code
+
+
+class ForkServerExecution:
+    ''' Executor that forks a template process once (with all the spec
+    modules already imported), which then forks a child process for each
+    verifiable function. Crashes, os._exit() calls and leaked state stay
+    within the child, while @grouping setup is done once in the template.
+    A child taking longer than its timeout is killed, and the next
+    function verified in a fresh child. If the template process itself
+    exits (e.g. a group's setup crashes it), the functions it had yet to
+    verify are reported as WorkerCrashed. Where os.fork() is not available
+    the functions are verified in the verifying process instead. '''
+
+    isolated = True
+
+    def verify_each(self, all_verifiable, verifiable_fns, timeout=None):
+        ''' Verify functions, returning an iterator of 1 or 0 for each.
+        The template process is forked straight away, before any listener
+        threads start, and exits when the iterator is exhausted or closed. '''
+        verifiable_fns = list(verifiable_fns)
+        if not hasattr(os, 'fork'):
+            return (all_verifiable.verify_fn(verifiable_fn, timeout)
+                    for verifiable_fn in verifiable_fns)
+        server = _ForkServer(all_verifiable, verifiable_fns, timeout)
+        return server.results()
+
+
+class _ForkServer:
+    ''' The verifying process end of a ForkServerExecution, and the
+    template process it forks '''
+
+    def __init__(self, all_verifiable, verifiable_fns, timeout):
+        ''' Fork the template process for verifying verifiable_fns '''
+        self._all_verifiable = all_verifiable
+        self._fns = verifiable_fns
+        self._timeout = timeout
+        request_read, request_write = os.pipe()
+        response_read, response_write = os.pipe()
+        _flush_std_streams()
+        self._pid = os.fork()
+        if self._pid == 0:
+            os.close(request_write)
+            os.close(response_read)
+            try:
+                self._serve(os.fdopen(request_read, 'r'),
+                            os.fdopen(response_write, 'w'))
+            finally:
+                _flush_std_streams()
+                os._exit(0)
+        os.close(request_read)
+        os.close(response_write)
+        self._requests = os.fdopen(request_write, 'w')
+        self._responses = os.fdopen(response_read, 'r')
+
+    def results(self):
+        ''' Verify each function in a child of the template process,
+        yielding 1 or 0 for each '''
+        try:
+            for index, verifiable_fn in enumerate(self._fns):
+                self._all_verifiable.report_started(verifiable_fn)
+                response = self._request(index)
+                if not response:
+                    yield from self._template_exited(index)
+                    return
+                yield report_record(self._all_verifiable, verifiable_fn,
+                                    json.loads(response))
+        finally:
+            try:
+                self._requests.close()
+            except BrokenPipeError:
+                pass
+            self._responses.close()
+            if self._pid is not None:
+                os.waitpid(self._pid, 0)
+
+    def _request(self, index):
+        ''' Ask the template process to verify the function at index,
+        returning its response, or '' if the template process has exited '''
+        try:
+            self._requests.write('%d\n' % index)
+            self._requests.flush()
+        except BrokenPipeError:
+            return ''
+        return self._responses.readline()
+
+    def _template_exited(self, index):
+        ''' The template process exited (e.g. crashed setting up a group)
+        before verifying the function at index: report it, and each of
+        the functions left, as a WorkerCrashed, yielding 0 for each '''
+        _, status = os.waitpid(self._pid, 0)
+        self._pid = None
+        crashed = WorkerCrashed('fork server %s while verifying'
+                                % _describe_exit(status))
+        yield self._all_verifiable.report_outcome(self._fns[index], crashed)
+        for verifiable_fn in self._fns[index + 1:]:
+            self._all_verifiable.report_started(verifiable_fn)
+            crashed = WorkerCrashed('fork server exited before verifying')
+            yield self._all_verifiable.report_outcome(verifiable_fn, crashed)
+
+    def _serve(self, requests, responses):
+        ''' In the template process: verify the function at each index
+        requested, responding with the encoded outcome '''
+        groupings = self._all_verifiable.groupings()
+        for request in requests:
+            verifiable_fn = self._fns[int(request)]
+            group = self._all_verifiable.grouping_of(verifiable_fn)
+            if group is not None:
+                try:
+                    groupings.set_up(group)
+                except Exception:
+                    pass  # re-raised for the method in the child
+            record = self._verify_in_child(verifiable_fn, groupings)
+            if group is not None:
+                teardown_failure = groupings.finished(group, verifiable_fn)
+                if teardown_failure is not None:
+                    record = _with_teardown_failure(record, teardown_failure)
+            responses.write(json.dumps(record, default=repr) + '\n')
+            responses.flush()
+        groupings.close()
+
+    def _verify_in_child(self, verifiable_fn, groupings):
+        ''' In the template process: fork a child to verify a function,
+        returning the encoded outcome '''
+        result_read, result_write = os.pipe()
+        _flush_std_streams()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(result_read)
+            try:
+                groupings.freeze()
+                exception, statistics = self._all_verifiable.call_fn(
+                    verifiable_fn)
+                record = encode_outcome(exception, statistics)
+                with os.fdopen(result_write, 'w') as result:
+                    result.write(json.dumps(record, default=repr))
+            finally:
+                _flush_std_streams()
+                os._exit(0)
+        os.close(result_write)
+        timeout = self._all_verifiable.timeout_for(verifiable_fn,
+                                                   self._timeout)
+        data, timed_out = _read_until(result_read, timeout)
+        os.close(result_read)
+        if timed_out:
+            os.kill(pid, signal.SIGKILL)
+        _, status = os.waitpid(pid, 0)
+        duration = time.perf_counter() - started
+        if timed_out:
+            return {'status': 'timed_out', 'timeout': timeout,
+                    'duration': duration}
+        if not data:
+            crashed = WorkerCrashed('worker process %s while verifying'
+                                    % _describe_exit(status))
+            return encode_outcome(crashed, duration=duration)
+        return dict(json.loads(data), duration=duration)
+
+
+def _read_until(fd, timeout):
+    ''' Read from fd until end of file, or until timeout seconds have
+    passed. Returns (data read, whether timed out). '''
+    chunks = []
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return b''.join(chunks), True
+        ready, _, _ = select.select([fd], [], [], remaining)
+        if not ready:
+            continue
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return b''.join(chunks), False
+        chunks.append(chunk)
+
+
+def _flush_std_streams():
+    ''' Flush stdout and stderr, so buffered output is not duplicated in
+    forked processes or lost when they exit '''
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (AttributeError, ValueError):
+            pass
+
+
+class ThreadedExecution:
+    ''' Executor that verifies functions in a pool of threads, reporting
+    each outcome from the verifying thread as soon as it is known. Only
+    functions that release the GIL (e.g. waiting on I/O) run in parallel. '''
+
+    def __init__(self, workers=None):
+        ''' The number of threads (by default, as for ThreadPoolExecutor) '''
+        self._workers = workers
+
+    def verify_each(self, all_verifiable, verifiable_fns, timeout=None):
+        ''' Verify functions, returning an iterator of 1 or 0 for each '''
+        return self._results(all_verifiable, list(verifiable_fns), timeout)
+
+    def _results(self, all_verifiable, verifiable_fns, timeout):
+        ''' Report and yield results in the order functions finish '''
+        pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._workers, thread_name_prefix='lancelot-verify')
+        try:
+            futures = dict((pool.submit(self._call, all_verifiable,
+                                        verifiable_fn, timeout),
+                            verifiable_fn)
+                           for verifiable_fn in verifiable_fns)
+            for future in concurrent.futures.as_completed(futures):
+                verifiable_fn = futures[future]
+                exception, statistics, duration = future.result()
+                all_verifiable.report_started(verifiable_fn)
+                fn_timeout = all_verifiable.timeout_for(verifiable_fn,
+                                                        timeout)
+                if isinstance(exception, VerificationTimeout):
+                    yield all_verifiable.report_outcome(
+                        verifiable_fn, timed_out=fn_timeout,
+                        statistics=statistics, duration=duration)
+                else:
+                    yield all_verifiable.report_outcome(
+                        verifiable_fn, exception, statistics=statistics,
+                        duration=duration)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _call(self, all_verifiable, verifiable_fn, timeout):
+        ''' In a thread: call a function, returning (exception raised or
+        None, statistics collected, duration) '''
+        started = time.perf_counter()
+        fn_timeout = all_verifiable.timeout_for(verifiable_fn, timeout)
+        exception, statistics = all_verifiable.call_fn(verifiable_fn,
+                                                       fn_timeout)
+        return exception, statistics, time.perf_counter() - started
+
+
+class WorkerListener:
+    ''' Listener in a worker, sending an encoded outcome record for each
+    function verified (identified by its key in ids) to send(record) '''
+
+    def __init__(self, send):
+        ''' Records are sent by calling send '''
+        self._send = send
+        self._started = {}
+        self.ids = {}
+
+    def all_verifiable_starting(self, all_verifiable):
+        ''' A verification run is starting '''
+        pass
+
+    def verification_started(self, verifiable_fn):
+        ''' A verification of a single function is starting '''
+        self._started[verifiable_fn] = time.perf_counter()
+
+    def specification_met(self, verifiable_fn):
+        ''' A verification of a function has completed successfully '''
+        self._record(verifiable_fn, encode_outcome(None))
+
+    def specification_unmet(self, verifiable_fn, unmet):
+        ''' A verification of a function has completed unsuccessfully '''
+        self._record(verifiable_fn, encode_outcome(unmet))
+
+    def unexpected_exception(self, verifiable_fn, exception):
+        ''' An unexpected exception was raised from a function '''
+        self._record(verifiable_fn, encode_outcome(exception))
+
+    def verification_timed_out(self, verifiable_fn, timeout):
+        ''' A verification of a function did not finish in time '''
+        self._record(verifiable_fn, {'status': 'timed_out',
+                                     'timeout': timeout})
+
+    def all_verifiable_ending(self, all_verifiable, outcome):
+        ''' Send the statistics collected in the worker '''
+        statistics = dict((name, amount) for name, amount in outcome.items()
+                          if name not in ('total', 'verified', 'unverified'))
+        self._send({'id': None, 'statistics': statistics})
+
+    def _record(self, verifiable_fn, record):
+        ''' Send a record for a function with a known key '''
+        started = self._started.pop(verifiable_fn, None)
+        if started is not None:
+            record['duration'] = time.perf_counter() - started
+        if verifiable_fn in self.ids:
+            record['id'] = self.ids[verifiable_fn]
+            self._send(record)
+
+
+def _resolve(module_name, qualname):
+    ''' Import a verifiable function by name, returning (function,
+    grouping class or None) '''
+    parent = None
+    verifiable_fn = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        parent, verifiable_fn = verifiable_fn, getattr(verifiable_fn, name)
+    if isinstance(parent, type):
+        return verifiable_fn, parent
+    return verifiable_fn, None
+
+
+def verify_shard(entries, send, timeout=None):
+    ''' In a worker: import and verify the functions identified by entries,
+    [(key, module name, qualified name, timeout)...], calling send(record)
+    with each outcome. A function whose module cannot be imported (e.g. as
+    it does not support sub-interpreters) is sent as "unsupported". '''
+    listener = WorkerListener(send)
+    all_verifiable = AllVerifiable(listener)
+    groupings = set()
+    for key, module_name, qualname, fn_timeout in entries:
+        try:
+            verifiable_fn, grouping_class = _resolve(module_name, qualname)
+        except ImportError as error:
+            send({'id': key, 'status': 'unsupported', 'message': str(error)})
+            continue
+        if grouping_class is not None and grouping_class not in groupings:
+            groupings.add(grouping_class)
+            all_verifiable.include_grouping(grouping_class)
+        all_verifiable.include(verifiable_fn, fn_timeout)
+        listener.ids[verifiable_fn] = key
+    all_verifiable.verify(timeout=timeout)
+
+
+def _worker_entries(all_verifiable, verifiable_fns, timeout):
+    ''' Split functions into ([(key, module name, qualified name, timeout)
+    ...] for those importable by name in a worker, [other functions]) '''
+    entries = []
+    others = []
+    for key, verifiable_fn in enumerate(verifiable_fns):
+        module_name = getattr(verifiable_fn, '__module__', None)
+        qualname = getattr(verifiable_fn, '__qualname__', '<unknown>')
+        if not module_name or module_name == '__main__' or '<' in qualname:
+            others.append(verifiable_fn)
+            continue
+        fn_timeout = all_verifiable.timeout_for(verifiable_fn, timeout)
+        entries.append((key, module_name, qualname, fn_timeout))
+    return entries, others
+
+
+def _units(entries):
+    ''' Split entries into units, [[entry...]...] in order of entries: the
+    methods of each grouping (to be verified together, so that its setup
+    is shared), or a single function '''
+    units = {}  # grouping (or function) -> [entry...], in order of entries
+    for entry in entries:
+        key, module_name, qualname, fn_timeout = entry
+        if '.' in qualname:
+            unit = (module_name, qualname.rpartition('.')[0])
+        else:
+            unit = key
+        units.setdefault(unit, []).append(entry)
+    return list(units.values())
+
+
+def _shards(entries, count):
+    ''' Split entries into up to count shards of contiguous entries, keeping
+    the methods of each grouping in the same shard, so that its setup is
+    shared '''
+    size = max(1, -(-len(entries) // max(1, count)))
+    shards = []
+    for unit_entries in _units(entries):
+        if not shards or len(shards[-1]) >= size:
+            shards.append([])
+        shards[-1].extend(unit_entries)
+    return shards
+
+
+class _ShardedExecution:
+    ''' Base executor: verifies shards of functions in workers, reporting
+    each outcome as it arrives, then verifies any functions the workers
+    could not in the verifying process '''
+
+    isolated = True
+
+    def __init__(self, shards=None):
+        ''' The number of shards (by default, the number of CPUs) '''
+        self._shards = shards or os.cpu_count() or 1
+
+    def verify_each(self, all_verifiable, verifiable_fns, timeout=None):
+        ''' Verify functions, returning an iterator of 1 or 0 for each '''
+        return self._results(all_verifiable, list(verifiable_fns), timeout)
+
+    def _results(self, all_verifiable, verifiable_fns, timeout):
+        ''' Report and yield results from the workers, then from the
+        verifying process for functions the workers could not verify '''
+        entries, others = _worker_entries(all_verifiable, verifiable_fns,
+                                          timeout)
+        records = self._records(_shards(entries, self._shards), timeout)
+        try:
+            for record in records:
+                if record['id'] is None:
+                    all_verifiable.add_statistics(record['statistics'])
+                    continue
+                verifiable_fn = verifiable_fns[record['id']]
+                if record['status'] == 'unsupported':
+                    others.append(verifiable_fn)
+                    continue
+                all_verifiable.report_started(verifiable_fn)
+                yield report_record(all_verifiable, verifiable_fn, record)
+        finally:
+            records.close()
+        for verifiable_fn in others:
+            yield all_verifiable.verify_fn(verifiable_fn, timeout)
+
+    def _records(self, shards, timeout):
+        ''' Subclasses yield the records sent by workers verifying shards '''
+        return iter(())
+
+
+def subinterpreters():
+    ''' The sub-interpreter API available, as (create, run, destroy)
+    functions, or None. Interpreters are created with their own GIL where
+    the Python version allows (3.12+). '''
+    try:
+        from concurrent import interpreters  # Python 3.14+
+    except ImportError:
+        pass
+    else:
+        return (interpreters.create,
+                lambda interpreter, code: interpreter.exec(code),
+                lambda interpreter: interpreter.close())
+    try:
+        import _interpreters  # Python 3.13
+    except ImportError:
+        pass
+    else:
+        def run(interpreter_id, code):
+            ''' Run code, raising an exception if it fails '''
+            failure = _interpreters.exec(interpreter_id, code)
+            if failure is not None:
+                raise RuntimeError(failure.formatted)
+        return (lambda: _interpreters.create('isolated'), run,
+                _interpreters.destroy)
+    try:
+        import _xxsubinterpreters  # Python 3.8 - 3.12
+    except ImportError:
+        return None
+
+    def create():
+        ''' Create an interpreter with its own GIL if possible '''
+        try:
+            return _xxsubinterpreters.create(isolated=True)
+        except TypeError:
+            return _xxsubinterpreters.create()
+    return (create, _xxsubinterpreters.run_string, _xxsubinterpreters.destroy)
+
+
+_SHARD_SCRIPT = '''
+import sys
+sys.path[:] = %(path)r
+from lancelot.execution import verify_shard, write_record
+verify_shard(%(entries)r, lambda record: write_record(%(fd)d, record),
+             %(timeout)r)
+'''
+
+
+class SubinterpreterExecution(_ShardedExecution):
+    ''' Executor that verifies shards of functions in sub-interpreters,
+    each run from its own thread, on CPython 3.13+. Records are sent back
+    as JSON lines over a pipe per shard. Each sub-interpreter imports
+    lancelot and the verified modules afresh, so this isolates shards
+    within one process but is typically slower, and uses more memory,
+    than a ProcessPoolExecution: measure both with
+    python -m lancelot.execution before choosing it.
+
+    Isolated sub-interpreters don't allow daemon threads, so functions
+    with a timeout (verified under a watchdog thread), or that start
+    daemon threads of their own, are verified in the main interpreter
+    instead, as are functions in modules that cannot be imported in a
+    sub-interpreter. Before 3.13, importing asyncio (as lancelot does)
+    corrupts the memory of the host process, so there the shards are
+    verified by a ProcessPoolExecution instead: the fell_back attribute
+    is then True, and constructing the executor issues a RuntimeWarning. '''
+
+    def __init__(self, shards=None):
+        ''' The number of shards (by default, the number of CPUs) '''
+        super().__init__(shards)
+        self._api = subinterpreters() if sys.version_info >= (3, 13) \
+            else None
+        self.fell_back = self._api is None
+        if self.fell_back:
+            warnings.warn('sub-interpreters are not usable on Python %d.%d: '
+                          'verifying in a process pool instead'
+                          % sys.version_info[:2], RuntimeWarning,
+                          stacklevel=2)
+
+    def _records(self, shards, timeout):
+        ''' Yield the records sent from each shard's sub-interpreter '''
+        if self.fell_back:
+            yield from ProcessPoolExecution(self._shards)._records(shards,
+                                                                   timeout)
+            return
+        api = self._api
+        readers = {}
+        threads = []
+        for shard in shards:
+            supported = []
+            for entry in shard:
+                if entry[3] is None:
+                    supported.append(entry)
+                else:
+                    yield {'id': entry[0], 'status': 'unsupported'}
+            if not supported:
+                continue
+            read_fd, write_fd = os.pipe()
+            readers[read_fd] = (b'', supported, set())
+            thread = threading.Thread(target=self._run_shard,
+                                      args=(api, supported, write_fd,
+                                            timeout),
+                                      name='lancelot-subinterpreter',
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+        try:
+            for record in _read_records(readers):
+                if _needed_daemon_threads(record):
+                    record = {'id': record['id'], 'status': 'unsupported'}
+                yield record
+        finally:
+            for read_fd in readers:
+                os.close(read_fd)
+            for thread in threads:
+                thread.join()
+
+    def _run_shard(self, api, shard, write_fd, timeout):
+        ''' In a thread: verify a shard in a new sub-interpreter '''
+        create, run, destroy = api
+        script = _SHARD_SCRIPT % {'path': list(sys.path), 'fd': write_fd,
+                                  'entries': shard, 'timeout': timeout}
+        try:
+            interpreter = create()
+            try:
+                run(interpreter, script)
+            finally:
+                destroy(interpreter)
+        except Exception as error:
+            failure = encode_outcome(WorkerCrashed(
+                'sub-interpreter failed: %s' % error))
+            failure['id'] = 'shard'
+            write_record(write_fd, failure)
+        finally:
+            os.close(write_fd)
+
+
+def _needed_daemon_threads(record):
+    ''' Whether a record is of a function that failed as daemon threads
+    are disabled in sub-interpreters '''
+    return record.get('type') == 'builtins.RuntimeError' \
+        and 'daemon threads are disabled' in record.get('message', '')
+
+
+def write_record(fd, record):
+    ''' Write a record to fd as a JSON line '''
+    data = (json.dumps(record, default=repr) + '\n').encode('utf-8')
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _read_records(readers):
+    ''' Yield records from JSON lines written to several pipes, until
+    each is closed. readers maps each fd to (unread bytes, shard entries,
+    keys of records seen). Entries in a shard without a record when its
+    pipe closes (e.g. as its worker failed) are yielded as unsupported. '''
+    while readers:
+        ready, _, _ = select.select(list(readers), [], [])
+        for read_fd in ready:
+            unread, shard, seen = readers[read_fd]
+            chunk = os.read(read_fd, 65536)
+            unread += chunk
+            lines = unread.split(b'\n')
+            readers[read_fd] = (lines.pop(), shard, seen)
+            for line in lines:
+                record = json.loads(line)
+                if record['id'] == 'shard':
+                    continue
+                seen.add(record['id'])
+                yield record
+            if not chunk:
+                del readers[read_fd]
+                for entry in shard:
+                    if entry[0] not in seen:
+                        yield {'id': entry[0], 'status': 'unsupported'}
+
+
+def _verify_shard_in_process(entries, timeout):
+    ''' In a worker process: verify a shard, returning its records '''
+    records = []
+    verify_shard(entries, records.append, timeout)
+    return records
+
+
+class ProcessPoolExecution(_ShardedExecution):
+    ''' Executor that verifies shards of functions in a pool of worker
+    processes, each importing the spec modules it needs. Records for a
+    shard are reported when the whole shard has been verified. '''
+
+    def __init__(self, shards=None, workers=None, mp_context=None):
+        ''' The number of shards, worker processes (by default, the number
+        of CPUs) and the multiprocessing context to start them with '''
+        super().__init__(shards)
+        self._workers = workers
+        self._mp_context = mp_context
+
+    def _records(self, shards, timeout):
+        ''' Yield the records returned by each shard's worker process '''
+        if not shards:
+            return
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self._workers or min(len(shards), self._shards),
+            mp_context=self._mp_context)
+        futures = {}
+        try:
+            for shard in shards:
+                future = pool.submit(_verify_shard_in_process, shard, timeout)
+                futures[future] = shard
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    records = future.result()
+                except Exception as error:
+                    crashed = encode_outcome(WorkerCrashed(
+                        'worker process failed: %r' % error))
+                    records = [dict(crashed, id=entry[0])
+                               for entry in futures[future]]
+                yield from records
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _benchmark(executor_name, shards):
+    ''' Measure the time taken, and the peak memory used, to verify the
+    comparator, constraint and specification specs with an executor: run as
+    python -m lancelot.execution {subinterpreter|process-pool} shards
+    (in a fresh process for each measurement, so peak memory is its own) '''
+    import resource
+    from lancelot.specs import comparator_spec, constraint_spec, \
+        specification_spec
+    from lancelot.verification import ALL_VERIFIABLE
+    executors = {'subinterpreter': SubinterpreterExecution,
+                 'process-pool': ProcessPoolExecution}
+    ALL_VERIFIABLE.set_listener(MultiListener())
+    gc.collect()
+    started = time.perf_counter()
+    outcome = ALL_VERIFIABLE.verify(executor=executors[executor_name](shards))
+    elapsed = time.perf_counter() - started
+    own_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print('%s: %d shards, %d of %d verified in %.3fs; peak RSS %d MB in '
+          'the verifying process, %d MB in its largest child process'
+          % (executor_name, shards, outcome['verified'], outcome['total'],
+             elapsed, own_kb // 1024, child_kb // 1024))
+
+
+if __name__ == '__main__':
+    _benchmark(sys.argv[1], int(sys.argv[2]))
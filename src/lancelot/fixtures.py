@@ -0,0 +1,414 @@
+'''
+Functionality for building expensive given= initial state once per scope
+and handing each Spec an isolated copy of it, e.g.
+    @fixture(scope='module')
+    def populated_index(): ...
+    spec = Spec(Index, given=populated_index)
+and for persisting deterministic state on disk between verification runs,
+rebuilding it only when its declared inputs change, e.g.
+    @persistent(inputs=['data/reference.csv'])
+    def reference_dataset(): ...
+
+Intended public interface:
+ Classes: Fixture, PersistentFixture
+ Functions: fixture [used as "@fixture(...)" in client code],
+     persistent [used as "@persistent(...)" in client code]
+ Variables: SCOPES, FORMATS
+
+Intended for internal use:
+ Functions: _scope_key(), _file_digest(), _default_cache_dir(), _lock(),
+     _unlock()
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import collections
+import copy
+import hashlib
+import inspect
+import json
+import mmap
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: builds are not locked
+    fcntl = None
+
+from lancelot.verification import running
+
+SCOPES = ('spec', 'grouping', 'module', 'run')
+FORMATS = ('pickle', 'mmap')
+
+
+def _scope_key(scope):
+    ''' The key identifying the current instance of a scope: state built
+    for one key is reused until the key changes. Outside of a verification
+    run every scope is treated as a single instance. '''
+    verification = running()
+    if verification is None:
+        return None
+    run, verifiable_fn, grouping_class = verification
+    if scope == 'grouping':
+        return grouping_class or verifiable_fn
+    if scope == 'module':
+        return getattr(verifiable_fn, '__module__', None)
+    return None if run is None else run.scope
+
+
+class Fixture:
+    ''' A given= callable that builds its initial state once per scope and
+    returns an isolated copy of that state on each call '''
+
+    def __init__(self, given, scope='module', clone='deepcopy',
+                 max_states=8):
+        ''' given is the callable that builds the initial state.
+        scope is one of SCOPES: 'spec' builds new state for every Spec,
+        the others build state once per grouping, module or verification
+        run respectively (state is shared within the verifying process, so
+        executors verifying functions in other processes build their own).
+        clone is how each Spec gets its own copy of the state: 'deepcopy',
+        'pickle' (restore from a snapshot taken when built) or a callable
+        taking the built state and returning a copy of it.
+        max_states is how many scope instances' states are kept, the least
+        recently used being discarded, e.g. for interleaved modules. '''
+        if scope not in SCOPES:
+            msg = 'scope %r is not one of %s' % (scope, ', '.join(SCOPES))
+            raise ValueError(msg)
+        if clone not in ('deepcopy', 'pickle') and not callable(clone):
+            msg = "clone %r is not 'deepcopy', 'pickle' or callable"
+            raise ValueError(msg % (clone,))
+        self._given = given
+        self._scope = scope
+        self._clone = clone
+        self._max_states = max_states
+        self._lock = threading.Lock()
+        self._states = collections.OrderedDict()  # key -> (state, seconds)
+        self._time_saved = 0.0
+        self.__name__ = getattr(given, '__name__', 'fixture')
+        self.__doc__ = getattr(given, '__doc__', None)
+
+    def __call__(self):
+        ''' Return an isolated copy of the initial state for the current
+        scope, building the state first if necessary '''
+        if self._scope == 'spec':
+            return self._given()
+        with self._lock:
+            key = _scope_key(self._scope)
+            if key not in self._states:
+                return self._copy(self._build(key)[0])
+            self._states.move_to_end(key)
+            state, build_time = self._states[key]
+            started = time.perf_counter()
+            state = self._copy(state)
+            self._saved(build_time - (time.perf_counter() - started))
+            return state
+
+    def _build(self, key):
+        ''' Build the initial state for the scope instance with key,
+        returning (state, seconds taken to build it) '''
+        started = time.perf_counter()
+        state = self._given()
+        if self._clone == 'pickle':
+            state = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        self._states[key] = state, time.perf_counter() - started
+        while len(self._states) > self._max_states:
+            self._states.popitem(last=False)
+        return self._states[key]
+
+    def _copy(self, state):
+        ''' An isolated copy of the built initial state '''
+        if self._clone == 'deepcopy':
+            return copy.deepcopy(state)
+        if self._clone == 'pickle':
+            return pickle.loads(state)
+        return self._clone(state)
+
+    def _saved(self, seconds):
+        ''' Note the time saved by not building the state again (none, if
+        copying took longer), in the innermost verification run '''
+        seconds = max(seconds, 0.0)
+        self._time_saved += seconds
+        verification = running()
+        if verification is not None and verification[0] is not None:
+            verification[0].add_statistic('fixture_time_saved', seconds)
+
+    def time_saved(self):
+        ''' Total seconds saved by copying rather than rebuilding state '''
+        return self._time_saved
+
+
+def fixture(decorated_fn=None, scope='module', clone='deepcopy',
+            max_states=8):
+    ''' Function decorator: turns a given= callable into a Fixture.
+    Used as @fixture, or as @fixture(scope=..., clone=...) '''
+    if decorated_fn is None:
+        return lambda fn: Fixture(fn, scope, clone, max_states)
+    return Fixture(decorated_fn, scope, clone, max_states)
+
+
+_DIGESTS = {}  # (path, size, mtime) -> digest of file contents
+
+
+def _file_digest(path):
+    ''' Digest of a file's contents, or of all the files in a directory '''
+    if os.path.isdir(path):
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                relative_path = os.path.relpath(file_path, path)
+                digest.update(relative_path.encode('utf-8'))
+                digest.update(_file_digest(file_path).encode('ascii'))
+        return digest.hexdigest()
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _DIGESTS:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as contents:
+            for block in iter(lambda: contents.read(1 << 20), b''):
+                digest.update(block)
+        _DIGESTS[key] = digest.hexdigest()
+    return _DIGESTS[key]
+
+
+def _default_cache_dir():
+    ''' $LANCELOT_FIXTURE_CACHE, or lancelot/fixtures in the user cache '''
+    if 'LANCELOT_FIXTURE_CACHE' in os.environ:
+        return os.environ['LANCELOT_FIXTURE_CACHE']
+    cache_home = os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'lancelot', 'fixtures')
+
+
+def _lock(path, blocking=True):
+    ''' Open and flock the lock file at path, returning it, or None if
+    blocking is False and another process holds the lock. A lock file may
+    be removed by its holder, so the lock is taken again if the file at
+    path isn't the one locked (i.e. it was removed while waiting). '''
+    while True:
+        lock = open(path, 'a')
+        if fcntl is None:
+            return lock
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking
+                        else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        try:
+            if os.path.samestat(os.stat(path), os.fstat(lock.fileno())):
+                return lock
+        except FileNotFoundError:
+            pass
+        lock.close()
+
+
+def _unlock(lock, remove=False):
+    ''' Release a lock taken by _lock(), removing its file first if
+    specified (which is safe while it's held, as _lock() then retries) '''
+    try:
+        if remove:
+            try:
+                os.remove(lock.name)
+            except OSError:
+                pass
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    finally:
+        lock.close()
+
+
+class PersistentFixture:
+    ''' A given= callable whose (deterministic) state is stored on disk and
+    loaded by later verification runs, and by parallel workers, instead of
+    being rebuilt. The state is rebuilt whenever the content of its declared
+    inputs, its params or the source code of the callable change. '''
+
+    def __init__(self, given, inputs=(), params=None, cache_dir=None,
+                 max_bytes=1 << 30, format='pickle'):
+        ''' given is the callable that builds the state.
+        inputs are the paths of files (or directories) the state is built
+        from, and params any other values it depends upon.
+        cache_dir is where states are stored: least recently used states
+        are removed whenever the directory grows beyond max_bytes.
+        format is one of FORMATS: 'pickle' for any picklable state, or
+        'mmap' for bytes-like state which is loaded as a read-only mmap. '''
+        if format not in FORMATS:
+            msg = 'format %r is not one of %s' % (format, ', '.join(FORMATS))
+            raise ValueError(msg)
+        self._given = given
+        self._inputs = tuple(inputs)
+        self._params = params
+        self._cache_dir = cache_dir or _default_cache_dir()
+        self._max_bytes = max_bytes
+        self._format = format
+        self.__name__ = getattr(given, '__name__', 'fixture')
+        self.__doc__ = getattr(given, '__doc__', None)
+
+    def key(self):
+        ''' The content hash identifying the state for the current inputs '''
+        digest = hashlib.sha256()
+        digest.update(('%s.%s' % (getattr(self._given, '__module__', ''),
+                                  self.__name__)).encode('utf-8'))
+        try:
+            source = inspect.getsource(self._given)
+        except (OSError, TypeError):
+            source = repr(getattr(self._given, '__code__', self._given))
+        digest.update(source.encode('utf-8'))
+        digest.update(repr(sorted((self._params or {}).items()))
+                      .encode('utf-8'))
+        for path in self._inputs:
+            digest.update(os.fspath(path).encode('utf-8'))
+            digest.update(_file_digest(path).encode('ascii'))
+        digest.update(self._format.encode('ascii'))
+        return digest.hexdigest()
+
+    def path(self):
+        ''' The path of the stored state for the current inputs '''
+        return os.path.join(self._cache_dir, '%s.%s' % (self.key(),
+                                                        self._format))
+
+    def __call__(self):
+        ''' Load the stored state, building and storing it if necessary '''
+        path = self.path()
+        os.makedirs(self._cache_dir, exist_ok=True)
+        lock = _lock(path + '.lock')
+        try:
+            if not os.path.exists(path):
+                state = self._build(path)
+                self._evict(keep=path)
+                return state
+            started = time.perf_counter()
+            state = self._load(path)
+            self._saved(path, time.perf_counter() - started)
+            return state
+        finally:
+            _unlock(lock)
+
+    def _build(self, path):
+        ''' Build the state and store it (atomically) at path '''
+        started = time.perf_counter()
+        state = self._given()
+        build_time = time.perf_counter() - started
+
+        def write_state(stored):
+            ''' Write the state, in its format '''
+            if self._format == 'mmap':
+                stored.write(memoryview(state))
+            else:
+                pickle.dump(state, stored, pickle.HIGHEST_PROTOCOL)
+
+        def write_meta(meta):
+            ''' Write what is known about the state '''
+            json.dump({'build_time': build_time, 'name': self.__name__},
+                      meta)
+        self._write(path + '.meta', 'w', write_meta)
+        self._write(path, 'wb', write_state)
+        if self._format == 'mmap':
+            return self._load(path)
+        return state
+
+    def _write(self, path, mode, write):
+        ''' Write a file atomically, by calling write() with a temporary
+        file (opened in mode) that replaces path if it succeeds '''
+        handle, temp_path = tempfile.mkstemp(dir=self._cache_dir,
+                                             suffix='.tmp')
+        try:
+            with os.fdopen(handle, mode) as temp:
+                write(temp)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def _load(self, path):
+        ''' Load the state stored at path, marking it as recently used '''
+        os.utime(path)
+        with open(path, 'rb') as stored:
+            if self._format == 'mmap':
+                if os.fstat(stored.fileno()).st_size == 0:
+                    return b''
+                return mmap.mmap(stored.fileno(), 0, access=mmap.ACCESS_READ)
+            return pickle.load(stored)
+
+    def _saved(self, path, load_time):
+        ''' Note the time saved by loading rather than rebuilding state '''
+        try:
+            with open(path + '.meta') as meta:
+                build_time = json.load(meta)['build_time']
+        except (OSError, ValueError, KeyError):
+            return
+        verification = running()
+        if verification is not None and verification[0] is not None:
+            verification[0].add_statistic('fixture_time_saved',
+                                          max(build_time - load_time, 0.0))
+
+    def _evict(self, keep):
+        ''' Remove least recently used states until the cache directory
+        is no larger than max_bytes, always keeping the state at keep.
+        States locked by another process (being built or loaded) are kept
+        too. The lock files of states removed, or that were never stored
+        (e.g. as their building failed), are removed as well. '''
+        entries = []
+        unstored = []
+        for name in os.listdir(self._cache_dir):
+            path = os.path.join(self._cache_dir, name)
+            stem, extension = os.path.splitext(path)
+            if extension == '.lock' and not os.path.exists(stem):
+                unstored.append(stem)
+            if extension[1:] not in FORMATS or path == keep:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        total += os.path.getsize(keep)
+        for _, size, path in sorted(entries):
+            if total <= self._max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+        for path in unstored:
+            self._remove(path, unstored=True)
+
+    def _remove(self, path, unstored=False):
+        ''' Remove the state at path (with its metadata and lock file)
+        unless it's locked, returning whether it was removed. If unstored,
+        they are only removed if the state hasn't been stored meanwhile. '''
+        lock = _lock(path + '.lock', blocking=False)
+        if lock is None:
+            return False
+        if unstored and os.path.exists(path):
+            _unlock(lock)
+            return False
+        try:
+            for stale_path in (path, path + '.meta'):
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    pass
+        finally:
+            _unlock(lock, remove=True)
+        return True
+
+
+def persistent(decorated_fn=None, inputs=(), params=None, cache_dir=None,
+               max_bytes=1 << 30, format='pickle'):
+    ''' Function decorator: turns a given= callable into a
+    PersistentFixture. Used as @persistent(inputs=[...], ...) '''
+    if decorated_fn is None:
+        return lambda fn: PersistentFixture(fn, inputs, params, cache_dir,
+                                            max_bytes, format)
+    return PersistentFixture(decorated_fn, inputs, params, cache_dir,
+                             max_bytes, format)
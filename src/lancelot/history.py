@@ -0,0 +1,263 @@
+'''
+Functionality for keeping a history of verification runs in a local SQLite
+database, and for reporting verifiable functions whose duration or peak
+memory has drifted upwards against their own history, e.g.
+    AllVerifiable(listener=[ConsoleListener(), HistoryListener()])
+then
+    python -m lancelot.history report --db .lancelot-history.sqlite
+
+A function has regressed when the median of its most recent runs exceeds
+the median of the runs before them (its rolling baseline) by a factor of
+more than threshold, and by more than a minimum absolute amount so that
+noise in very quick functions is not reported. Only runs in which its
+specification was met are compared.
+
+Intended public interface:
+ Classes: HistoryListener, Regression
+ Functions: regressions(), report()
+ Variables: DEFAULT_DATABASE, METRICS
+
+Intended for internal use:
+ Functions: connect(), main()
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import argparse
+import collections
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+
+from lancelot.verification import qualified_name
+
+DEFAULT_DATABASE = '.lancelot-history.sqlite'
+METRICS = {'duration': 0.001,  # minimum regression: seconds
+           'peak_memory': 65536}  # minimum regression: bytes
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL,
+    label TEXT,
+    host TEXT,
+    python TEXT,
+    total INTEGER,
+    verified INTEGER,
+    unverified INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL,
+    peak_memory INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_by_name ON results (name, run_id);
+'''
+
+Regression = collections.namedtuple('Regression',
+                                    'name metric baseline recent ratio')
+Regression.__doc__ = ''' A function whose median duration (in seconds) or
+peak_memory (in bytes) over its recent runs has regressed from its median
+over the baseline runs before them, by a factor of ratio '''
+
+
+def connect(path=DEFAULT_DATABASE):
+    ''' A connection to the history database at path, created if need be '''
+    connection = sqlite3.connect(path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+class HistoryListener:
+    ''' Listener that writes each verification run, with the status,
+    duration and peak memory of each function verified, to a SQLite
+    database. Peak memory is measured with tracemalloc (which slows the
+    verification down) for functions verified in the verifying process,
+    one at a time; it is not recorded for functions verified by executors
+    in other processes or threads. '''
+
+    def __init__(self, path=DEFAULT_DATABASE, label=None, memory=True):
+        ''' path is the database file, and label is recorded with each run
+        (e.g. a commit id). If memory is False peak memory isn't measured. '''
+        self._path = path
+        self._label = label
+        self._memory = memory
+        self._connection = None
+        self._run_id = None
+        self._all_verifiable = None
+        self._started = {}
+        self._traced_memory = None
+        self._started_tracing = False
+
+    def all_verifiable_starting(self, all_verifiable):
+        ''' A verification run is starting: record it '''
+        self._all_verifiable = all_verifiable
+        self._connection = connect(self._path)
+        cursor = self._connection.execute(
+            'INSERT INTO runs (started, label, host, python) '
+            'VALUES (?, ?, ?, ?)',
+            (time.time(), self._label, platform.node(),
+             platform.python_version()))
+        self._run_id = cursor.lastrowid
+        if self._memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def verification_started(self, verifiable_fn):
+        ''' A verification of a single function is starting '''
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._traced_memory = tracemalloc.get_traced_memory()[0]
+        self._started[verifiable_fn] = time.perf_counter()
+
+    def specification_met(self, verifiable_fn):
+        ''' A verification of a function has completed successfully '''
+        self._record(verifiable_fn, 'met')
+
+    def specification_unmet(self, verifiable_fn, unmet):
+        ''' A verification of a function has completed unsuccessfully '''
+        self._record(verifiable_fn, 'unmet')
+
+    def unexpected_exception(self, verifiable_fn, exception):
+        ''' An unexpected exception was raised from a function '''
+        self._record(verifiable_fn, 'unexpected')
+
+    def verification_timed_out(self, verifiable_fn, timeout):
+        ''' A verification of a function did not finish in time '''
+        self._record(verifiable_fn, 'timed_out')
+
+    def all_verifiable_ending(self, all_verifiable, outcome):
+        ''' A verification run is ending: record its outcome '''
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self._connection.execute(
+            'UPDATE runs SET finished = ?, total = ?, verified = ?, '
+            'unverified = ? WHERE id = ?',
+            (time.time(), outcome['total'], outcome['verified'],
+             outcome['unverified'], self._run_id))
+        self._connection.commit()
+        self._connection.close()
+        self._connection = None
+        self._all_verifiable = None
+
+    def _record(self, verifiable_fn, status):
+        ''' Record the outcome of verifying a function '''
+        started = self._started.pop(verifiable_fn, None)
+        duration = None
+        if self._all_verifiable is not None:
+            duration = self._all_verifiable.duration_of(verifiable_fn)
+        peak_memory = None
+        if duration is None and started is not None:
+            duration = time.perf_counter() - started
+            if tracemalloc.is_tracing() and self._traced_memory is not None:
+                peak = tracemalloc.get_traced_memory()[1]
+                peak_memory = max(0, peak - self._traced_memory)
+        self._traced_memory = None
+        self._connection.execute(
+            'INSERT INTO results (run_id, name, status, duration, '
+            'peak_memory) VALUES (?, ?, ?, ?, ?)',
+            (self._run_id, qualified_name(verifiable_fn), status, duration,
+             peak_memory))
+
+
+def regressions(path=DEFAULT_DATABASE, recent=3, baseline=10, threshold=1.5,
+                metrics=tuple(METRICS)):
+    ''' The Regressions of functions in the history database at path: those
+    whose median over their last recent (met) runs exceeds the median over
+    the baseline runs before them by more than a factor of threshold, and
+    by more than the minimum amount in METRICS. Functions with fewer than
+    recent + 1 runs are not considered. '''
+    found = []
+    connection = connect(path)
+    try:
+        for metric in metrics:
+            if metric not in METRICS:
+                msg = 'metric %r is not one of %s'
+                raise ValueError(msg % (metric, ', '.join(METRICS)))
+            history = collections.defaultdict(list)
+            rows = connection.execute(
+                'SELECT name, %s FROM results '
+                "WHERE status = 'met' AND %s IS NOT NULL "
+                'ORDER BY name, run_id DESC' % (metric, metric))
+            for name, value in rows:
+                if len(history[name]) < recent + baseline:
+                    history[name].append(value)
+            for name, values in sorted(history.items()):
+                regression = _regression(name, metric, values[:recent],
+                                         values[recent:], threshold)
+                if regression is not None:
+                    found.append(regression)
+    finally:
+        connection.close()
+    return found
+
+
+def _regression(name, metric, recent_values, baseline_values, threshold):
+    ''' The Regression from baseline_values to recent_values, if any '''
+    if not recent_values or not baseline_values:
+        return None
+    recent = statistics.median(recent_values)
+    baseline = statistics.median(baseline_values)
+    if recent - baseline <= METRICS[metric]:
+        return None
+    if baseline > 0 and recent / baseline <= threshold:
+        return None
+    ratio = recent / baseline if baseline > 0 else float('inf')
+    return Regression(name, metric, baseline, recent, ratio)
+
+
+def report(found, output=sys.stdout):
+    ''' Print a line for each Regression in found '''
+    units = {'duration': lambda value: '%.3fs' % value,
+             'peak_memory': lambda value: '%.1fKiB' % (value / 1024)}
+    if not found:
+        print('No regressions found', file=output)
+    for regression in found:
+        unit = units[regression.metric]
+        print('%s: %s regressed from %s to %s (x%.2f)'
+              % (regression.name, regression.metric,
+                 unit(regression.baseline), unit(regression.recent),
+                 regression.ratio), file=output)
+
+
+def main(args=None, output=sys.stdout):
+    ''' Command line entry point: reports to output, returning 1 if there
+    are regressions '''
+    parser = argparse.ArgumentParser(
+        prog='python -m lancelot.history',
+        description='Report verifiable functions whose duration or peak '
+                    'memory has regressed against their run history.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    report_parser = commands.add_parser('report', help='report regressions')
+    report_parser.add_argument('--db', default=DEFAULT_DATABASE,
+                               help='history database (default %(default)s)')
+    report_parser.add_argument('--recent', type=int, default=3,
+                               help='recent runs to compare (default 3)')
+    report_parser.add_argument('--baseline', type=int, default=10,
+                               help='runs before them to compare against '
+                                    '(default 10)')
+    report_parser.add_argument('--threshold', type=float, default=1.5,
+                               help='ratio of medians regarded as a '
+                                    'regression (default 1.5)')
+    report_parser.add_argument('--metric', choices=sorted(METRICS),
+                               action='append',
+                               help='metric to compare (default: all)')
+    options = parser.parse_args(args)
+    if not os.path.exists(options.db):
+        parser.error('no history database at %s' % options.db)
+    found = regressions(options.db, options.recent, options.baseline,
+                        options.threshold, options.metric or tuple(METRICS))
+    report(found, output)
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,221 @@
+'''
+Functionality for hunting memory leaks: verifying functions repeatedly and
+watching how much memory they leave behind, e.g.
+    AllVerifiable.verify(executor=LeakDetection(iterations=20))
+
+After some warmup calls (to fill caches and the like), each function is
+called iterations times, with memory retained after each call measured by
+tracemalloc (and objects counted by gc) following a full collection.
+A function leaks if the memory retained never falls, and grows by at least
+min_growth bytes overall, or if more objects are retained after every
+call, at least min_objects more overall. A leak is reported as a
+MemoryLeak (an unmet specification) whose message includes the tracebacks
+of the allocations that grew the most. Methods of a grouping are called
+repeatedly within one setup and teardown of the grouping.
+
+Intended public interface:
+ Classes: LeakDetection, MemoryLeak
+ Functions: -
+ Variables: -
+
+Intended for internal use:
+ -
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import gc
+import linecache
+import tracemalloc
+
+from lancelot import verification
+from lancelot.verification import UnmetSpecification, VerificationTimeout, \
+                                  with_teardown_failure
+
+
+class MemoryLeak(UnmetSpecification):
+    ''' Indicator that a verifiable function retains more memory each time
+    it is called '''
+
+    def __init__(self, msg, retained, objects, differences):
+        ''' retained is [bytes traced] and objects [gc objects] after each
+        call, and differences are tracemalloc.StatisticDiffs of the
+        allocations retained, largest first '''
+        super().__init__(msg)
+        self.retained = retained
+        self.objects = objects
+        self.differences = differences
+
+
+class LeakDetection:
+    ''' Executor that calls each (selected) verifiable function repeatedly,
+    reporting those that leak memory as MemoryLeaks '''
+
+    def __init__(self, iterations=10, warmup=2, min_growth=1024,
+                 min_objects=10, select=None, nframes=25, top=5):
+        ''' Each function is called warmup times, then iterations times
+        while watched for leaks (at least min_growth bytes, or min_objects
+        objects, in all).
+        select(verifiable_fn), if specified, chooses the functions that are
+        watched: others are verified once, as usual. Allocation tracebacks
+        have up to nframes frames, and the top largest are reported. '''
+        if iterations < 2:
+            raise ValueError('iterations %r is less than 2' % (iterations,))
+        self._iterations = iterations
+        self._warmup = warmup
+        self._min_growth = min_growth
+        self._min_objects = min_objects
+        self._select = select
+        self._nframes = nframes
+        self._top = top
+
+    def verify_each(self, all_verifiable, verifiable_fns, timeout=None):
+        ''' Verify functions, returning an iterator of 1 or 0 for each '''
+        return self._results(all_verifiable, list(verifiable_fns), timeout)
+
+    def _results(self, all_verifiable, verifiable_fns, timeout):
+        ''' Report and yield results, tracing allocations meanwhile '''
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self._nframes)
+        try:
+            for verifiable_fn in verifiable_fns:
+                if self._select is not None \
+                and not self._select(verifiable_fn):
+                    yield all_verifiable.verify_fn(verifiable_fn, timeout)
+                    continue
+                all_verifiable.report_started(verifiable_fn)
+                fn_timeout = all_verifiable.timeout_for(verifiable_fn,
+                                                        timeout)
+                exception, statistics = self._hunt_grouped(
+                    all_verifiable, verifiable_fn, fn_timeout)
+                if isinstance(exception, VerificationTimeout):
+                    yield all_verifiable.report_outcome(
+                        verifiable_fn, timed_out=fn_timeout,
+                        statistics=statistics)
+                else:
+                    yield all_verifiable.report_outcome(
+                        verifiable_fn, exception, statistics=statistics)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+    def _hunt_grouped(self, all_verifiable, verifiable_fn, timeout):
+        ''' Hunt for leaks in a function, within one setup and teardown of
+        its grouping (if any): an exception raised by the teardown is
+        returned if the function raised none, else attached to its own '''
+        group = all_verifiable.grouping_of(verifiable_fn)
+        if group is None:
+            return self._hunt(all_verifiable, verifiable_fn, timeout)
+        outcome = None, {}
+        try:
+            with all_verifiable.groupings().repeating(group):
+                outcome = self._hunt(all_verifiable, verifiable_fn, timeout)
+        except Exception as teardown_exception:
+            if outcome[0] is None:
+                return teardown_exception, outcome[1]
+            with_teardown_failure(outcome[0], teardown_exception)
+        return outcome
+
+    def _hunt(self, all_verifiable, verifiable_fn, timeout):
+        ''' Call a function repeatedly, returning (the exception it raised,
+        a MemoryLeak if it leaks, or None; statistics collected over all
+        the calls) '''
+        statistics = {}
+        calls = self._warmup + self._iterations
+        retained = []
+        objects = []
+        first_snapshot = None
+        for call in range(calls):
+            if call == self._warmup:
+                _collect()
+                first_snapshot = _snapshot()
+            exception, collected = all_verifiable.call_fn(verifiable_fn,
+                                                          timeout)
+            for name, amount in collected.items():
+                statistics[name] = statistics.get(name, 0) + amount
+            if exception is not None:
+                return exception, statistics
+            if call >= self._warmup:
+                _collect()
+                retained.append(tracemalloc.get_traced_memory()[0])
+                objects.append(len(gc.get_objects()))
+        if not self._is_leaking(retained, objects):
+            return None, statistics
+        differences = [difference
+                       for difference in _snapshot().compare_to(
+                           first_snapshot, 'traceback')
+                       if difference.size_diff > 0][:self._top]
+        return self._leak(retained, objects, differences), statistics
+
+    def _is_leaking(self, retained, objects):
+        ''' Whether memory, or objects, retained grew monotonically '''
+        memory_steps = [after - before
+                        for before, after in zip(retained, retained[1:])]
+        object_steps = [after - before
+                        for before, after in zip(objects, objects[1:])]
+        if all(step >= 0 for step in memory_steps) \
+        and retained[-1] - retained[0] >= self._min_growth:
+            return True
+        return all(step > 0 for step in object_steps) \
+           and objects[-1] - objects[0] >= self._min_objects
+
+    def _leak(self, retained, objects, differences):
+        ''' A MemoryLeak describing the memory retained and where it was
+        allocated '''
+        lines = ['should not leak memory: %s more retained (%+d objects) '
+                 'over %d calls' % (_format_bytes(retained[-1] - retained[0]),
+                                    objects[-1] - objects[0],
+                                    len(retained) - 1),
+                 'growth after each call: %s' % ', '.join(
+                     _format_bytes(after - before)
+                     for before, after in zip(retained, retained[1:]))]
+        if differences:
+            lines.append('largest growth in allocations retained:')
+        for difference in differences:
+            lines.append('%s in %+d blocks, allocated at:'
+                         % (_format_bytes(difference.size_diff),
+                            difference.count_diff))
+            lines.extend(_format_frames(difference.traceback))
+        return MemoryLeak('\n'.join(lines), retained, objects, differences)
+
+
+def _collect():
+    ''' Collect garbage, fully '''
+    while gc.collect():
+        pass
+
+
+def _snapshot():
+    ''' A tracemalloc snapshot, excluding allocations by tracemalloc and by
+    this module '''
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__, all_frames=True),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')))
+
+
+def _format_frames(traceback):
+    ''' Formatted lines for the frames of an allocation traceback, most
+    recent first, omitting those calling the verifiable function '''
+    frames = list(traceback)  # oldest first
+    for index in range(len(frames) - 1, -1, -1):
+        if frames[index].filename == verification.__file__:
+            frames = frames[index + 1:]
+            break
+    lines = []
+    for frame in reversed(frames):
+        lines.append('  File "%s", line %d' % (frame.filename, frame.lineno))
+        source = linecache.getline(frame.filename, frame.lineno).strip()
+        if source:
+            lines.append('    ' + source)
+    return lines
+
+
+def _format_bytes(amount):
+    ''' An amount of memory in the most readable unit '''
+    if abs(amount) >= 1 << 20:
+        return '%+.1fMiB' % (amount / float(1 << 20))
+    if abs(amount) >= 1 << 10:
+        return '%+.1fKiB' % (amount / 1024.0)
+    return '%+dB' % amount
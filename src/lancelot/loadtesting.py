@@ -0,0 +1,215 @@
+'''
+Functionality for driving an action from several threads (or processes)
+at once, measuring its throughput and latencies under that load, so that
+contention can be specified, e.g.
+    spec = Spec(cache)
+    spec.under_load(spec.get('key'), workers=8, duration=0.5, each='value')
+    spec.should_sustain(ops_per_sec > 50000, p99 < 1 * ms)
+
+Each worker calls the action repeatedly, until duration seconds have
+passed or its share of operations has been made, after all the workers
+have started. Every call's latency is measured, and its result (if each
+is specified) compared with each: calls raising exceptions, or with other
+results, are failures. The latency statistics are those of a
+BenchmarkResult (see lancelot.benchmarking), e.g. median, p90 and p99.
+Anything else raised by a worker thread (a BaseException, e.g.
+KeyboardInterrupt) is raised again by drive(), and a worker process dying
+without its outcome raises WorkerCrashed.
+
+Intended public interface:
+ Classes: LoadResult
+ Functions: drive()
+ Variables: ops_per_sec [a Statistic used as e.g. "ops_per_sec > 1000"]
+
+Intended for internal use:
+ -
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import math
+import multiprocessing
+import queue as queues
+import threading
+import time
+
+from lancelot.benchmarking import BenchmarkResult, Statistic, \
+                                  _format_seconds
+from lancelot.comparators import Comparator, EqualsEquals
+from lancelot.verification import WorkerCrashed
+
+_POLL_INTERVAL = 0.1  # seconds between checks that worker processes live
+
+
+class LoadResult(BenchmarkResult):
+    ''' The latencies (in seconds) of the calls made by workers driving an
+    action, statistics derived from them, and the throughput achieved '''
+
+    def __init__(self, latencies, elapsed, workers, failures=0,
+                 first_failure=None):
+        ''' latencies of the calls made in elapsed seconds by workers, of
+        which failures (the first described by first_failure) failed '''
+        super().__init__(latencies, 1)
+        self.operations = len(self.samples)
+        self.elapsed = elapsed
+        self.workers = workers
+        self.failures = failures
+        self.first_failure = first_failure
+        self.ops_per_sec = self.operations / elapsed if elapsed > 0 \
+            else float('inf')
+
+    def histogram(self):
+        ''' The latencies counted in buckets doubling in size from 1us, as
+        [(bucket upper limit in seconds, count)] for non-empty buckets '''
+        counts = {}
+        for latency in self.samples:
+            bucket = max(0, math.ceil(math.log2(max(latency, 1e-9) / 1e-6)))
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return [(1e-6 * 2 ** bucket, counts[bucket])
+                for bucket in sorted(counts)]
+
+    def __repr__(self):
+        ''' Summarise the load, in a form useful in unmet messages '''
+        return '<load of %d workers: %d ops in %.3gs (%.4g ops/s), ' \
+               '%d failures, latency median %s, p90 %s, p99 %s, max %s>' % \
+               (self.workers, self.operations, self.elapsed,
+                self.ops_per_sec, self.failures,
+                _format_seconds(self.median), _format_seconds(self.p90),
+                _format_seconds(self.p99), _format_seconds(self.max))
+
+
+def drive(action, workers=4, duration=None, operations=None,
+          processes=False, each=None):
+    ''' Call action from workers threads (or, if processes is True, worker
+    processes: action and each must then be picklable) at once, for
+    duration seconds or operations calls in all, returning a LoadResult.
+    each, if specified, is the comparator (or value) every call's result
+    should meet. '''
+    if (duration is None) == (operations is None):
+        raise ValueError('specify either duration or operations')
+    if operations is not None:
+        shares = [operations // workers + (1 if worker < operations % workers
+                                           else 0)
+                  for worker in range(workers)]
+    else:
+        shares = [None] * workers
+    if each is not None and not isinstance(each, Comparator):
+        each = EqualsEquals(each)
+    if processes:
+        outcomes = _drive_processes(action, duration, shares, each)
+    else:
+        outcomes = _drive_threads(action, duration, shares, each)
+    latencies = []
+    failures = 0
+    first_failure = None
+    for started, finished, worker_latencies, worker_failures, failure \
+    in outcomes:
+        latencies.extend(worker_latencies)
+        failures += worker_failures
+        first_failure = first_failure or failure
+    elapsed = max(outcome[1] for outcome in outcomes) \
+        - min(outcome[0] for outcome in outcomes)
+    return LoadResult(latencies, elapsed, workers, failures, first_failure)
+
+
+def _drive_threads(action, duration, shares, each):
+    ''' The outcomes of workers, in threads, driving action '''
+    start = threading.Barrier(len(shares))
+    outcomes = [None] * len(shares)
+    raised = []
+
+    def run(worker):
+        ''' Drive action in a worker thread, keeping anything it raises
+        (beyond the failures counted) to raise again in the caller '''
+        try:
+            outcomes[worker] = _work(action, duration, shares[worker], each,
+                                     start)
+        except BaseException as exception:
+            raised.append(exception)
+    threads = [threading.Thread(target=run, args=(worker,), daemon=True)
+               for worker in range(len(shares))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if raised:
+        raise raised[0]
+    return outcomes
+
+
+def _drive_processes(action, duration, shares, each):
+    ''' The outcomes of workers, in processes, driving action '''
+    start = multiprocessing.Barrier(len(shares))
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_work_in_process,
+                                         args=(action, duration, share, each,
+                                               start, queue), daemon=True)
+                 for share in shares]
+    for process in processes:
+        process.start()
+    outcomes = []
+    try:
+        while len(outcomes) < len(processes):
+            try:
+                outcomes.append(queue.get(timeout=_POLL_INTERVAL))
+                continue
+            except queues.Empty:
+                pass
+            crashed = [process.exitcode for process in processes
+                       if process.exitcode not in (None, 0)]
+            if not crashed and any(process.is_alive()
+                                   for process in processes):
+                continue
+            try:  # in case the last outcome arrived meanwhile
+                outcomes.append(queue.get(timeout=_POLL_INTERVAL))
+            except queues.Empty:
+                msg = 'a load worker process exited (with code %s) ' \
+                      'without its outcome' % (crashed or [0])[0]
+                raise WorkerCrashed(msg)
+    finally:
+        for process in processes:
+            if len(outcomes) < len(processes):
+                process.terminate()
+            process.join()
+    return outcomes
+
+
+def _work_in_process(action, duration, share, each, start, queue):
+    ''' Drive action in a worker process, sending its outcome to queue '''
+    queue.put(_work(action, duration, share, each, start))
+
+
+def _work(action, duration, share, each, start):
+    ''' Call action (at least once) until duration has passed or share
+    calls have been made, once every worker has started. Returns (started,
+    finished, latencies, failures, first failure described). '''
+    latencies = []
+    failures = 0
+    first_failure = None
+    timer = time.perf_counter
+    start.wait()
+    started = time.monotonic()
+    deadline = timer() + duration if duration is not None else None
+    while True:
+        called = timer()
+        try:
+            result = action()
+            failed = each is not None and not each.compares_to(result)
+            if failed:
+                failure = 'should be %s, not %r' % (each.description(),
+                                                    result)
+        except Exception as exception:
+            failed = True
+            failure = 'should not raise %r' % (exception,)
+        returned = timer()
+        latencies.append(returned - called)
+        if failed:
+            failures += 1
+            first_failure = first_failure or failure
+        if deadline is not None and returned >= deadline \
+        or share is not None and len(latencies) >= share:
+            break
+    return started, time.monotonic(), latencies, failures, first_failure
+
+
+ops_per_sec = Statistic('ops_per_sec')
@@ -0,0 +1,272 @@
+'''
+Functionality for profiling slow specs: verifying each function under a
+profiler, and writing out where the time went, e.g.
+    AllVerifiable.verify(executor=Profiling('profiles'))
+    AllVerifiable.verify(executor=Profiling('profiles', mode='sampling'))
+
+In 'deterministic' mode each function is profiled by cProfile; in
+'sampling' mode a thread samples the stacks of the thread(s) verifying it
+every interval seconds instead, which adds little overhead (and includes
+functions run under a watchdog, because of a timeout: cProfile doesn't
+follow those into their thread, so deterministic profiling calls each
+function without a timeout).
+
+Each function's profile is written to "<module>.<qualified name>-<n>.pstats"
+in the directory, n counting the functions profiled so that lambdas, or
+functions whose names are alike once made safe for a file name, don't
+overwrite each other's profiles. They are for use with the pstats module (or
+e.g. snakeviz). All the functions' stacks are also aggregated into one file
+of collapsed stacks, "frame;frame;frame count" per line, for flamegraph.pl
+and the like. The counts are samples, or microseconds apportioned from
+cProfile's timings (along the calls between callers and callees). The
+collapsed stacks include only the code under test: lancelot's own frames
+(verify_fn, Constraint.verify, WrapFunction.result etc.) are folded out.
+
+Intended public interface:
+ Classes: Profiling
+ Functions: -
+ Variables: MODES
+
+Intended for internal use:
+ Classes: StackSampler
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import cProfile
+import marshal
+import os
+import re
+import sys
+import threading
+
+from lancelot import verification
+from lancelot.verification import AllVerifiable, VerificationTimeout
+
+MODES = ('deterministic', 'sampling')
+
+_LANCELOT_DIR = os.path.dirname(os.path.abspath(verification.__file__))
+_CALL_CODE = AllVerifiable._call.__code__
+_MIN_SECONDS = 1e-7  # apportioned time too small to show in stacks
+
+
+class Profiling:
+    ''' Executor that verifies each (selected) function under a profiler,
+    writing per-function .pstats files and aggregated collapsed stacks '''
+
+    def __init__(self, directory, mode='deterministic', interval=0.001,
+                 select=None, collapsed='profile.collapsed'):
+        ''' Profiles are written to directory (created if need be), in
+        one of MODES, sampling every interval seconds in 'sampling' mode.
+        select(verifiable_fn), if specified, chooses the functions that
+        are profiled: others are verified as usual. collapsed is the name
+        of the collapsed stacks file. '''
+        if mode not in MODES:
+            msg = 'mode %r is not one of %s' % (mode, ', '.join(MODES))
+            raise ValueError(msg)
+        self._directory = directory
+        self._mode = mode
+        self._interval = interval
+        self._select = select
+        self.collapsed_path = os.path.join(directory, collapsed)
+        self.pstats_paths = {}  # verifiable fn -> .pstats path
+        self._profiled = 0  # functions profiled so far
+        self._stacks = {}  # (frame label, ...) -> count
+
+    def verify_each(self, all_verifiable, verifiable_fns, timeout=None):
+        ''' Verify functions, returning an iterator of 1 or 0 for each '''
+        return self._results(all_verifiable, list(verifiable_fns), timeout)
+
+    def _results(self, all_verifiable, verifiable_fns, timeout):
+        ''' Report and yield results, writing the collapsed stacks of all
+        the functions profiled at the end '''
+        os.makedirs(self._directory, exist_ok=True)
+        try:
+            for verifiable_fn in verifiable_fns:
+                if self._select is not None \
+                and not self._select(verifiable_fn):
+                    yield all_verifiable.verify_fn(verifiable_fn, timeout)
+                    continue
+                all_verifiable.report_started(verifiable_fn)
+                fn_timeout = all_verifiable.timeout_for(verifiable_fn,
+                                                        timeout)
+                exception, statistics = self._profile(all_verifiable,
+                                                      verifiable_fn,
+                                                      fn_timeout)
+                if isinstance(exception, VerificationTimeout):
+                    yield all_verifiable.report_outcome(
+                        verifiable_fn, timed_out=fn_timeout,
+                        statistics=statistics)
+                else:
+                    yield all_verifiable.report_outcome(
+                        verifiable_fn, exception, statistics=statistics)
+        finally:
+            self._write_collapsed()
+
+    def _profile(self, all_verifiable, verifiable_fn, timeout):
+        ''' Call a function under the profiler, writing its .pstats file.
+        Returns (exception raised or None, statistics collected). '''
+        name = re.sub(r'[^\w.-]', '_',
+                      verification.qualified_name(verifiable_fn))
+        self._profiled += 1
+        path = os.path.join(self._directory,
+                            '%s-%d.pstats' % (name, self._profiled))
+        if self._mode == 'sampling':
+            sampler = StackSampler(self._interval)
+            with sampler:
+                outcome = all_verifiable.call_fn(verifiable_fn, timeout)
+            stats = sampler.stats()
+            with open(path, 'wb') as stored:
+                marshal.dump(stats, stored)
+            for stack, count in sampler.samples.items():
+                self._add_stack(stack, count)
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                outcome = all_verifiable.call_fn(verifiable_fn)
+            finally:
+                profile.disable()
+            profile.dump_stats(path)
+            profile.create_stats()
+            for stack, seconds in _apportion(profile.stats).items():
+                self._add_stack(stack, round(seconds * 1e6))
+        self.pstats_paths[verifiable_fn] = path
+        return outcome
+
+    def _add_stack(self, stack, count):
+        ''' Aggregate a stack (of pstats function keys, outermost first),
+        with lancelot's frames folded out '''
+        labels = []
+        for key in stack:
+            if _is_lancelot(key) or key[0] == '~' and not labels:
+                continue
+            labels.append(_label(key))
+        if labels and count > 0:
+            labels = tuple(labels)
+            self._stacks[labels] = self._stacks.get(labels, 0) + count
+
+    def _write_collapsed(self):
+        ''' Write the aggregated stacks, in collapsed form '''
+        with open(self.collapsed_path, 'w') as collapsed:
+            for labels, count in sorted(self._stacks.items()):
+                collapsed.write('%s %d\n' % (';'.join(labels), count))
+
+
+class StackSampler:
+    ''' Samples the stacks of threads verifying a function, every interval
+    seconds, while within a with statement '''
+
+    def __init__(self, interval=0.001):
+        ''' No samples yet '''
+        self._interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+        self.samples = {}  # (pstats function key, ...) -> count
+
+    def __enter__(self):
+        ''' Start sampling, in a daemon thread '''
+        self._thread = threading.Thread(target=self._sample,
+                                        name='lancelot-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        ''' Stop sampling '''
+        self._stopping.set()
+        self._thread.join()
+        return False
+
+    def _sample(self):
+        ''' Record the stacks below AllVerifiable._call() in each thread '''
+        own = threading.get_ident()
+        while not self._stopping.wait(self._interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and frame.f_code is not _CALL_CODE:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno,
+                                  code.co_name))
+                    frame = frame.f_back
+                if frame is not None and stack:
+                    stack = tuple(reversed(stack))
+                    self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def stats(self):
+        ''' The samples as pstats data: {function key: (samples, samples,
+        self seconds, cumulative seconds, {caller key: (...)})} '''
+        entries = {}
+        for stack, count in self.samples.items():
+            seconds = count * self._interval
+            seen = set()
+            for depth, key in enumerate(stack):
+                entry = entries.setdefault(key, [0, 0, 0.0, 0.0, {}])
+                is_leaf = depth == len(stack) - 1
+                self_seconds = seconds if is_leaf else 0.0
+                if key not in seen:
+                    seen.add(key)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                entry[2] += self_seconds
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1],
+                                                 [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[2] += self_seconds
+                    caller[3] += seconds
+        return dict((key, (cc, nc, tt, ct,
+                           dict((caller, tuple(timing))
+                                for caller, timing in callers.items())))
+                    for key, (cc, nc, tt, ct, callers) in entries.items())
+
+
+def _apportion(stats):
+    ''' The self seconds of each stack (of pstats function keys, outermost
+    first) in cProfile stats, apportioning each function's time between
+    its callers in proportion to the cumulative time of each call '''
+    callees = {}
+    for key, (cc, nc, tt, ct, callers) in stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(key)
+    roots = [key for key, entry in stats.items()
+             if not entry[4] and 'Profiler' not in key[2]]
+    stacks = {}
+
+    def walk(key, stack, fraction):
+        ''' Apportion key's share (fraction) of its time to stack '''
+        stack = stack + (key,)
+        self_seconds = stats[key][2] * fraction
+        if self_seconds >= _MIN_SECONDS:
+            stacks[stack] = stacks.get(stack, 0.0) + self_seconds
+        for callee in callees.get(key, []):
+            cumulative = stats[callee][3]
+            via = stats[callee][4][key][3]
+            if callee in stack or cumulative <= 0 \
+            or via * fraction < _MIN_SECONDS:
+                continue
+            walk(callee, stack, fraction * via / cumulative)
+    for root in roots:
+        walk(root, (), 1.0)
+    return stacks
+
+
+def _is_lancelot(key):
+    ''' Whether a pstats function key is of lancelot's own code (but not
+    its specs or examples) '''
+    if key[0] == '~':
+        return False
+    return os.path.dirname(os.path.abspath(key[0])) == _LANCELOT_DIR
+
+
+def _label(key):
+    ''' A frame label for a pstats function key, in collapsed stacks '''
+    filename, line, name = key
+    if filename == '~':
+        label = name
+    else:
+        label = '%s (%s:%d)' % (name, os.path.basename(filename), line)
+    return label.replace(';', ':')
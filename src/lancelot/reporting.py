@@ -0,0 +1,316 @@
+'''
+Functionality for reporting verification results in machine-readable
+formats, streamed to a file (or file-like object) as each verifiable
+function is verified.
+
+Intended public interface:
+ Classes: NdjsonListener, JUnitXmlListener, QueuedListener
+ Functions: -
+ Variables: -
+
+Intended for internal use:
+ Classes: StreamingListener
+ Functions: event_time(), event_duration()
+
+Copyright 2009 by the author(s). All rights reserved
+'''
+
+import json
+import queue
+import re
+import threading
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+from lancelot.verification import VerificationTimeout, format_traceback, \
+                                  qualified_name
+
+_DELIVERY = threading.local()  # when messages are delivered by a thread
+_NOT_XML_CHARS = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd'
+                            '\U00010000-\U0010ffff]')
+
+
+def event_time():
+    ''' The time (from time.perf_counter) at which the message currently
+    being handled was sent, even if it is delivered later by a thread '''
+    sent = getattr(_DELIVERY, 'sent', None)
+    if sent is None:
+        return time.perf_counter()
+    return sent
+
+
+def event_duration(all_verifiable, verifiable_fn):
+    ''' The duration reported with the outcome of verifying a function (as
+    measured by an executor, e.g. in a worker) when the message currently
+    being handled was sent, or None if none was reported '''
+    if getattr(_DELIVERY, 'sent', None) is not None:
+        return _DELIVERY.duration
+    if all_verifiable is None:
+        return None
+    return all_verifiable.duration_of(verifiable_fn)
+
+
+class StreamingListener:
+    ''' Base listener that times each verifiable function and streams a
+    record of its outcome through a buffered writer, flushing periodically
+    rather than after every record '''
+
+    def __init__(self, output, flush_every=100, flush_interval=1.0,
+                 buffer_size=65536):
+        ''' Output is either a file path (opened with a buffer_size buffer
+        at the start of each verification run, and closed at its end) or
+        an already open text stream. Buffered records are flushed after
+        flush_every records, or once flush_interval seconds have elapsed
+        since the last flush, whichever comes first. '''
+        self._owns_stream = isinstance(output, str)
+        self._path = output if self._owns_stream else None
+        self._stream = None if self._owns_stream else output
+        self._buffer_size = buffer_size
+        self._flush_every = flush_every
+        self._flush_interval = flush_interval
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._started = {}
+        self._all_verifiable = None
+
+    def all_verifiable_starting(self, all_verifiable):
+        ''' A verification run is starting '''
+        if self._owns_stream:
+            self._stream = open(self._path, 'w', buffering=self._buffer_size,
+                                encoding='utf-8')
+        self._last_flush = time.monotonic()
+        self._all_verifiable = all_verifiable
+
+    def verification_started(self, verifiable_fn):
+        ''' A verification of a single function is starting '''
+        self._started[verifiable_fn] = event_time()
+
+    def specification_met(self, verifiable_fn):
+        ''' A verification of a function has completed successfully '''
+        self._record(verifiable_fn, 'met')
+
+    def specification_unmet(self, verifiable_fn, unmet):
+        ''' A verification of a function has completed unsuccessfully '''
+        self._record(verifiable_fn, 'unmet', unmet)
+
+    def unexpected_exception(self, verifiable_fn, exception):
+        ''' An unexpected exception was raised from a function '''
+        self._record(verifiable_fn, 'unexpected', exception)
+
+    def verification_timed_out(self, verifiable_fn, timeout):
+        ''' A verification of a function did not finish in time '''
+        timed_out = VerificationTimeout('timed out after %ss' % timeout)
+        self._record(verifiable_fn, 'timed_out', timed_out)
+
+    def all_verifiable_ending(self, all_verifiable, outcome):
+        ''' A verification run is ending: write everything out '''
+        self._flush()
+        self._all_verifiable = None
+        if self._owns_stream:
+            self._stream.close()
+            self._stream = None
+
+    def _duration(self, verifiable_fn):
+        ''' Seconds taken to verify a function: as reported by an executor
+        if it was verified elsewhere, otherwise elapsed since it started '''
+        started = self._started.pop(verifiable_fn, None)
+        duration = event_duration(self._all_verifiable, verifiable_fn)
+        if duration is not None:
+            return duration
+        if started is None:
+            return 0.0
+        return event_time() - started
+
+    def _record(self, verifiable_fn, outcome, exception=None):
+        ''' Write a record of a completed verification '''
+        duration = self._duration(verifiable_fn)
+        self._write_record(verifiable_fn, outcome, duration, exception)
+        self._unflushed += 1
+        if self._unflushed >= self._flush_every \
+        or time.monotonic() - self._last_flush >= self._flush_interval:
+            self._flush()
+
+    def _write_record(self, verifiable_fn, outcome, duration, exception):
+        ''' Subclasses write a record in their own format '''
+        pass
+
+    def _flush(self):
+        ''' Flush buffered records through to the output '''
+        self._stream.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+
+class NdjsonListener(StreamingListener):
+    ''' Listener that streams newline-delimited JSON: one object per
+    verifiable function, between a "start" and an "end" object for the run '''
+
+    def all_verifiable_starting(self, all_verifiable):
+        ''' A verification run is starting '''
+        super().all_verifiable_starting(all_verifiable)
+        self._write({'event': 'start', 'total': all_verifiable.total(),
+                     'timestamp': time.time()})
+
+    def all_verifiable_ending(self, all_verifiable, outcome):
+        ''' A verification run is ending '''
+        self._write({'event': 'end', 'outcome': outcome,
+                     'timestamp': time.time()})
+        super().all_verifiable_ending(all_verifiable, outcome)
+
+    def _write_record(self, verifiable_fn, outcome, duration, exception):
+        ''' Write a record of a completed verification as a JSON line '''
+        record = {'event': 'verification',
+                  'name': qualified_name(verifiable_fn),
+                  'outcome': outcome,
+                  'duration': duration}
+        if exception is not None:
+            record['exception'] = type(exception).__name__
+            record['message'] = str(exception)
+            record['traceback'] = format_traceback(exception)
+        self._write(record)
+
+    def _write(self, record):
+        ''' Write a single JSON line '''
+        self._stream.write(json.dumps(record, default=repr) + '\n')
+
+
+class JUnitXmlListener(StreamingListener):
+    ''' Listener that streams a JUnit XML report, as understood by most CI
+    servers. Each <testcase> is written as soon as its verification ends,
+    so the failure and error totals are left for the CI server to count. '''
+
+    def __init__(self, output, suite_name='lancelot', **kwds):
+        ''' Output and kwds are as for StreamingListener '''
+        super().__init__(output, **kwds)
+        self._suite_name = suite_name
+
+    def all_verifiable_starting(self, all_verifiable):
+        ''' A verification run is starting '''
+        super().all_verifiable_starting(all_verifiable)
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self._stream.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._stream.write('<testsuites>\n')
+        self._stream.write('<testsuite name=%s tests="%d" timestamp="%s">\n'
+                           % (quoteattr(_xml_chars(self._suite_name)),
+                              all_verifiable.total(), timestamp))
+
+    def all_verifiable_ending(self, all_verifiable, outcome):
+        ''' A verification run is ending '''
+        self._stream.write('</testsuite>\n</testsuites>\n')
+        super().all_verifiable_ending(all_verifiable, outcome)
+
+    def _write_record(self, verifiable_fn, outcome, duration, exception):
+        ''' Write a record of a completed verification as a <testcase> '''
+        classname, _, name = _xml_chars(
+            qualified_name(verifiable_fn)).rpartition('.')
+        testcase = '<testcase classname=%s name=%s time="%.6f"' % \
+            (quoteattr(classname), quoteattr(name), duration)
+        if exception is None:
+            self._stream.write(testcase + '/>\n')
+            return
+        element = 'failure' if outcome == 'unmet' else 'error'
+        self._stream.write(testcase + '>\n')
+        self._stream.write('<%s type=%s message=%s>%s</%s>\n' %
+                           (element,
+                            quoteattr(_xml_chars(type(exception).__name__)),
+                            quoteattr(_xml_chars(str(exception))),
+                            escape(_xml_chars(
+                                ''.join(format_traceback(exception)))),
+                            element))
+        self._stream.write('</testcase>\n')
+
+
+def _xml_chars(text):
+    ''' text, with any characters XML does not allow (e.g. the escape
+    characters of coloured output) replaced by U+FFFD '''
+    return _NOT_XML_CHARS.sub('\ufffd', text)
+
+
+class QueuedListener:
+    ''' Adapter that puts verification messages on a bounded queue and
+    delivers them to a (slow) listener from a background thread, so that
+    writing reports never stalls the verification itself '''
+
+    _STOP = object()
+    _OUTCOMES = ('specification_met', 'specification_unmet',
+                 'unexpected_exception', 'verification_timed_out')
+
+    def __init__(self, listener, maxsize=1000):
+        ''' Messages are delivered to the listener in order. When maxsize
+        messages are waiting the verification blocks until there is room. '''
+        self._listener = listener
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._error = None
+        self._all_verifiable = None
+
+    def all_verifiable_starting(self, all_verifiable):
+        ''' A verification run is starting: start delivering messages '''
+        self._all_verifiable = all_verifiable
+        self._start()
+        self._put('all_verifiable_starting', (all_verifiable,))
+
+    def all_verifiable_ending(self, all_verifiable, outcome):
+        ''' A verification run is ending: deliver all outstanding messages
+        before returning, and re-raise any error raised by the listener '''
+        self._put('all_verifiable_ending', (all_verifiable, outcome))
+        self._stop()
+        self._all_verifiable = None
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def __getattr__(self, name):
+        ''' Return a callable queueing the named message for delivery '''
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args: self._put(name, args)
+
+    def _put(self, name, args):
+        ''' Queue a message, keeping hold of the traceback of any exception
+        so that it is still intact when formatted by the listener, and of
+        any duration reported with an outcome, which is only known now '''
+        self._start()
+        tracebacks = [(arg, arg.__traceback__)
+                      for arg in args if isinstance(arg, BaseException)]
+        duration = None
+        if name in self._OUTCOMES:
+            duration = event_duration(self._all_verifiable, args[0])
+        self._queue.put((name, args, tracebacks, time.perf_counter(),
+                         duration))
+
+    def _start(self):
+        ''' Start the background delivery thread if not already running '''
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._deliver,
+                                            name='lancelot-listener',
+                                            daemon=True)
+            self._thread.start()
+
+    def _stop(self):
+        ''' Wait for the background thread to deliver every message '''
+        if self._thread is not None:
+            if self._thread.is_alive():
+                self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _deliver(self):
+        ''' Deliver queued messages until told to stop. Anything raised by
+        the listener (even a BaseException, which would otherwise end the
+        thread and leave the queue to fill) is kept, to re-raise at the
+        end, and delivery carries on. '''
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            name, args, tracebacks, _DELIVERY.sent, _DELIVERY.duration = item
+            for exception, exception_tb in tracebacks:
+                exception.__traceback__ = exception_tb
+            try:
+                getattr(self._listener, name)(*args)
+            except BaseException as error:
+                if self._error is None:
+                    self._error = error
+            finally:
+                _DELIVERY.sent = None
@@ -3,7 +3,7 @@ Functionality for expressing the specified behaviour of an object, function
 or collaboration.
 
 Intended public interface:
- Classes: Spec, MockSpec
+ Classes: Spec, MockSpec, SpySpec
  Functions: -
  Variables: -
 
@@ -13,14 +13,20 @@ Intended for internal use:
 Copyright 2009 by the author(s). All rights reserved
 '''
 
-from lancelot.calling import MockCall, WrapFunction
+import functools
+import threading
+
+from lancelot.calling import MockCall, SpyCall, WrapFunction, _format_args
 from lancelot.comparators import (Comparator,
                                   NotComparator,
                                   Contain,
                                   ExceptionValue,
                                   FloatValue,
                                   EqualsEquals)
-from lancelot.constraints import Constraint, CollaborateWith, Not, Raise
+from lancelot.constraints import Constraint, CollaborateWith, \
+                                 CollectAtMost, CreateAtMost, Have, Lazy, \
+                                 NoNetwork, Not, NotBlockLoop, OpenAtMost, \
+                                 Raise, ReadAtMost, SpawnAtMost, Sustain
 from lancelot.verification import UnmetSpecification
 
 
@@ -68,6 +74,35 @@ class Spec:
             self._wrap_fn(WrapFunction(self, action, ''))
         return self
 
+    def benchmark(self, action, name=None, **options):
+        ''' Specify an action that is measured repeatedly, so that its
+        timings should_have()... e.g.
+        spec.benchmark(spec.parse(payload)).should_have(p99 < 2 * ms)
+        options are as for lancelot.benchmarking.measure(). If a
+        lancelot.baselines.BaselineStore is listening, the timings are also
+        compared with their baseline (kept under name, if specified). '''
+        from lancelot.baselines import check_baseline
+        from lancelot.benchmarking import measure
+        if action == self:
+            action = self._call_stack.pop().deferred()
+        self._wrap_fn(WrapFunction(
+            self, lambda: check_baseline(measure(action, **options), name),
+            ''))
+        return self
+
+    def under_load(self, action, workers=4, **options):
+        ''' Specify an action that is called concurrently by workers, so
+        that the load it sustains should_sustain()... e.g.
+        spec.under_load(spec.get(key), workers=8, duration=0.5,
+                        each=value).should_sustain(ops_per_sec > 10000)
+        options are as for lancelot.loadtesting.drive(). '''
+        from lancelot.loadtesting import drive
+        if action == self:
+            action = self._call_stack.pop().deferred()
+        self._wrap_fn(WrapFunction(
+            self, lambda: drive(action, workers, **options), ''))
+        return self
+
     def it(self):
         ''' Return the underlying object whose behaviour is being specified
         e.g. spec.when(...) spec.then(spec.it()).should...() '''
@@ -108,6 +143,69 @@ class Spec:
         constraint = CollaborateWith(*collaborations, and_result=and_result)
         return self.should(constraint)
 
+    def should_have(self, *comparators, **attributes):
+        ''' The result of an action's behaviour should meet the specified
+        comparators, and have attributes comparing to those specified,
+        e.g. should_have(p99 < 2 * ms) or should_have(p99=LessThan(0.002))'''
+        return self.should(Have(*comparators, **attributes))
+
+    def should_sustain(self, *comparators, **attributes):
+        ''' The load applied to an action, by under_load(), should not have
+        made any call fail, and should meet the specified comparators (and
+        have the attributes specified) e.g. should_sustain(p99 < 1 * ms) '''
+        return self.should(Sustain(*comparators, **attributes))
+
+    def should_collect_at_most(self, gen0=None, gen1=None, gen2=None):
+        ''' An action's behaviour should cause at most the specified garbage
+        collections of each generation, e.g. should_collect_at_most(gen2=0)
+        (counted after a full collection, so that only its own garbage is
+        collected) '''
+        return self.should(CollectAtMost(gen0, gen1, gen2))
+
+    def should_create_at_most(self, objects):
+        ''' An action's behaviour should leave at most the specified number
+        of new objects tracked by the garbage collector (i.e. containers,
+        including any garbage not yet collected) '''
+        return self.should(CreateAtMost(objects))
+
+    def should_open_at_most(self, files):
+        ''' An action's behaviour should open at most the specified number
+        of files (including modules imported for the first time) '''
+        return self.should(OpenAtMost(files))
+
+    def should_read_at_most(self, bytes):
+        ''' An action's behaviour should read at most the specified number
+        of bytes. They are counted for the whole process, so include bytes
+        read by other threads meanwhile. Only available on Linux: elsewhere
+        a ValueError is raised. '''
+        return self.should(ReadAtMost(bytes))
+
+    def should_spawn_at_most(self, processes):
+        ''' An action's behaviour should spawn at most the specified number
+        of processes '''
+        return self.should(SpawnAtMost(processes))
+
+    def should_not_touch_network(self):
+        ''' An action's behaviour should not connect, look up names or send
+        datagrams over the network '''
+        return self.should(NoNetwork())
+
+    def should_not_block_loop(self, threshold=0.1):
+        ''' An action returning an awaitable (e.g. calling a coroutine
+        function) should, when run in an event loop, never block the loop
+        for more than threshold seconds at a time '''
+        return self.should(NotBlockLoop(threshold))
+
+    def should_be_lazy(self, source, on_call=0, per_output=1, outputs=10):
+        ''' An action given a lancelot.constraints.Source should return an
+        iterable without consuming more than on_call items of the source,
+        and consume no more than per_output(m) items (if callable, or else
+        on_call + per_output * m) to produce its first m items, for m up to
+        outputs, e.g.
+        source = Source()
+        spec.parse_lines(source).should_be_lazy(source, per_output=2) '''
+        return self.should(Lazy(source, on_call, per_output, outputs))
+
     def should_contain(self, specified):
         ''' The result of an action's behaviour should contain a specified
         value (e.g. tuples, lists or dicts). '''
@@ -127,17 +225,33 @@ class MockSpec:
     are actually verified)
     '''
 
-    def __init__(self, name='unnamed_mock', comparators=None):
+    def __init__(self, name='unnamed_mock', comparators=None, clock=None,
+                 ordered=True, asynchronous=False):
         ''' A new mock specification: created for specifying collaborations.
         Args:
         - name if specified will be used to supply meaningful messages
         - comparators if any are used when verifying that args supplied in a
         collaboration are those that were specified - by default an
         ExceptionValue comparator is used to verify Exception args,
-        and a FloatValue comparator is used to verify float args'''
+        and a FloatValue comparator is used to verify float args
+        - clock if specified is the lancelot.clocks.VirtualClock advanced
+        by collaborations that will_take() some time, or REAL_TIME if
+        they should really take it (one of the two is needed, unless
+        asynchronous)
+        - ordered if False allows the collaborations to occur in any order
+        (e.g. from several threads): each is then matched with the first
+        specified collaboration that it meets
+        - asynchronous if True makes each collaboration return an awaitable
+        (for asyncio code), taking any time it will_take() in the event loop
+        Collaborations may occur from several threads at once.'''
         self._is_collaborating = False
         self._collaborations = []
+        self._specified = []
         self._name = name
+        self._clock = clock
+        self._ordered = ordered
+        self._asynchronous = asynchronous
+        self._lock = threading.RLock()
         self._comparators = {Exception: ExceptionValue, float: FloatValue}
         try:
             self._comparators.update(comparators)
@@ -145,9 +259,14 @@ class MockSpec:
             pass
 
     def verify(self):
-        ''' Verify that all the specified collaborations have occurred '''
-        if len(self._collaborations) > 0:
-            raise UnmetSpecification(self._collaborations[0].description())
+        ''' Verify that all the specified collaborations have occurred, and
+        none were in progress too many times at once '''
+        with self._lock:
+            for mock_call in self._specified:
+                mock_call.verify_concurrency()
+            if len(self._collaborations) > 0:
+                raise UnmetSpecification(
+                    self._collaborations[0].description())
 
     def __getattr__(self, name):
         ''' Return a mock call for a single collaboration.
@@ -155,17 +274,44 @@ class MockSpec:
         in "collaboration" mode an existing instance is verified '''
         if self._is_collaborating:
             return self._collaboration(name)
-        mock = MockCall(self, name)
+        mock = MockCall(self, name, self._lock)
         self._collaborations.append(mock)
+        self._specified.append(mock)
         return mock
 
     def _collaboration(self, name):
-        ''' Return an instance of a collaboration (in "collaboration" mode) '''
-        if len(self._collaborations) == 0:
-            msg = 'should not be collaborating with %s.%s()' % \
-                (self._name, name)
-            raise UnmetSpecification(msg)
-        return self._collaborations[0].result_of(name)
+        ''' Return an instance of a collaboration (in "collaboration" mode),
+        which is matched with a specified collaboration when called '''
+        with self._lock:
+            if len(self._collaborations) == 0:
+                msg = 'should not be collaborating with %s.%s()' % \
+                    (self._name, name)
+                raise UnmetSpecification(msg)
+            if self._ordered:
+                self._collaborations[0].result_of(name)
+        return functools.partial(self._collaborate, name)
+
+    def _collaborate(self, name, *args, **kwds):
+        ''' Match a collaboration with one specified, and supply its
+        result '''
+        with self._lock:
+            if len(self._collaborations) == 0:
+                msg = 'should not be collaborating with %s.%s%s' % \
+                    (self._name, name, _format_args(args, kwds))
+                raise UnmetSpecification(msg)
+            candidates = self._collaborations
+            if self._ordered:
+                candidates = candidates[:1]
+            for mock_call in candidates:
+                if mock_call.matches(name, args, kwds):
+                    outcome = mock_call.consume()
+                    break
+            else:
+                msg = candidates[0].unmet_description(name, args, kwds)
+                raise UnmetSpecification(msg)
+        if self._asynchronous:
+            return mock_call.deliver_async(outcome)
+        return mock_call.deliver(outcome)
 
     def comparable(self, value):
         ''' Return a comparable value for an arg,
@@ -188,7 +334,8 @@ class MockSpec:
 
     def start_collaborating(self):
         ''' Switch to collaboration mode '''
-        self._is_collaborating = True
+        with self._lock:
+            self._is_collaborating = True
 
     def collaboration_over(self, mock_call):
         ''' A specified collaboration has finished '''
@@ -200,3 +347,58 @@ class MockSpec:
     def name(self):
         ''' The descriptive name of this mock (used in error messages) '''
         return self._name
+
+    def virtual_clock(self):
+        ''' The clock advanced by collaborations taking time (None for an
+        asynchronous mock without one, whose collaborations take time in
+        the event loop). Raises ValueError if a mock has none. '''
+        if self._clock is None and not self._asynchronous:
+            msg = 'mock %s has no clock: specify MockSpec(clock=...)'
+            raise ValueError(msg % self._name)
+        return self._clock
+
+
+class SpySpec:
+    ''' Wraps a real collaborator, forwarding every method call to it while
+    recording the calls, so that how a collaborator is used over a whole
+    when() / then() sequence can be specified e.g.
+    spy = SpySpec(database)
+    spec = Spec(Report(spy))
+    spec.when(spec.summarise(ids))
+    spy.query.should_be_called(at_most=1)
+    Unlike MockSpec, a SpySpec doesn't replace the collaborator's behaviour.
+    Attributes that aren't callable are passed through unrecorded, as are
+    special methods (e.g. len(), or calling the spy itself).
+    '''
+
+    def __init__(self, target, name=None, record=None):
+        ''' A new spy on a real object (target). name if specified will be
+        used to supply meaningful messages, otherwise the target's class
+        name is used. record, if specified, is called with the outcome of
+        each call (see lancelot.calling.SpyCall) '''
+        self._target = target
+        self._name = name or type(target).__name__
+        self._record = record
+        self._spy_calls = {}
+
+    def __getattr__(self, name):
+        ''' Return a SpyCall for a method of the target, recording calls to
+        it, or else the target's attribute itself '''
+        spy_calls = self.__dict__.get('_spy_calls')
+        if spy_calls is None or name.startswith('__'):
+            raise AttributeError(name)
+        spy_call = spy_calls.get(name)
+        if spy_call is not None:
+            return spy_call
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+        spy_call = SpyCall(self._name, self._target, name, self._record)
+        spy_calls[name] = spy_call
+        return spy_call
+
+    def __repr__(self):
+        ''' Summarise the calls recorded '''
+        return '<spy on %s: %s>' % (self._name, ', '.join(
+            '%s %d calls' % (name, spy_call.calls)
+            for name, spy_call in sorted(self._spy_calls.items())))
@@ -7,6 +7,9 @@ import lancelot
 if __name__ == '__main__':
     # Verify all the specs as a collection 
     from lancelot.specs import verification_spec, comparator_spec, \
-        constraint_spec, calling_spec, mocking_spec, specification_spec
+        constraint_spec, calling_spec, mocking_spec, specification_spec, \
+        reporting_spec, fixtures_spec, execution_spec, distribution_spec, \
+        history_spec, benchmarking_spec, baselines_spec, leaks_spec, \
+        cassettes_spec, clocks_spec, loadtesting_spec, profiling_spec
     lancelot.verify()
     
\ No newline at end of file
@@ -0,0 +1,152 @@
+''' Specs for comparing benchmarks with stored baselines '''
+
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.baselines import BaselineStore, active, check_baseline, \
+                               mann_whitney_u
+from lancelot.benchmarking import BenchmarkResult, minimum
+from lancelot.comparators import Contain, FloatValue, GreaterThan, \
+                                 LessThan, SameAs
+from lancelot.execution import ForkServerExecution, ThreadedExecution
+from lancelot.verification import AllVerifiable
+from lancelot.specs.benchmarking_spec import SteppingClock
+from lancelot.specs.verification_spec import SilentListener
+
+def spread(centre, count=50):
+    ''' Simple fn: samples spread evenly either side of centre '''
+    return [centre * (0.95 + 0.1 * i / count) for i in range(count)]
+
+def benchmark_with(store, seconds, executor=None):
+    ''' Descriptive fn: verify a fn benchmarking an action taking seconds,
+    with store listening (and executor, if any), returning the outcome '''
+    def takes_seconds():
+        ''' Benchmark an action that takes seconds (on a stepping clock) '''
+        clock = SteppingClock(seconds)
+        spec = Spec(clock).benchmark(clock.action, samples=20, warmup=0,
+                                     min_batch_time=0, timer=clock)
+        spec.should_have(minimum > 0)
+    all_verifiable = AllVerifiable([SilentListener(), store])
+    return all_verifiable.include(takes_seconds).verify(executor=executor)
+
+@verifiable
+def mann_whitney_u_behaviour():
+    ''' the test should only find samples greater when they are '''
+    spec = Spec(mann_whitney_u)
+    spec.mann_whitney_u(spread(1.2), spread(1.0)).should_be(
+        (FloatValue(2500.0), LessThan(0.001)))
+    spec.mann_whitney_u(spread(1.0), spread(1.2)).should_be(
+        (FloatValue(0.0), GreaterThan(0.999)))
+    spec.mann_whitney_u(spread(1.0), spread(1.0)).should_be(
+        (FloatValue(1250.0), GreaterThan(0.4)))
+    spec.mann_whitney_u([1.0] * 5, [1.0] * 5).should_be((12.5, 1.0))
+    spec.mann_whitney_u([], [1.0]).should_raise(ValueError)
+
+@grouping
+class BaselineStoreBehaviour:
+    ''' A group of specifications for BaselineStore behaviour '''
+
+    def setup_grouping(self):
+        ''' A directory for the baseline files '''
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_grouping(self):
+        ''' Remove the directory '''
+        shutil.rmtree(self.directory)
+
+    def store(self, name, mode='compare'):
+        ''' A BaselineStore for a file in the directory '''
+        path = os.path.join(self.directory, name + '.json')
+        return BaselineStore(path, mode, output=io.StringIO())
+
+    @verifiable
+    def should_record_baselines(self):
+        ''' samples should be stored under the benchmarking fn's name '''
+        store = self.store('record', mode='record')
+        benchmark_with(store, 0.001)
+        with open(os.path.join(self.directory, 'record.json')) as stored:
+            baselines = json.load(stored)['benchmarks']
+        spec = Spec(lambda: sorted(baselines))
+        spec.__call__().should_be([Contain('benchmark_with.<locals>.'
+                                           'takes_seconds')])
+        spec = Spec(lambda: list(baselines.values())[0]['samples'])
+        spec.__call__().should_be([FloatValue(0.001)] * 20)
+
+    @verifiable
+    def should_fail_significant_regressions(self):
+        ''' a benchmark significantly slower than its baseline should be
+        unmet, and reported '''
+        benchmark_with(self.store('slower', mode='record'), 0.001)
+        store = self.store('slower')
+        spec = Spec(benchmark_with)
+        spec.benchmark_with(store, 0.002).should_be(
+            {'total':1, 'verified':0, 'unverified':1})
+        spec = Spec(lambda: store.comparisons[0].status)
+        spec.__call__().should_be('regressed')
+        output = io.StringIO()
+        store.report(output)
+        Spec(output.getvalue()).it().should_contain('regressed: ')
+
+    @verifiable
+    def should_tolerate_small_changes(self):
+        ''' a benchmark slower by less than min_effect should be met '''
+        benchmark_with(self.store('small', mode='record'), 0.001)
+        store = self.store('small')
+        spec = Spec(benchmark_with)
+        spec.benchmark_with(store, 0.00102).should_be(
+            {'total':1, 'verified':1, 'unverified':0})
+        spec = Spec(lambda: store.comparisons[0].status)
+        spec.__call__().should_be('unchanged')
+
+    @verifiable
+    def should_report_improvements(self):
+        ''' a benchmark significantly faster than its baseline should be
+        reported as improved '''
+        benchmark_with(self.store('faster', mode='record'), 0.002)
+        store = self.store('faster')
+        spec = Spec(benchmark_with)
+        spec.benchmark_with(store, 0.001).should_be(
+            {'total':1, 'verified':1, 'unverified':0})
+        output = io.StringIO()
+        store.report(output)
+        Spec(output.getvalue()).it().should_contain('improved: ')
+
+    @verifiable
+    def should_report_new_benchmarks(self):
+        ''' a benchmark without a baseline should be met, and reported as
+        new, without the baselines being written when comparing '''
+        store = self.store('new')
+        spec = Spec(benchmark_with)
+        spec.benchmark_with(store, 0.001).should_be(
+            {'total':1, 'verified':1, 'unverified':0})
+        spec = Spec(lambda: store.comparisons[0].status)
+        spec.__call__().should_be('new')
+        spec = Spec(os.path.exists)
+        spec.exists(os.path.join(self.directory, 'new.json')) \
+            .should_be(False)
+
+    @verifiable
+    def should_refuse_isolated_executors(self):
+        ''' benchmarks verified outside of the verifying process can't be
+        checked, so should be refused; those in its threads can '''
+        spec = Spec(benchmark_with)
+        spec.benchmark_with(self.store('isolated'), 0.001,
+                            ForkServerExecution()).should_raise(ValueError)
+        spec.benchmark_with(self.store('threads'), 0.001,
+                            ThreadedExecution()).should_be(
+            {'total':1, 'verified':1, 'unverified':0})
+
+@verifiable
+def outside_verification_behaviour():
+    ''' benchmarks should only be checked while a store is listening '''
+    result = BenchmarkResult([1.0], 1)
+    spec = Spec(check_baseline)
+    spec.check_baseline(result).should_be(SameAs(result))
+    Spec(active).active().should_be(None)
+
+if __name__ == '__main__':
+    verify()
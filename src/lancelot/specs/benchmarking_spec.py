@@ -0,0 +1,92 @@
+''' Specs for statistical benchmarking of actions '''
+
+import gc
+import math
+
+from lancelot import Spec, verifiable, verify
+from lancelot.benchmarking import BenchmarkResult, measure, median, ms, \
+                                  p90, p99, percentile, stddev
+from lancelot.comparators import FloatValue, LessThan
+from lancelot.constraints import Have
+from lancelot.verification import UnmetSpecification
+from lancelot.specs.simple_fns import number_one
+
+class SteppingClock:
+    ''' A timer that only moves on when an action is called '''
+    def __init__(self, step):
+        ''' Each call to the action takes step seconds '''
+        self.step = step
+        self.now = 0.0
+        self.calls = 0
+    def action(self):
+        ''' An action that takes step seconds '''
+        self.now += self.step
+        self.calls += 1
+    def __call__(self):
+        ''' The current time '''
+        return self.now
+
+@verifiable
+def statistics_behaviour():
+    ''' statistics should describe the spread of the samples '''
+    result = BenchmarkResult([5, 1, 4, 2, 3], 1)
+    spec = Spec(lambda: (result.min, result.median, result.max))
+    spec.__call__().should_be((1, 3, 5))
+    spec = Spec(result)
+    spec.percentile(90).should_be(FloatValue(4.6))
+    spec.percentile(101).should_raise(ValueError)
+    spec = Spec(lambda: result.stddev)
+    spec.__call__().should_be(FloatValue(math.sqrt(2.5)))
+    spec = Spec(lambda: BenchmarkResult([], 1))
+    spec.__call__().should_raise(ValueError)
+
+@verifiable
+def calibration_behaviour():
+    ''' each batch of calls should take at least min_batch_time, and
+    warmup batches shouldn't be measured '''
+    clock = SteppingClock(0.1 * ms)
+    result = measure(clock.action, samples=5, warmup=2, timer=clock)
+    Spec(lambda: result.iterations).__call__().should_be(10)
+    Spec(lambda: result.samples).__call__().should_be(
+        [FloatValue(0.1 * ms)] * 5)
+    Spec(lambda: clock.calls).__call__().should_be(1 + 10 + (2 + 5) * 10)
+
+@verifiable
+def gc_behaviour():
+    ''' garbage collection should be disabled while measuring, and only
+    then if disable_gc is True '''
+    gc_enabled = []
+    measure(lambda: gc_enabled.append(gc.isenabled()), samples=1)
+    measure(lambda: gc_enabled.append(gc.isenabled()), samples=1,
+            disable_gc=False)
+    Spec(gc_enabled).it().should_contain(False)
+    Spec(gc_enabled).it().should_contain(True)
+    Spec(gc.isenabled()).it().should_be(True)
+
+@verifiable
+def statistic_comparison_behaviour():
+    ''' comparisons with statistics should compare a result's statistics '''
+    result = BenchmarkResult([0.001, 0.002, 0.003], 1)
+    spec = Spec(p99 < 2 * ms)
+    spec.description().should_be('p99 < 0.002')
+    spec.compares_to(result).should_be(False)
+    Spec(p90 >= 2 * ms).compares_to(result).should_be(True)
+    Spec(stddev > 0).compares_to(result).should_be(True)
+    Spec(percentile(50) <= 2 * ms).compares_to(result).should_be(True)
+    spec = Spec(Have(median < 1 * ms))
+    spec.verify(lambda: result).should_raise(UnmetSpecification)
+    spec = Spec(Have(median=LessThan(3 * ms)))
+    spec.verify(lambda: result).should_be(None)
+
+@verifiable
+def spec_benchmark_behaviour():
+    ''' an action should be benchmarked before its timings should_have()
+    the specified statistics '''
+    spec = Spec(number_one)
+    spec.benchmark(spec.number_one(), samples=5).should_have(p99 < 1.0)
+    spec = Spec(lambda: Spec(number_one).benchmark(number_one, samples=5)
+                .should_have(p99 < 0))
+    spec.__call__().should_raise(UnmetSpecification)
+
+if __name__ == '__main__':
+    verify()
@@ -0,0 +1,150 @@
+''' Specs for recording and replaying the traffic with collaborators '''
+
+import os
+import shutil
+import tempfile
+
+from lancelot import MockSpec, Spec, SpySpec, grouping, verifiable, verify
+from lancelot.cassettes import Cassette
+from lancelot.comparators import Type
+from lancelot.verification import UnmetSpecification
+
+CREATED = []
+
+class Inventory:
+    ''' Simple class standing in for a slow, real collaborator '''
+    def __init__(self):
+        ''' Count the instances created '''
+        CREATED.append(self)
+        self.stock = {'spam': 3, 'eggs': 0}
+    def count(self, item):
+        ''' The stock of an item '''
+        return self.stock[item]
+    def take(self, item):
+        ''' Take an item from stock '''
+        if not self.stock[item]:
+            raise LookupError('no %s' % item)
+        self.stock[item] -= 1
+        return item
+    def stocked(self):
+        ''' The stock of every item (not a copy) '''
+        return self.stock
+    def order(self, items):
+        ''' Order more of some items '''
+        return len(items)
+
+def shop(inventory):
+    ''' Simple fn using the collaborator '''
+    taken = [inventory.take('spam'), inventory.take('spam')]
+    try:
+        inventory.take('eggs')
+    except LookupError:
+        taken.append(None)
+    return taken, inventory.count('spam')
+
+@grouping
+class CassetteBehaviour:
+    ''' A group of specifications for Cassette '''
+
+    def setup_grouping(self):
+        ''' A directory for the cassettes '''
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_grouping(self):
+        ''' Remove the directory '''
+        shutil.rmtree(self.directory)
+
+    def cassette(self, name, mode='auto', inputs=None):
+        ''' A Cassette stored in the directory '''
+        return Cassette(os.path.join(self.directory, name), mode, inputs)
+
+    @verifiable
+    def should_record_then_replay(self):
+        ''' traffic recorded from a real collaborator should be replayed
+        by a MockSpec, without the collaborator being created '''
+        del CREATED[:]
+        with self.cassette('shop') as cassette:
+            Spec(cassette.is_recording()).it().should_be(True)
+            inventory = cassette.collaborator(Inventory, name='inventory')
+            Spec(inventory).it().should_be(Type(SpySpec))
+            Spec(shop).shop(inventory).should_be((['spam', 'spam', None], 1))
+        with self.cassette('shop') as cassette:
+            Spec(cassette.is_recording()).it().should_be(False)
+            inventory = cassette.collaborator(Inventory, name='inventory')
+            Spec(inventory).it().should_be(Type(MockSpec))
+            Spec(shop).shop(inventory).should_be((['spam', 'spam', None], 1))
+        Spec(len(CREATED)).it().should_be(1)
+
+    @verifiable
+    def should_verify_replayed_traffic(self):
+        ''' traffic that differs from, or omits, that recorded should be
+        unmet '''
+        with self.cassette('differ') as cassette:
+            shop(cassette.collaborator(Inventory))
+        cassette = self.cassette('differ')
+        spec = Spec(cassette.collaborator(Inventory))
+        spec.count('spam').should_raise(UnmetSpecification)
+        cassette = self.cassette('omit')
+        inventory = cassette.collaborator(Inventory)
+        inventory.take('spam')
+        cassette.finish()
+        cassette = self.cassette('omit')
+        cassette.collaborator(Inventory)
+        Spec(cassette).finish().should_raise(UnmetSpecification)
+
+    @verifiable
+    def should_rerecord_when_stale(self):
+        ''' a cassette recorded with other inputs should be recorded again
+        in 'auto' mode, but be unmet in 'replay' mode '''
+        with self.cassette('stale', inputs={'stock': 3}) as cassette:
+            shop(cassette.collaborator(Inventory))
+        cassette = self.cassette('stale', inputs={'stock': 3})
+        Spec(cassette.is_recording()).it().should_be(False)
+        cassette = self.cassette('stale', inputs={'stock': 4})
+        Spec(cassette.is_recording()).it().should_be(True)
+        spec = Spec(lambda: self.cassette('stale', 'replay', {'stock': 4}))
+        spec.__call__().should_raise(UnmetSpecification)
+        spec = Spec(lambda: self.cassette('missing', 'replay'))
+        spec.__call__().should_raise(UnmetSpecification)
+        cassette = self.cassette('stale', 'record', inputs={'stock': 3})
+        Spec(cassette.is_recording()).it().should_be(True)
+
+    @verifiable
+    def should_record_copies(self):
+        ''' args and results mutated after they are recorded should be
+        replayed as they were '''
+        with self.cassette('copies') as cassette:
+            inventory = cassette.collaborator(Inventory)
+            items = ['spam']
+            inventory.order(items)
+            items.append('eggs')
+            inventory.stocked()
+            inventory.take('spam')
+        with self.cassette('copies') as cassette:
+            spec = Spec(cassette.collaborator(Inventory))
+            spec.order(['spam']).should_be(1)
+            spec.stocked().should_be({'spam': 3, 'eggs': 0})
+            spec.take('spam').should_be('spam')
+
+    @verifiable
+    def should_reject_attributes(self):
+        ''' reading an attribute other than a method, which can't be
+        replayed, should be trapped when recording '''
+        cassette = self.cassette('attributes')
+        inventory = cassette.collaborator(Inventory)
+        Spec(lambda: inventory.stock).__call__().should_raise(ValueError)
+        Spec(inventory).count('spam').should_be(3)
+
+    @verifiable
+    def should_check_arguments(self):
+        ''' an unknown mode, or a collaborator used twice, should be
+        trapped '''
+        spec = Spec(lambda: self.cassette('mode', 'rewind'))
+        spec.__call__().should_raise(ValueError)
+        cassette = self.cassette('twice')
+        cassette.collaborator(Inventory)
+        spec = Spec(cassette)
+        spec.collaborator(Inventory).should_raise(ValueError)
+
+if __name__ == '__main__':
+    verify()
@@ -0,0 +1,107 @@
+''' Specs for simulating the passing of time with a virtual clock '''
+
+import asyncio
+import time
+
+from lancelot import MockSpec, Spec, grouping, verifiable, verify
+from lancelot.clocks import REAL_TIME, VirtualClock
+
+def retry(action, attempts, backoff, sleep, now, timeout):
+    ''' Simple fn calling action until it succeeds (within timeout) or has
+    been attempted enough times, sleeping backoff, then twice as long, ...
+    between attempts. Returns (result, attempts made). '''
+    for attempt in range(1, attempts + 1):
+        started = now()
+        try:
+            result = action()
+        except TimeoutError:
+            result = None
+        if result is not None and now() - started <= timeout:
+            return result, attempt
+        if attempt < attempts:
+            sleep(backoff * 2 ** (attempt - 1))
+    return None, attempts
+
+async def wait_briefly(seconds, timeout):
+    ''' Simple coroutine sleeping for seconds, unless timed out first '''
+    started = asyncio.get_running_loop().time()
+    try:
+        await asyncio.wait_for(asyncio.sleep(seconds), timeout)
+    except asyncio.TimeoutError:
+        return 'timed out', asyncio.get_running_loop().time() - started
+    return 'slept', asyncio.get_running_loop().time() - started
+
+@grouping
+class VirtualClockBehaviour:
+    ''' A group of specifications for VirtualClock '''
+
+    @verifiable
+    def should_only_move_when_told(self):
+        ''' time should pass only when advanced, or slept '''
+        clock = VirtualClock(start=10.0)
+        spec = Spec(clock)
+        spec.monotonic().should_be(10.0)
+        spec.when(spec.advance(2.5), spec.sleep(1.5))
+        spec.then(spec.perf_counter()).should_be(14.0)
+        spec.then(spec.time()).should_be(14.0)
+        Spec(clock.sleeps).it().should_be([1.5])
+        spec.advance(-1).should_raise(ValueError)
+
+    @verifiable
+    def should_patch_time_module(self):
+        ''' within patched(), the time module should read the clock '''
+        clock = VirtualClock()
+        started = time.perf_counter()
+        with clock.patched():
+            time.sleep(3600)
+            Spec(time.monotonic()).it().should_be(3600.0)
+        Spec(time.sleep).it().should_not_be(clock.sleep)
+        Spec(time.perf_counter() - started < 60).it().should_be(True)
+
+    @verifiable
+    def should_verify_backoff_and_timeouts(self):
+        ''' collaborations that will_take() time should advance the clock,
+        so that timeouts and backoffs are specified deterministically '''
+        clock = VirtualClock()
+        service = MockSpec(name='service', clock=clock)
+        service.fetch().will_take(5.0).will_raise(TimeoutError)
+        service.fetch().times(2).will_take(3.0, 0.5).will_return('x', 'y')
+        service.start_collaborating()
+        spec = Spec(retry)
+        spec.retry(lambda: service.fetch(), 4, 1.0, clock.sleep,
+                   clock.monotonic, 1.0).should_be(('y', 3))
+        Spec(clock.sleeps).it().should_be([1.0, 2.0])
+        Spec(clock.monotonic()).it().should_be(11.5)
+        Spec(service).verify().should_not_raise(Exception)
+
+    @verifiable
+    def should_need_a_clock(self):
+        ''' will_take() should need a MockSpec with a clock '''
+        spec = Spec(MockSpec().fetch())
+        spec.will_take(1.0).should_raise(ValueError)
+
+    @verifiable
+    def should_take_real_time_if_asked(self):
+        ''' collaborations with a MockSpec(clock=REAL_TIME) should take
+        real time '''
+        service = MockSpec(clock=REAL_TIME)
+        service.fetch().will_take(0.01)
+        service.start_collaborating()
+        started = time.perf_counter()
+        service.fetch()
+        Spec(time.perf_counter() - started >= 0.01).it().should_be(True)
+
+    @verifiable
+    def event_loop_should_not_wait(self):
+        ''' an event loop should run in the clock's time, advancing it
+        rather than waiting for timers '''
+        clock = VirtualClock()
+        started = time.perf_counter()
+        spec = Spec(clock)
+        spec.run(wait_briefly(30, 60)).should_be(('slept', 30.0))
+        spec.run(wait_briefly(300, 60)).should_be(('timed out', 60.0))
+        Spec(clock.monotonic()).it().should_be(90.0)
+        Spec(time.perf_counter() - started < 30).it().should_be(True)
+
+if __name__ == '__main__':
+    verify()
@@ -1,8 +1,18 @@
 ''' Specs for core library classes / behaviours ''' 
 
-from lancelot import MockSpec, Spec, grouping, verifiable, verify
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from lancelot import MockSpec, Spec, constraints, grouping, verifiable, \
+                     verify
 from lancelot.constraints import Constraint, CollaborateWith, Not, Raise, \
-                                 EqualsEquals
+                                 EqualsEquals, CollectAtMost, CreateAtMost, \
+                                 Lazy, Source, NoNetwork, OpenAtMost, \
+                                 ReadAtMost, SpawnAtMost, NotBlockLoop
 from lancelot.verification import UnmetSpecification
 from lancelot.specs.simple_fns import dont_raise_index_error, number_one, \
                                       raise_index_error
@@ -156,5 +166,278 @@ class CollaborateWithBehaviour:
         spec.verify(lambda: mock_spec.foo())
         spec.should_not_raise(UnmetSpecification)
 
+def churn_cycles():
+    ''' Simple fn that creates enough cyclic garbage to need collecting '''
+    for _ in range(10000):
+        cycle = []
+        cycle.append(cycle)
+
+@grouping
+class GcActivityLimitBehaviour:
+    ''' A group of specifications for CollectAtMost and CreateAtMost '''
+
+    @verifiable
+    def should_limit_collections(self):
+        ''' CollectAtMost should count each generation's collections '''
+        spec = Spec(CollectAtMost(gen0=0))
+        spec.describe_constraint().should_be('should collect at most gen0=0')
+        spec.verify(churn_cycles).should_raise(UnmetSpecification)
+        spec.verify(number_one).should_not_raise(UnmetSpecification)
+        spec = Spec(CollectAtMost(gen1=1000, gen2=1000))
+        msg = 'should collect at most gen1=1000, gen2=1000'
+        spec.describe_constraint().should_be(msg)
+        spec.verify(churn_cycles).should_not_raise(UnmetSpecification)
+
+    @verifiable
+    def should_limit_objects(self):
+        ''' CreateAtMost should count the objects left behind '''
+        spec = Spec(CreateAtMost(objects=10))
+        spec.describe_constraint().should_be('should create at most '
+                                             'objects=10')
+        spec.verify(lambda: [[] for _ in range(100)])
+        spec.should_raise(UnmetSpecification)
+        spec.verify(lambda: [[] for _ in range(5)])
+        spec.should_not_raise(UnmetSpecification)
+        spec.verify(lambda: len([[] for _ in range(100)]))
+        spec.should_not_raise(UnmetSpecification)
+
+    @verifiable
+    def should_need_a_limit(self):
+        ''' CollectAtMost should have at least one generation's limit '''
+        Spec(CollectAtMost).__call__().should_raise(ValueError)
+
+def doubled(items):
+    ''' Simple fn that lazily doubles each item '''
+    return (item * 2 for item in items)
+
+def evens(items):
+    ''' Simple fn that lazily filters out odd items '''
+    return (item for item in items if item % 2 == 0)
+
+def sorted_items(items):
+    ''' Simple fn that must consume all of its items before returning '''
+    return iter(sorted(items))
+
+@grouping
+class LazyBehaviour:
+    ''' A group of specifications for Lazy and Source '''
+
+    @verifiable
+    def source_should_count_consumed(self):
+        ''' Source should count the items consumed from it '''
+        source = Source('abc')
+        spec = Spec(source)
+        spec.__next__().should_be('a')
+        spec.__next__().should_be('b')
+        spec.it().should_have(consumed=2)
+        Spec(len(list(Source()))).it().should_be(10000)
+
+    @verifiable
+    def should_pass_lazy_fns(self):
+        ''' a fn consuming items only as its own are pulled is lazy '''
+        source = Source()
+        spec = Spec(Lazy(source))
+        msg = 'should be lazy, consuming at most 0 items on call, ' \
+              'then 1 per output'
+        spec.describe_constraint().should_be(msg)
+        spec.verify(lambda: doubled(source))
+        spec.should_not_raise(UnmetSpecification)
+        Spec(source).it().should_have(consumed=10)
+
+    @verifiable
+    def should_trap_eager_fns(self):
+        ''' a fn consuming all items on call is not lazy '''
+        source = Source()
+        spec = Spec(Lazy(source))
+        msg = 'should be lazy, consuming at most 0 items on call, ' \
+              'then 1 per output, not 10000 items consumed on call'
+        spec.verify(lambda: sorted_items(source))
+        spec.should_raise(UnmetSpecification(msg))
+
+    @verifiable
+    def should_check_consumed_per_output(self):
+        ''' a fn consuming more items than specified per output is not lazy
+        enough, unless per_output allows for it '''
+        source = Source()
+        spec = Spec(Lazy(source, outputs=3))
+        msg = 'should be lazy, consuming at most 0 items on call, ' \
+              'then 1 per output, not 3 items consumed for 2 outputs'
+        spec.verify(lambda: evens(source))
+        spec.should_raise(UnmetSpecification(msg))
+        source = Source()
+        spec = Spec(Lazy(source, per_output=lambda m: 2 * m))
+        spec.verify(lambda: evens(source))
+        spec.should_not_raise(UnmetSpecification)
+
+    @verifiable
+    def should_need_an_iterable(self):
+        ''' a fn not returning an iterable is not lazy '''
+        source = Source()
+        spec = Spec(Lazy(source))
+        spec.verify(lambda: 1).should_raise(UnmetSpecification)
+
+def read_this_file():
+    ''' Simple fn that reads this spec file '''
+    with open(__file__, 'rb') as this_file:
+        return this_file.read()
+
+def look_up_localhost():
+    ''' Simple fn that looks up a host name '''
+    return socket.getaddrinfo('localhost', 80)
+
+def spawn_python():
+    ''' Simple fn that runs a python process '''
+    return subprocess.call([sys.executable, '-c', 'pass'])
+
+@grouping
+class IoActivityLimitBehaviour:
+    ''' A group of specifications for the I/O activity constraints '''
+
+    @verifiable
+    def should_limit_files_opened(self):
+        ''' OpenAtMost should count the files opened '''
+        spec = Spec(OpenAtMost(files=0))
+        spec.describe_constraint().should_be('should open at most files=0')
+        spec.verify(read_this_file).should_raise(UnmetSpecification)
+        spec.verify(number_one).should_not_raise(UnmetSpecification)
+        spec = Spec(OpenAtMost(files=1))
+        spec.verify(read_this_file).should_not_raise(UnmetSpecification)
+
+    @verifiable
+    def should_limit_bytes_read(self):
+        ''' ReadAtMost should count the bytes read, or be refused where they
+        can't be measured '''
+        if not os.path.exists('/proc/self/io'):
+            spec = Spec(lambda: ReadAtMost(bytes=0))
+            spec.__call__().should_raise(ValueError)
+            return
+        size = os.path.getsize(__file__)
+        spec = Spec(ReadAtMost(bytes=size - 1))
+        spec.describe_constraint().should_be('should read at most bytes=%d'
+                                             % (size - 1))
+        spec.verify(read_this_file).should_raise(UnmetSpecification)
+        spec = Spec(ReadAtMost(bytes=size))
+        spec.verify(read_this_file).should_not_raise(UnmetSpecification)
+
+    @verifiable
+    def should_refuse_unmeasured_bytes_read(self):
+        ''' ReadAtMost should be refused with a clear message where the bytes
+        read can't be measured, and unmet if they can't be measured while
+        the action is invoked '''
+        rchar = constraints._rchar
+        constraints._rchar = lambda: None
+        try:
+            spec = Spec(lambda: ReadAtMost(bytes=0))
+            spec.__call__().should_raise(
+                ValueError('should read at most bytes=0 cannot be verified '
+                           'here: bytes read are only measured where '
+                           '/proc/self/io can be read'))
+        finally:
+            constraints._rchar = rchar
+        if rchar() is None:
+            return
+        def unmeasured():
+            constraints._rchar = lambda: None
+        try:
+            spec = Spec(ReadAtMost(bytes=0))
+            spec.verify(unmeasured).should_raise(
+                UnmetSpecification('should read at most bytes=0, but bytes '
+                                   'could not be measured'))
+        finally:
+            constraints._rchar = rchar
+
+    @verifiable
+    def should_trap_network_activity(self):
+        ''' NoNetwork should trap name lookups '''
+        spec = Spec(NoNetwork())
+        spec.describe_constraint().should_be('should not touch the network')
+        spec.verify(look_up_localhost).should_raise(UnmetSpecification)
+        spec.verify(read_this_file).should_not_raise(UnmetSpecification)
+
+    @verifiable
+    def should_limit_processes_spawned(self):
+        ''' SpawnAtMost should count the processes spawned '''
+        spec = Spec(SpawnAtMost(processes=0))
+        spec.verify(spawn_python).should_raise(UnmetSpecification)
+        spec = Spec(SpawnAtMost(processes=1))
+        spec.verify(spawn_python).should_not_raise(UnmetSpecification)
+
+async def block_briefly():
+    ''' Simple coroutine that blocks its event loop with a sleep '''
+    await asyncio.sleep(0)
+    time.sleep(0.1)
+    await asyncio.sleep(0)
+
+def blocking(seconds):
+    ''' Simple coroutine fn that blocks its event loop for seconds '''
+    async def block():
+        ''' Block the loop with a sleep '''
+        await asyncio.sleep(0)
+        time.sleep(seconds)
+    return block
+
+def blocking_repeatedly(seconds, steps):
+    ''' Simple coroutine fn that blocks its event loop for seconds in each
+    of several steps '''
+    async def block():
+        ''' Block the loop with a sleep, yielding in between '''
+        for _ in range(steps):
+            await asyncio.sleep(0)
+            time.sleep(seconds)
+    return block
+
+async def wait_briefly():
+    ''' Simple coroutine that yields to its event loop while it waits '''
+    await asyncio.sleep(0.1)
+
+@grouping
+class NotBlockLoopBehaviour:
+    ''' A group of specifications for NotBlockLoop '''
+
+    @verifiable
+    def should_trap_blocking_steps(self):
+        ''' a step blocking the loop for too long should be unmet, with the
+        stack of the blocking call '''
+        spec = Spec(NotBlockLoop(threshold=0.02))
+        msg = 'should not block the event loop for more than 0.02s'
+        spec.describe_constraint().should_be(msg)
+        spec.verify(block_briefly).should_raise(UnmetSpecification)
+        try:
+            NotBlockLoop(threshold=0.02).verify(block_briefly)
+        except UnmetSpecification as unmet:
+            spec = Spec(str(unmet))
+            spec.it().should_contain('in block_briefly')
+            spec.it().should_contain('time.sleep(0.1)')
+
+    @verifiable
+    def should_trap_steps_just_too_long(self):
+        ''' a step blocking the loop for a little longer than the threshold
+        should be unmet '''
+        spec = Spec(NotBlockLoop(threshold=0.1))
+        spec.verify(blocking(0.12)).should_raise(UnmetSpecification)
+        spec = Spec(NotBlockLoop(threshold=0.05))
+        spec.verify(blocking(0.06)).should_raise(UnmetSpecification)
+
+    @verifiable
+    def should_pass_steps_just_short_enough(self):
+        ''' a step blocking the loop for a little less than the threshold
+        should be met, as should a series of such steps '''
+        spec = Spec(NotBlockLoop(threshold=0.1))
+        spec.verify(blocking(0.085)).should_not_raise(UnmetSpecification)
+        spec.verify(blocking_repeatedly(0.04, 3)).should_not_raise(
+            UnmetSpecification)
+
+    @verifiable
+    def should_pass_yielding_steps(self):
+        ''' an action waiting without blocking the loop should be met '''
+        spec = Spec(NotBlockLoop(threshold=0.05))
+        spec.verify(wait_briefly).should_not_raise(UnmetSpecification)
+
+    @verifiable
+    def should_need_an_awaitable(self):
+        ''' an action not returning an awaitable should be unmet '''
+        spec = Spec(NotBlockLoop())
+        spec.verify(number_one).should_raise(UnmetSpecification)
+
 if __name__ == '__main__':
     verify()
@@ -0,0 +1,153 @@
+''' Specs for distributing verification across worker processes '''
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.comparators import Type
+from lancelot.distribution import DistributedExecution, format_address, \
+                                  parse_address, work
+from lancelot.execution import WorkerCrashed
+from lancelot.verification import AllVerifiable
+from lancelot.specs.execution_spec import ExceptionListener, \
+                                          exit_abruptly, exit_on_first_attempt
+from lancelot.specs.simple_fns import number_one, raise_index_error
+from lancelot.specs.verification_spec import SilentListener
+
+def distributed_verify(*verifiable_fns, listener=None, **kwds):
+    ''' Descriptive fn: verify fns using DistributedExecution(**kwds) '''
+    all_verifiable = AllVerifiable(listener or SilentListener())
+    for verifiable_fn in verifiable_fns:
+        all_verifiable.include(verifiable_fn)
+    return all_verifiable.verify(executor=DistributedExecution(**kwds))
+
+def join_when_listening(path):
+    ''' Simple fn that runs a worker as soon as a coordinator listens at
+    (Unix socket) path '''
+    while not os.path.exists(path):
+        time.sleep(0.01)
+    work(path)
+
+class CountedSetups:
+    ''' Grouping noting each setup in the file named by
+    $LANCELOT_SPEC_MARKER, from whichever process verifies it '''
+    def setup_grouping(self):
+        ''' Note the setup '''
+        with open(os.environ['LANCELOT_SPEC_MARKER'], 'a') as marker:
+            marker.write('setup\n')
+    def first(self):
+        ''' Something verifiable '''
+        pass
+    def second(self):
+        ''' Something else verifiable '''
+        pass
+    def third(self):
+        ''' And something else '''
+        pass
+
+@grouping
+class DistributedExecutionBehaviour:
+    ''' A group of specifications for DistributedExecution behaviour '''
+
+    @verifiable
+    def should_verify_with_local_workers(self):
+        ''' outcomes in workers should be reported as usual, with fns that
+        can't be imported by name verified by the coordinator '''
+        spec = Spec(distributed_verify)
+        spec.distributed_verify(number_one, raise_index_error, lambda: None,
+                                workers=2)
+        spec.should_be({'total':3, 'verified':2, 'unverified':1})
+
+    @verifiable
+    def should_requeue_lost_work(self):
+        ''' a fn held by a worker that died should be handed out again '''
+        marker_dir = tempfile.mkdtemp()
+        os.environ['LANCELOT_SPEC_MARKER'] = os.path.join(marker_dir, 'x')
+        try:
+            spec = Spec(distributed_verify)
+            spec.distributed_verify(exit_on_first_attempt, number_one,
+                                    workers=1)
+            spec.should_be({'total':2, 'verified':2, 'unverified':0})
+        finally:
+            del os.environ['LANCELOT_SPEC_MARKER']
+            shutil.rmtree(marker_dir)
+
+    @verifiable
+    def should_set_up_groupings_once(self):
+        ''' the methods of a grouping should be handed out together, so
+        that it is set up once, rather than by each batch '''
+        marker_dir = tempfile.mkdtemp()
+        marker = os.path.join(marker_dir, 'setups')
+        os.environ['LANCELOT_SPEC_MARKER'] = marker
+        try:
+            all_verifiable = AllVerifiable(SilentListener())
+            grouping(CountedSetups, all_verifiable)
+            for method in (CountedSetups.first, CountedSetups.second,
+                           CountedSetups.third):
+                verifiable(method, all_verifiable)
+            all_verifiable.include(number_one)
+            spec = Spec(all_verifiable)
+            spec.verify(executor=DistributedExecution(workers=2))
+            spec.should_be({'total':4, 'verified':4, 'unverified':0})
+            with open(marker) as setups:
+                Spec(setups.read()).it().should_be('setup\n')
+        finally:
+            del os.environ['LANCELOT_SPEC_MARKER']
+            shutil.rmtree(marker_dir)
+
+    @verifiable
+    def should_give_up_on_repeatedly_lost_work(self):
+        ''' a fn that loses every worker should be reported as crashed,
+        and the verification run should carry on '''
+        listener = ExceptionListener()
+        spec = Spec(distributed_verify)
+        spec.distributed_verify(exit_abruptly, number_one, workers=2,
+                                max_attempts=2, listener=listener)
+        spec.should_be({'total':2, 'verified':1, 'unverified':1})
+        spec = Spec(listener.exceptions)
+        spec.__getitem__(0).should_be(Type(WorkerCrashed))
+
+    @verifiable
+    def should_accept_workers_that_join(self):
+        ''' workers started elsewhere should be handed the work '''
+        socket_dir = tempfile.mkdtemp()
+        path = os.path.join(socket_dir, 'coordinator')
+        worker = threading.Thread(target=join_when_listening, args=(path,),
+                                  daemon=True)
+        worker.start()
+        try:
+            spec = Spec(distributed_verify)
+            spec.distributed_verify(number_one, raise_index_error,
+                                    address=path, workers=0)
+            spec.should_be({'total':2, 'verified':1, 'unverified':1})
+        finally:
+            worker.join()
+            shutil.rmtree(socket_dir)
+
+    @verifiable
+    def should_not_wait_forever_for_workers(self):
+        ''' with no worker connected within the connect timeout, the fns
+        left should be reported as crashed rather than waited for '''
+        listener = ExceptionListener()
+        spec = Spec(distributed_verify)
+        spec.distributed_verify(number_one, raise_index_error, workers=0,
+                                connect_timeout=0.2, listener=listener)
+        spec.should_be({'total':2, 'verified':0, 'unverified':2})
+        spec = Spec([str(exception) for exception in listener.exceptions])
+        spec.it().should_be(['no worker connected within 0.2s'] * 2)
+
+@verifiable
+def addresses_behaviour():
+    ''' "host:port" should be a TCP address, anything else a path '''
+    spec = Spec(parse_address)
+    spec.parse_address('example.com:7777').should_be(('example.com', 7777))
+    spec.parse_address(':7777').should_be(('127.0.0.1', 7777))
+    spec.parse_address('/tmp/coordinator').should_be('/tmp/coordinator')
+    spec = Spec(format_address)
+    spec.format_address(('example.com', 7777)).should_be('example.com:7777')
+
+if __name__ == '__main__':
+    verify()
@@ -0,0 +1,348 @@
+''' Specs for verifying functions outside of the verifying process '''
+
+import ctypes
+import os
+import sys
+import threading
+import time
+import warnings
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.comparators import ExceptionValue, GreaterThan, Type
+from lancelot.execution import ForkServerExecution, RemoteException, \
+                               WorkerCrashed, decode_outcome, encode_outcome, \
+                               ProcessPoolExecution, SubinterpreterExecution, \
+                               ThreadedExecution, verify_shard, _shards
+from lancelot.verification import AllVerifiable, UnmetSpecification
+from lancelot.specs.simple_fns import number_one, raise_index_error, \
+                                      string_abc
+from lancelot.specs.verification_spec import RecordingListener, \
+                                             SilentListener, results_of
+
+LEAKY_STATE = []
+
+def leak_state():
+    ''' Simple fn that leaks global state '''
+    LEAKY_STATE.append('leaked')
+
+def exit_abruptly():
+    ''' Simple fn that exits its process without any clean up '''
+    os._exit(3)
+
+def exit_on_first_attempt():
+    ''' Simple fn that exits its process the first time it is called with
+    $LANCELOT_SPEC_MARKER naming a file that doesn't yet exist '''
+    marker = os.environ['LANCELOT_SPEC_MARKER']
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(3)
+
+def segfault():
+    ''' Simple fn that crashes its process '''
+    ctypes.string_at(0)
+
+def sleep_briefly():
+    ''' Simple fn that takes a little while '''
+    time.sleep(0.1)
+
+def start_daemon_thread():
+    ''' Simple fn that starts (and waits for) a daemon thread '''
+    thread = threading.Thread(target=time.sleep, args=(0.01,), daemon=True)
+    thread.start()
+    thread.join()
+
+def sleep_forever():
+    ''' Simple fn that blocks in a system call, never to return '''
+    time.sleep(3600)
+
+class ExceptionListener(RecordingListener):
+    ''' RecordingListener that also records any exceptions sent '''
+    def __init__(self):
+        ''' No exceptions recorded at instantiation '''
+        super().__init__()
+        self.exceptions = []
+    def unexpected_exception(self, verifiable_fn, exception):
+        ''' Record the exception '''
+        self.messages.append('unexpected_exception')
+        self.exceptions.append(exception)
+
+def fork_server_verify(*verifiable_fns, listener=None, timeout=None):
+    ''' Descriptive fn: verify fns using ForkServerExecution '''
+    all_verifiable = AllVerifiable(listener or SilentListener())
+    for verifiable_fn in verifiable_fns:
+        all_verifiable.include(verifiable_fn)
+    return all_verifiable.verify(timeout=timeout,
+                                 executor=ForkServerExecution())
+
+def sharded_verify(executor, *verifiable_fns, timeout=None):
+    ''' Descriptive fn: verify fns using a sharded executor '''
+    all_verifiable = AllVerifiable(SilentListener())
+    for verifiable_fn in verifiable_fns:
+        all_verifiable.include(verifiable_fn)
+    return all_verifiable.verify(timeout=timeout, executor=executor)
+
+@grouping
+class ForkServerExecutionBehaviour:
+    ''' A group of specifications for ForkServerExecution behaviour '''
+
+    @verifiable
+    def should_verify_each_fn(self):
+        ''' outcomes in child processes should be reported as usual '''
+        spec = Spec(fork_server_verify)
+        spec.fork_server_verify(number_one, raise_index_error)
+        spec.should_be({'total':2, 'verified':1, 'unverified':1})
+
+    @verifiable
+    def should_confine_leaked_state(self):
+        ''' global state changed by a fn should stay within its child '''
+        fork_server_verify(leak_state)
+        Spec(LEAKY_STATE).it().should_be([])
+
+    @verifiable
+    def should_survive_crashes(self):
+        ''' crashes and os._exit() should be reported as WorkerCrashed,
+        and the verification run should carry on '''
+        listener = ExceptionListener()
+        spec = Spec(fork_server_verify)
+        spec.fork_server_verify(exit_abruptly, segfault, number_one,
+                                listener=listener)
+        spec.should_be({'total':3, 'verified':1, 'unverified':2})
+        spec = Spec(listener.exceptions)
+        spec.__getitem__(0).should_be(Type(WorkerCrashed))
+        spec.then(lambda: str(listener.exceptions[0]))
+        spec.should_contain('exited with status 3')
+        spec.then(lambda: str(listener.exceptions[1]))
+        spec.should_contain('SIGSEGV')
+
+    @verifiable
+    def should_survive_template_crashes(self):
+        ''' the template process exiting should be reported as WorkerCrashed
+        for the function being verified, and each of those left, and the
+        verification run should carry on '''
+        class DoomedResource:
+            ''' Grouping whose setup kills the template process '''
+            def setup_grouping(self):
+                ''' Exit, without any clean up '''
+                exit_abruptly()
+            def method(self):
+                ''' Something verifiable, never reached '''
+                pass
+        listener = ExceptionListener()
+        all_verifiable = AllVerifiable(listener)
+        grouping(DoomedResource, all_verifiable)
+        all_verifiable.include(number_one)
+        verifiable(DoomedResource.method, all_verifiable)
+        all_verifiable.include(string_abc)
+        spec = Spec(all_verifiable)
+        spec.verify(executor=ForkServerExecution())
+        spec.should_be({'total':3, 'verified':1, 'unverified':2})
+        spec = Spec([str(exception) for exception in listener.exceptions])
+        spec.it().should_be(
+            ['fork server exited with status 3 while verifying',
+             'fork server exited before verifying'])
+
+    @verifiable
+    def should_kill_timed_out_children(self):
+        ''' a child blocked beyond its timeout should be killed '''
+        listener = RecordingListener()
+        spec = Spec(fork_server_verify)
+        spec.fork_server_verify(sleep_forever, number_one,
+                                listener=listener, timeout=0.2)
+        spec.should_be({'total':2, 'verified':1, 'unverified':1})
+        Spec(listener.messages).it().should_contain('verification_timed_out')
+
+    @verifiable
+    def should_set_up_groups_in_template(self):
+        ''' grouping setup should be done once, shared by each child '''
+        class SharedResource:
+            ''' Grouping whose methods need a resource set up for them '''
+            def setup_grouping(self):
+                ''' Set up the resource, once, outside of the children '''
+                self.resource = [os.getpid()]
+            def first(self):
+                ''' The resource should have been set up in another process '''
+                if self.resource[0] == os.getpid():
+                    raise UnmetSpecification('set up in child')
+            def second(self):
+                ''' The resource should be the same one '''
+                self.first()
+        all_verifiable = AllVerifiable(SilentListener())
+        grouping(SharedResource, all_verifiable)
+        verifiable(SharedResource.first, all_verifiable)
+        verifiable(SharedResource.second, all_verifiable)
+        spec = Spec(all_verifiable)
+        spec.verify(executor=ForkServerExecution())
+        spec.should_be({'total':2, 'verified':2, 'unverified':0})
+
+    @verifiable
+    def should_report_failed_teardown_with_failed_method(self):
+        ''' an exception raised tearing down a group in the template should
+        be reported after that raised by the method verified before it '''
+        class BrokenResource:
+            ''' Grouping whose method and teardown both fail '''
+            def method(self):
+                ''' Fail in the child '''
+                raise_index_error()
+            def teardown_grouping(self):
+                ''' Fail in the template '''
+                raise ValueError('torn down badly')
+        listener = ExceptionListener()
+        all_verifiable = AllVerifiable(listener)
+        grouping(BrokenResource, all_verifiable)
+        verifiable(BrokenResource.method, all_verifiable)
+        all_verifiable.verify(executor=ForkServerExecution())
+        Spec(listener.exceptions[0]).it().should_be(Type(IndexError))
+        spec = Spec(''.join(listener.exceptions[0].remote_traceback))
+        spec.it().should_contain('raise_index_error')
+        spec.it().should_contain("also raised: ValueError('torn down badly')")
+
+def subinterpreter_execution(shards):
+    ''' A SubinterpreterExecution, without its warning of falling back to
+    a process pool before Python 3.13 '''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return SubinterpreterExecution(shards)
+
+@grouping
+class ShardedExecutionBehaviour:
+    ''' A group of specifications for SubinterpreterExecution and
+    ProcessPoolExecution behaviour '''
+
+    @verifiable
+    def should_verify_in_subinterpreters(self):
+        ''' outcomes in sub-interpreters should be reported as usual, with
+        fns that can't be imported by name verified in the main one '''
+        spec = Spec(sharded_verify)
+        spec.sharded_verify(subinterpreter_execution(2), number_one,
+                            raise_index_error, lambda: None)
+        spec.should_be({'total':3, 'verified':2, 'unverified':1})
+
+    @verifiable
+    def should_verify_daemon_threads_in_main_interpreter(self):
+        ''' fns with a timeout, or starting daemon threads, which isolated
+        sub-interpreters don't allow, should be verified in the main one '''
+        spec = Spec(sharded_verify)
+        spec.sharded_verify(subinterpreter_execution(2), number_one,
+                            start_daemon_thread)
+        spec.should_be({'total':2, 'verified':2, 'unverified':0})
+        spec.sharded_verify(subinterpreter_execution(2), number_one,
+                            sleep_briefly, timeout=5)
+        spec.should_be({'total':2, 'verified':2, 'unverified':0})
+
+    @verifiable
+    def should_warn_of_falling_back(self):
+        ''' before Python 3.13, where shards are verified in a process pool,
+        SubinterpreterExecution should say so with fell_back and a
+        RuntimeWarning '''
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', RuntimeWarning)
+            executor = SubinterpreterExecution(2)
+        fell_back = sys.version_info < (3, 13)
+        Spec(lambda: executor.fell_back).__call__().should_be(fell_back)
+        spec = Spec(lambda: [warning.category for warning in caught])
+        spec.__call__().should_be([RuntimeWarning] if fell_back else [])
+
+    @verifiable
+    def should_keep_groupings_in_one_shard(self):
+        ''' the methods of a grouping should be verified in the same shard,
+        so that its setup is shared '''
+        entries = [(0, 'm', 'a', None), (1, 'm', 'G.b', None),
+                   (2, 'm', 'G.c', None), (3, 'm', 'G.d', None),
+                   (4, 'm', 'e', None), (5, 'm', 'f', None)]
+        shards = _shards(entries, 3)
+        spec = Spec(lambda: [[entry[0] for entry in shard]
+                             for shard in shards])
+        spec.__call__().should_be([[0, 1, 2, 3], [4, 5]])
+
+    @verifiable
+    def should_verify_in_process_pool(self):
+        ''' outcomes in worker processes should be reported as usual, with
+        fns that can't be imported by name verified in the main process '''
+        spec = Spec(sharded_verify)
+        spec.sharded_verify(ProcessPoolExecution(2), number_one,
+                            raise_index_error, lambda: None)
+        spec.should_be({'total':3, 'verified':2, 'unverified':1})
+
+    @verifiable
+    def should_send_unsupported_for_unimportable(self):
+        ''' a fn whose module can't be imported in a worker should be sent
+        back as unsupported, for verifying elsewhere '''
+        records = []
+        verify_shard([(0, 'lancelot.specs.no_such_spec', 'fn', None)],
+                     records.append)
+        spec = Spec(lambda: records[0]['status'])
+        spec.__call__().should_be('unsupported')
+
+@grouping
+class StreamedResultsBehaviour:
+    ''' A group of specifications for verify_iter() with executors '''
+
+    def all_verifiable(self):
+        ''' An AllVerifiable including a met and an unmet fn '''
+        all_verifiable = AllVerifiable(SilentListener())
+        return all_verifiable.include(number_one).include(raise_index_error)
+
+    def expected(self):
+        ''' The results of verifying all_verifiable() '''
+        return [('lancelot.specs.simple_fns.number_one', 'met', None),
+                ('lancelot.specs.simple_fns.raise_index_error', 'unexpected',
+                 'IndexError: with message')]
+
+    @verifiable
+    def should_yield_threaded_results(self):
+        ''' results from threads should be yielded as usual '''
+        spec = Spec(results_of)
+        spec.results_of(self.all_verifiable(),
+                        executor=ThreadedExecution(2))
+        spec.should_be(self.expected())
+
+    @verifiable
+    def should_yield_process_pool_results(self):
+        ''' results from worker processes should be yielded as usual '''
+        spec = Spec(results_of)
+        spec.results_of(self.all_verifiable(),
+                        executor=ProcessPoolExecution(2))
+        spec.should_be(self.expected())
+
+    @verifiable
+    def should_use_worker_durations(self):
+        ''' durations should be as measured where each fn was verified '''
+        all_verifiable = AllVerifiable(SilentListener()).include(sleep_briefly)
+        results = list(all_verifiable.verify_iter(
+            executor=ForkServerExecution()))
+        spec = Spec(lambda: results[0].duration)
+        spec.__call__().should_be(GreaterThan(0.05))
+
+@grouping
+class OutcomeEncodingBehaviour:
+    ''' A group of specifications for encoding outcomes between processes '''
+
+    @verifiable
+    def should_recreate_exceptions(self):
+        ''' decoded exceptions should be as similar as possible '''
+        class CustomError(Exception):
+            ''' An exception that can't be recreated elsewhere '''
+        spec = Spec(decode_outcome)
+        spec.decode_outcome(encode_outcome(None)).should_be(None)
+        for exception in (UnmetSpecification('ni'), IndexError('ni')):
+            record = encode_outcome(exception)
+            spec.decode_outcome(record).should_be(ExceptionValue(exception))
+        record = encode_outcome(CustomError('ni'))
+        spec = Spec(decode_outcome)
+        spec.decode_outcome(record).should_be(Type(RemoteException))
+
+    @verifiable
+    def should_keep_remote_traceback(self):
+        ''' decoded exceptions should have the traceback of the original '''
+        try:
+            raise_index_error()
+        except IndexError as error:
+            exception = error
+        decoded = decode_outcome(encode_outcome(exception))
+        spec = Spec(lambda: decoded.remote_traceback)
+        spec.__call__().should_be(Type(list))
+        spec = Spec(''.join(decoded.remote_traceback))
+        spec.it().should_contain('raise_index_error')
+
+if __name__ == '__main__':
+    verify()
@@ -0,0 +1,349 @@
+''' Specs for scoped, cached given= fixtures '''
+
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.comparators import GreaterThan, Length, Type
+from lancelot.fixtures import Fixture, PersistentFixture, fixture, \
+                              persistent
+from lancelot.execution import ThreadedExecution
+from lancelot.leaks import LeakDetection
+from lancelot.profiling import Profiling
+from lancelot.verification import AllVerifiable
+from lancelot.specs.verification_spec import SilentListener
+
+class CountingBuilder:
+    ''' Callable that builds a new list, counting how often it is called '''
+    def __init__(self):
+        ''' Nothing built at instantiation '''
+        self.builds = 0
+    def __call__(self):
+        ''' Build a new list '''
+        self.builds += 1
+        return ['holy', 'grail']
+
+def slowly(builder):
+    ''' Descriptive fn: builder, taking a while to build '''
+    def build():
+        ''' Build the state, slowly '''
+        time.sleep(0.01)
+        return builder()
+    return build
+
+@grouping
+class FixtureScopeBehaviour:
+    ''' A group of specifications for Fixture scope behaviour '''
+
+    @verifiable
+    def spec_scope_should_build_every_time(self):
+        ''' scope='spec' should call given() for every Spec '''
+        builder = CountingBuilder()
+        given = Fixture(builder, scope='spec')
+        Spec(list, given=given)
+        Spec(list, given=given)
+        Spec(builder).then(lambda: builder.builds).should_be(2)
+
+    @verifiable
+    def module_scope_should_build_once(self):
+        ''' scope='module' should call given() once within a module '''
+        builder = CountingBuilder()
+        given = Fixture(builder, scope='module')
+        Spec(list, given=given)
+        Spec(list, given=given)
+        Spec(builder).then(lambda: builder.builds).should_be(1)
+
+    @verifiable
+    def should_rebuild_for_new_scope(self):
+        ''' state should be built again once per grouping '''
+        builder = CountingBuilder()
+        given = Fixture(builder, scope='grouping')
+        all_verifiable = AllVerifiable(listener=SilentListener())
+        class FirstGroup:
+            ''' A grouping using the fixture twice '''
+            def first(self):
+                ''' Use the fixture '''
+                Spec(list, given=given)
+            def second(self):
+                ''' Use the fixture again '''
+                Spec(list, given=given)
+        class SecondGroup(FirstGroup):
+            ''' Another grouping using the fixture twice '''
+            def third(self):
+                ''' Use the fixture once more '''
+                Spec(list, given=given)
+        grouping(FirstGroup, all_verifiable)
+        grouping(SecondGroup, all_verifiable)
+        for fn in (FirstGroup.first, FirstGroup.second, SecondGroup.third):
+            verifiable(fn, all_verifiable)
+        Spec(all_verifiable).verify().should_be(Type(dict))
+        Spec(builder).then(lambda: builder.builds).should_be(2)
+
+    @verifiable
+    def should_keep_state_per_scope(self):
+        ''' state should be kept for each scope instance, e.g. for modules
+        verified in turn, up to max_states of them '''
+        def use_fixture():
+            ''' Use the fixture '''
+            Spec(list, given=given)
+        fns = []
+        for module in ('first', 'second', 'first'):
+            fn = lambda: use_fixture()
+            fn.__module__ = module
+            fns.append(fn)
+        for max_states, builds in ((8, 2), (1, 3)):
+            builder = CountingBuilder()
+            given = Fixture(builder, scope='module', max_states=max_states)
+            all_verifiable = AllVerifiable(listener=SilentListener())
+            for fn in fns:
+                all_verifiable.include(fn)
+            all_verifiable.verify()
+            Spec(builder).then(lambda: builder.builds).should_be(builds)
+
+    @verifiable
+    def should_share_run_scope_with_executors(self):
+        ''' scope='run' should build state once per verification run, for
+        functions verified by executors within the verifying process too '''
+        class FiveUses:
+            ''' A grouping using the fixture in each of five methods '''
+            def first(self):
+                ''' Use the fixture '''
+                Spec(list, given=given)
+            def second(self):
+                ''' Use the fixture again '''
+                Spec(list, given=given)
+            def third(self):
+                ''' And again '''
+                Spec(list, given=given)
+            def fourth(self):
+                ''' And again '''
+                Spec(list, given=given)
+            def fifth(self):
+                ''' Use the fixture once more '''
+                Spec(list, given=given)
+        methods = [getattr(FiveUses, name) for name in
+                   ('first', 'second', 'third', 'fourth', 'fifth')]
+        directory = tempfile.mkdtemp()
+        try:
+            for executor in (None, ThreadedExecution(workers=3),
+                             LeakDetection(iterations=3, warmup=1),
+                             Profiling(directory)):
+                builder = CountingBuilder()
+                given = Fixture(slowly(builder), scope='run')
+                all_verifiable = AllVerifiable(listener=SilentListener())
+                grouping(FiveUses, all_verifiable)
+                for method in methods:
+                    verifiable(method, all_verifiable)
+                outcome = all_verifiable.verify(executor=executor)
+                Spec(outcome['verified']).it().should_be(5)
+                Spec(outcome).get('fixture_time_saved').should_be(
+                    GreaterThan(0))
+                Spec(builder).then(lambda: builder.builds).should_be(1)
+        finally:
+            shutil.rmtree(directory)
+
+    @verifiable
+    def should_reject_unknown_scope(self):
+        ''' unknown scopes should be rejected '''
+        msg = "scope 'galaxy' is not one of spec, grouping, module, run"
+        spec = Spec(fixture)
+        spec.fixture(list, scope='galaxy').should_raise(ValueError(msg))
+
+@grouping
+class FixtureIsolationBehaviour:
+    ''' A group of specifications for Fixture copy behaviour '''
+
+    @verifiable
+    def should_hand_out_isolated_copies(self):
+        ''' each Spec should have a copy of the state, however cloned '''
+        for clone in ('deepcopy', 'pickle', list):
+            given = Fixture(CountingBuilder(), clone=clone)
+            spec = Spec(list, given=given)
+            spec.when(spec.append('shrubbery'))
+            spec.then(spec.it()).should_be(Length(3))
+            spec = Spec(list, given=given)
+            spec.it().should_be(['holy', 'grail'])
+
+    @verifiable
+    def should_still_check_types(self):
+        ''' the given= type check should still apply to fixtures '''
+        given = fixture(CountingBuilder())
+        spec = Spec(lambda: Spec(dict, given=given))
+        msg = "['holy', 'grail'] is not instance of <class 'dict'>"
+        spec.__call__().should_raise(TypeError(msg))
+
+@verifiable
+def fixture_time_saved_behaviour():
+    ''' time saved by the fixture cache should be added to the outcome '''
+    def slow_list():
+        ''' Build a list, slowly '''
+        return [n for n in range(100000)]
+    given = fixture(scope='run', clone=lambda state: state)(slow_list)
+    all_verifiable = AllVerifiable(listener=SilentListener())
+    all_verifiable.include(lambda: Spec(list, given=given))
+    all_verifiable.include(lambda: Spec(list, given=given))
+    outcome = all_verifiable.verify()
+    Spec(outcome).get('fixture_time_saved').should_be(GreaterThan(0))
+    Spec(given).time_saved().should_be(outcome['fixture_time_saved'])
+
+@verifiable
+def fixture_time_never_lost_behaviour():
+    ''' copying state more slowly than building it should save no time,
+    rather than a negative amount '''
+    def slow_copy(state):
+        ''' Copy the state, slowly '''
+        time.sleep(0.01)
+        return list(state)
+    given = fixture(scope='run', clone=slow_copy)(list)
+    all_verifiable = AllVerifiable(listener=SilentListener())
+    all_verifiable.include(lambda: Spec(list, given=given))
+    all_verifiable.include(lambda: Spec(list, given=given))
+    outcome = all_verifiable.verify()
+    Spec(outcome).get('fixture_time_saved').should_be(0.0)
+    Spec(given).time_saved().should_be(0.0)
+
+def unpicklable():
+    ''' Simple fn building state that can't be stored '''
+    return threading.Lock()
+
+@grouping
+class PersistentFixtureBehaviour:
+    ''' A group of specifications for PersistentFixture behaviour '''
+
+    def setup_grouping(self):
+        ''' A directory for the cache dirs '''
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_grouping(self):
+        ''' Remove the directory '''
+        shutil.rmtree(self.directory)
+
+    def cache_dir(self):
+        ''' A new, empty cache dir '''
+        return tempfile.mkdtemp(dir=self.directory)
+
+    def cache_with_input(self, contents):
+        ''' A new cache dir and an input file '''
+        cache_dir = self.cache_dir()
+        input_path = os.path.join(cache_dir, 'input.csv')
+        with open(input_path, 'w') as input_file:
+            input_file.write(contents)
+        return cache_dir, input_path
+
+    @verifiable
+    def should_build_once_across_runs(self):
+        ''' state should be loaded from disk rather than built again,
+        even by a new instance (as in a later run) '''
+        cache_dir, input_path = self.cache_with_input('spam,eggs')
+        builder = CountingBuilder()
+        for run in range(3):
+            given = PersistentFixture(builder, inputs=[input_path],
+                                      cache_dir=cache_dir)
+            Spec(list, given=given).it().should_be(['holy', 'grail'])
+        Spec(builder).then(lambda: builder.builds).should_be(1)
+
+    @verifiable
+    def should_rebuild_when_inputs_change(self):
+        ''' state should be built again when an input's contents change,
+        or different params are given '''
+        cache_dir, input_path = self.cache_with_input('spam,eggs')
+        builder = CountingBuilder()
+        given = persistent(inputs=[input_path], cache_dir=cache_dir)(builder)
+        key = given.key()
+        given()
+        with open(input_path, 'w') as input_file:
+            input_file.write('spam,spam,eggs')
+        Spec(given).key().should_not_be(key)
+        given()
+        given = persistent(builder, inputs=[input_path], params={'n': 2},
+                           cache_dir=cache_dir)
+        given()
+        Spec(builder).then(lambda: builder.builds).should_be(3)
+
+    @verifiable
+    def should_evict_least_recently_used(self):
+        ''' the cache dir should be kept within max_bytes, removing the
+        lock files of the states evicted '''
+        cache_dir = self.cache_dir()
+        for param in range(3):
+            given = PersistentFixture(lambda: b'x' * 1000,
+                                      params={'version': param},
+                                      cache_dir=cache_dir, max_bytes=2500,
+                                      format='mmap')
+            given()
+        names = os.listdir(cache_dir)
+        stored = [name for name in names if name.endswith('.mmap')]
+        Spec(stored).it().should_be(Length(2))
+        locks = [name for name in names if name.endswith('.lock')]
+        Spec(sorted(locks)).it().should_be(sorted(name + '.lock'
+                                                  for name in stored))
+
+    @verifiable
+    def should_not_evict_locked_states(self):
+        ''' a state locked by another process, e.g. while it is loaded,
+        should not be removed '''
+        if fcntl is None:
+            return
+        cache_dir = self.cache_dir()
+        fixtures = [PersistentFixture(lambda: b'x' * 1000,
+                                      params={'version': param},
+                                      cache_dir=cache_dir, max_bytes=1500,
+                                      format='mmap')
+                    for param in range(2)]
+        fixtures[0]()
+        os.utime(fixtures[0].path(), (0, 0))
+        descriptor = os.open(fixtures[0].path() + '.lock', os.O_RDONLY)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            fixtures[1]()
+        finally:
+            os.close(descriptor)
+        Spec(os.path).exists(fixtures[0].path()).should_be(True)
+
+    @verifiable
+    def should_remove_lock_files_of_unstored_states(self):
+        ''' the lock file (and metadata) of a state that failed to be
+        stored should be removed when the cache dir is next trimmed '''
+        cache_dir = self.cache_dir()
+        Spec(PersistentFixture(unpicklable, cache_dir=cache_dir)) \
+            .__call__().should_raise(TypeError)
+        given = PersistentFixture(lambda: b'x', cache_dir=cache_dir)
+        given()
+        name = os.path.basename(given.path())
+        Spec(sorted(os.listdir(cache_dir))).it().should_be(
+            [name, name + '.lock', name + '.meta'])
+
+    @verifiable
+    def should_not_leave_temporary_files(self):
+        ''' state that can't be stored should be unmet, without a temporary
+        file left behind '''
+        cache_dir = self.cache_dir()
+        given = PersistentFixture(unpicklable, cache_dir=cache_dir)
+        Spec(given).__call__().should_raise(TypeError)
+        names = os.listdir(cache_dir)
+        Spec([name for name in names if name.endswith('.tmp')]) \
+            .it().should_be([])
+
+    @verifiable
+    def should_load_mmap_format(self):
+        ''' the mmap format should load bytes as a read-only mmap '''
+        cache_dir = self.cache_dir()
+        given = PersistentFixture(lambda: b'ni' * 10, cache_dir=cache_dir,
+                                  format='mmap')
+        given()
+        spec = Spec(given)
+        spec.__call__().should_be(Type(mmap.mmap))
+        spec.__call__().should_be(Length(20))
+        Spec(lambda: given()[:4]).__call__().should_be(b'nini')
+
+if __name__ == '__main__':
+    verify()
@@ -0,0 +1,119 @@
+''' Specs for keeping a history of verification runs '''
+
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.comparators import Length
+from lancelot.history import HistoryListener, main, regressions
+from lancelot.verification import AllVerifiable, qualified_name
+from lancelot.specs.simple_fns import number_one, raise_index_error
+from lancelot.specs.verification_spec import SilentListener
+
+WORKLOAD = {'seconds': 0.0, 'bytes': 0}
+
+def variable_workload():
+    ''' Simple fn that takes as long, and as much memory, as WORKLOAD '''
+    time.sleep(WORKLOAD['seconds'])
+    held = bytearray(WORKLOAD['bytes'])
+    return len(held)
+
+def record_runs(path, count, seconds=0.0, size=0, **kwds):
+    ''' Descriptive fn: record count runs of variable_workload() in the
+    history at path, with the given workload (and HistoryListener kwds) '''
+    WORKLOAD.update(seconds=seconds, bytes=size)
+    for _ in range(count):
+        listener = HistoryListener(path, **kwds)
+        all_verifiable = AllVerifiable([SilentListener(), listener])
+        all_verifiable.include(variable_workload).verify()
+
+@grouping
+class HistoryBehaviour:
+    ''' A group of specifications for HistoryListener and regressions() '''
+
+    def setup_grouping(self):
+        ''' A directory for the history databases '''
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_grouping(self):
+        ''' Remove the directory '''
+        shutil.rmtree(self.directory)
+
+    def database(self, name):
+        ''' The path of a history database in the directory '''
+        return os.path.join(self.directory, name + '.sqlite')
+
+    @verifiable
+    def should_record_each_run(self):
+        ''' each run and the outcome of each fn should be recorded '''
+        path = self.database('runs')
+        for _ in range(2):
+            all_verifiable = AllVerifiable(
+                [SilentListener(), HistoryListener(path, label='abc123')])
+            all_verifiable.include(number_one).include(raise_index_error)
+            all_verifiable.verify()
+        connection = sqlite3.connect(path)
+        runs = connection.execute('SELECT label, total, verified '
+                                  'FROM runs').fetchall()
+        results = connection.execute('SELECT name, status FROM results '
+                                     'WHERE run_id = 2').fetchall()
+        connection.close()
+        Spec(runs).it().should_be([('abc123', 2, 1), ('abc123', 2, 1)])
+        Spec(results).it().should_be(
+            [('lancelot.specs.simple_fns.number_one', 'met'),
+             ('lancelot.specs.simple_fns.raise_index_error', 'unexpected')])
+
+    @verifiable
+    def should_flag_slower_fns(self):
+        ''' a fn whose recent median duration has regressed should be
+        flagged, but not one whose duration has merely varied '''
+        path = self.database('duration')
+        record_runs(path, 4, seconds=0.001, memory=False)
+        spec = Spec(regressions)
+        spec.regressions(path, recent=2, baseline=4).should_be([])
+        record_runs(path, 2, seconds=0.05, memory=False)
+        spec.regressions(path, recent=2, baseline=4).should_be(Length(1))
+        regression = regressions(path, recent=2, baseline=4)[0]
+        spec = Spec(lambda: regression[:2])
+        spec.__call__().should_be((qualified_name(variable_workload),
+                                   'duration'))
+
+    @verifiable
+    def should_flag_hungrier_fns(self):
+        ''' a fn whose recent median peak memory has regressed should be
+        flagged '''
+        path = self.database('memory')
+        record_runs(path, 3, size=1024)
+        record_runs(path, 2, size=1 << 20)
+        spec = Spec(regressions)
+        spec.regressions(path, recent=2, baseline=3,
+                         metrics=['peak_memory']).should_be(Length(1))
+
+    @verifiable
+    def should_need_enough_history(self):
+        ''' a fn with no baseline runs yet shouldn't be flagged '''
+        path = self.database('new')
+        record_runs(path, 2, seconds=0.05, memory=False)
+        spec = Spec(regressions)
+        spec.regressions(path, recent=2, baseline=4).should_be([])
+
+    @verifiable
+    def should_report_from_command_line(self):
+        ''' the report command should exit with 1 for regressions '''
+        path = self.database('cli')
+        record_runs(path, 2, seconds=0.001, memory=False)
+        record_runs(path, 1, seconds=0.05, memory=False)
+        output = io.StringIO()
+        spec = Spec(main)
+        spec.main(['report', '--db', path, '--recent', '1',
+                   '--metric', 'duration'], output).should_be(1)
+        spec.main(['report', '--db', path, '--threshold', '1000'],
+                  output).should_be(0)
+        Spec(output.getvalue()).it().should_contain('regressed from')
+
+if __name__ == '__main__':
+    verify()
@@ -0,0 +1,183 @@
+''' Specs for hunting memory leaks by verifying functions repeatedly '''
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.comparators import Type
+from lancelot.fixtures import fixture
+from lancelot.leaks import LeakDetection, MemoryLeak
+from lancelot.verification import AllVerifiable, running
+from lancelot.specs.simple_fns import number_one, raise_index_error
+
+LEAKED = []
+CALLS = {'leaky': 0, 'tidy': 0}
+
+def leaky():
+    ''' Simple fn that keeps hold of some memory each time it's called '''
+    CALLS['leaky'] += 1
+    LEAKED.append(bytearray(4096))
+
+def tidy():
+    ''' Simple fn that allocates memory but keeps none of it '''
+    CALLS['tidy'] += 1
+    return len(bytearray(4096))
+
+@fixture(scope='run')
+def buffers():
+    ''' Simple state, built once per verification run '''
+    return [bytearray(4096) for _ in range(4)]
+
+def use_buffers():
+    ''' Simple fn given state built once per run '''
+    Spec(list, given=buffers).__len__().should_be(4)
+
+def count_call():
+    ''' Simple fn adding a statistic to its run '''
+    running()[0].add_statistic('calls', 1)
+
+class Counted:
+    ''' Grouping counting its setups, teardowns and method calls '''
+    counts = {}
+    def setup_grouping(self):
+        ''' Count the setup '''
+        self.counts['setup'] = self.counts.get('setup', 0) + 1
+    def teardown_grouping(self):
+        ''' Count the teardown, raising an exception if asked to '''
+        self.counts['teardown'] = self.counts.get('teardown', 0) + 1
+        if self.counts.get('raise'):
+            raise IndexError('teardown failed')
+    def method(self):
+        ''' Count the call '''
+        self.counts['method'] = self.counts.get('method', 0) + 1
+
+class OutcomeListener:
+    ''' AllVerifiable Listener that records the outcome of each fn '''
+    def __init__(self):
+        ''' No outcomes recorded at instantiation '''
+        self.outcomes = {}
+    def specification_met(self, verifiable_fn):
+        ''' Record a met specification '''
+        self.outcomes[verifiable_fn.__name__] = 'met'
+    def specification_unmet(self, verifiable_fn, unmet):
+        ''' Record the unmet specification '''
+        self.outcomes[verifiable_fn.__name__] = unmet
+    def unexpected_exception(self, verifiable_fn, exception):
+        ''' Record the unexpected exception '''
+        self.outcomes[verifiable_fn.__name__] = 'unexpected'
+    def __getattr__(self, name):
+        ''' Ignore other messages '''
+        return lambda *args: None
+
+def hunt(*fns, **kwds):
+    ''' Descriptive fn: verify fns with LeakDetection(**kwds), returning
+    the outcome of each '''
+    listener = OutcomeListener()
+    all_verifiable = AllVerifiable(listener=listener)
+    if Counted.method in fns:
+        grouping(Counted, all_verifiable)
+    for fn in fns:
+        all_verifiable.include(fn)
+    all_verifiable.verify(executor=LeakDetection(**kwds))
+    return listener.outcomes
+
+@grouping
+class LeakDetectionBehaviour:
+    ''' A group of specifications for LeakDetection '''
+
+    def teardown_grouping(self):
+        ''' Forget anything leaked '''
+        del LEAKED[:]
+
+    @verifiable
+    def should_report_leaks(self):
+        ''' a fn retaining memory each call should be unmet by a
+        MemoryLeak, but a fn that tidies up after itself should be met '''
+        outcomes = hunt(leaky, tidy)
+        Spec(outcomes['leaky']).it().should_be(Type(MemoryLeak))
+        Spec(outcomes['tidy']).it().should_be('met')
+        Spec(len(outcomes['leaky'].retained)).it().should_be(10)
+
+    @verifiable
+    def should_say_where_leaks_are_allocated(self):
+        ''' the unmet message should show the growth and the traceback of
+        the allocation retained '''
+        message = str(hunt(leaky)['leaky'])
+        spec = Spec(message)
+        spec.it().should_contain('should not leak memory')
+        spec.it().should_contain('growth after each call: +4.')
+        spec.it().should_contain('LEAKED.append(bytearray(4096))')
+        spec.it().should_contain(__file__)
+
+    @verifiable
+    def should_not_mistake_fixtures_for_leaks(self):
+        ''' state built once per run should not be a leak, even though it
+        is only built by the first call '''
+        outcomes = hunt(use_buffers)
+        Spec(outcomes).it().should_be({'use_buffers': 'met'})
+
+    @verifiable
+    def should_collect_statistics_of_every_call(self):
+        ''' the statistics collected by each call should be added up '''
+        all_verifiable = AllVerifiable(listener=OutcomeListener())
+        all_verifiable.include(count_call)
+        outcome = all_verifiable.verify(
+            executor=LeakDetection(iterations=5, warmup=1))
+        Spec(outcome).get('calls').should_be(6)
+
+    @verifiable
+    def should_report_exceptions(self):
+        ''' exceptions raised by a fn should be reported as usual '''
+        outcomes = hunt(raise_index_error, number_one)
+        Spec(outcomes).it().should_be({'raise_index_error': 'unexpected',
+                                       'number_one': 'met'})
+
+    @verifiable
+    def should_repeat_selected_fns(self):
+        ''' only fns chosen by select should be called repeatedly '''
+        before = dict(CALLS)
+        outcomes = hunt(leaky, tidy, iterations=5, warmup=1,
+                        select=lambda fn: fn is tidy)
+        Spec(outcomes).it().should_be({'leaky': 'met', 'tidy': 'met'})
+        calls = dict((name, CALLS[name] - before[name]) for name in CALLS)
+        Spec(calls).it().should_be({'leaky': 1, 'tidy': 6})
+
+    @verifiable
+    def should_need_object_growth(self):
+        ''' more objects retained after every call should be a leak only if
+        there are at least min_objects more in all '''
+        retained = [1000, 1000, 1000, 1000]
+        spec = Spec(LeakDetection())
+        spec._is_leaking(retained, [100, 101, 102, 103]).should_be(False)
+        spec._is_leaking(retained, [100, 104, 108, 112]).should_be(True)
+        spec = Spec(LeakDetection(min_objects=3))
+        spec._is_leaking(retained, [100, 101, 102, 103]).should_be(True)
+        spec._is_leaking(retained, [100, 101, 101, 103]).should_be(False)
+
+    @verifiable
+    def should_set_up_groupings_once(self):
+        ''' a grouping's method should be called repeatedly within a single
+        setup and teardown of the grouping '''
+        Counted.counts.clear()
+        outcomes = hunt(Counted.method, iterations=5, warmup=1)
+        Spec(outcomes).it().should_be({'method': 'met'})
+        Spec(Counted.counts).it().should_be(
+            {'setup': 1, 'method': 6, 'teardown': 1})
+
+    @verifiable
+    def should_report_teardown_exceptions(self):
+        ''' an exception raised tearing down a grouping should be reported
+        for its method '''
+        Counted.counts.clear()
+        Counted.counts['raise'] = True
+        outcomes = hunt(Counted.method, iterations=2, warmup=0)
+        Spec(outcomes).it().should_be({'method': 'unexpected'})
+        Spec(Counted.counts['teardown']).it().should_be(1)
+
+    @verifiable
+    def should_need_iterations(self):
+        ''' growth can't be watched with fewer than 2 iterations '''
+        spec = Spec(lambda: LeakDetection(iterations=1))
+        spec.__call__().should_raise(ValueError)
+        spec = Spec(lambda: LeakDetection(iterations=2))
+        spec.__call__().should_be(Type(LeakDetection))
+
+if __name__ == '__main__':
+    verify()
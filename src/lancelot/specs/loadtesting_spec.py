@@ -0,0 +1,161 @@
+''' Specs for driving actions concurrently, to measure the load sustained '''
+
+import itertools
+import os
+import threading
+import time
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.benchmarking import ms, p99, s
+from lancelot.comparators import FloatValue, GreaterThan, Type
+from lancelot.constraints import Sustain
+from lancelot.execution import WorkerCrashed
+from lancelot.loadtesting import LoadResult, drive, ops_per_sec
+from lancelot.verification import UnmetSpecification
+from lancelot.specs.simple_fns import number_one, raise_index_error
+
+class SharedCache:
+    ''' Simple cache shared by threads, whose lookups take some time '''
+    def __init__(self, contended):
+        ''' If contended, lookups are serialised by a lock '''
+        self.entries = {'key': 'value'}
+        self.lock = threading.Lock() if contended else None
+    def get(self, key):
+        ''' The entry for key, after 2ms (holding the lock, if any) '''
+        if self.lock is None:
+            time.sleep(0.002)
+            return self.entries[key]
+        with self.lock:
+            time.sleep(0.002)
+            return self.entries[key]
+
+class Interrupted(BaseException):
+    ''' Simple exception that isn't a failure of the action '''
+    pass
+
+def interrupt():
+    ''' Simple fn raising more than an Exception '''
+    raise Interrupted()
+
+def exit_abruptly():
+    ''' Simple fn killing the process calling it '''
+    os._exit(3)
+
+@grouping
+class LoadBehaviour:
+    ''' A group of specifications for driving load with drive() '''
+
+    @verifiable
+    def should_share_operations(self):
+        ''' operations should be shared between the workers, every call
+        being measured '''
+        result = drive(number_one, workers=3, operations=10, each=1)
+        Spec(result).it().should_be(Type(LoadResult))
+        spec = Spec(lambda: (result.operations, result.workers,
+                             result.failures, len(result.samples)))
+        spec.__call__().should_be((10, 3, 0, 10))
+        Spec(result.ops_per_sec).it().should_be(GreaterThan(0))
+
+    @verifiable
+    def should_drive_for_duration(self):
+        ''' with a duration, workers should call repeatedly until it has
+        passed '''
+        result = drive(number_one, workers=2, duration=0.05)
+        Spec(result.elapsed).it().should_be(GreaterThan(0.05))
+        Spec(result.operations).it().should_be(GreaterThan(2))
+
+    @verifiable
+    def should_count_failures(self):
+        ''' calls whose results differ from each, or that raise exceptions,
+        should be counted as failures, and the first described '''
+        counter = itertools.count()
+        result = drive(lambda: next(counter), workers=1, operations=5,
+                       each=0)
+        Spec(result.failures).it().should_be(4)
+        Spec(result.first_failure).it().should_be('should be == 0, not 1')
+        result = drive(raise_index_error, workers=2, operations=4)
+        Spec(result.failures).it().should_be(4)
+        Spec(result.first_failure).it().should_contain('IndexError')
+
+    @verifiable
+    def should_drive_processes(self):
+        ''' workers can be processes, for actions contended by the GIL '''
+        result = drive(number_one, workers=2, operations=6, processes=True,
+                       each=1)
+        spec = Spec(lambda: (result.operations, result.failures))
+        spec.__call__().should_be((6, 0))
+
+    @verifiable
+    def should_raise_worker_interruptions(self):
+        ''' anything but an Exception raised in a worker thread should be
+        raised again, rather than counted '''
+        spec = Spec(drive)
+        spec.drive(interrupt, workers=2, operations=4).should_raise(
+            Interrupted)
+
+    @verifiable
+    def should_trap_dead_processes(self):
+        ''' a worker process dying without its outcome should be trapped,
+        rather than waited for '''
+        spec = Spec(drive)
+        spec.drive(exit_abruptly, workers=2, operations=4,
+                   processes=True).should_raise(WorkerCrashed)
+
+    @verifiable
+    def should_count_histogram(self):
+        ''' the histogram should count every call's latency once, in
+        buckets doubling in size '''
+        result = LoadResult([0.5e-6, 1.5e-6, 3e-6, 3.5e-6, 1e-3], 1.0, 1)
+        Spec(result.histogram()).it().should_be(
+            [(FloatValue(1e-6), 1), (FloatValue(2e-6), 1),
+             (FloatValue(4e-6), 2), (FloatValue(1024e-6), 1)])
+        Spec(result.ops_per_sec).it().should_be(FloatValue(5.0))
+
+    @verifiable
+    def should_need_duration_or_operations(self):
+        ''' exactly one of duration and operations should be specified '''
+        spec = Spec(drive)
+        spec.drive(number_one).should_raise(ValueError)
+        spec.drive(number_one, duration=1, operations=1).should_raise(
+            ValueError)
+
+@grouping
+class SustainBehaviour:
+    ''' A group of specifications for should_sustain() '''
+
+    @verifiable
+    def should_sustain_load(self):
+        ''' load without failures, meeting its comparators, should be
+        sustained '''
+        spec = Spec(SharedCache(contended=False))
+        spec.under_load(spec.get('key'), workers=4, operations=40,
+                        each='value')
+        spec.should_sustain(ops_per_sec > 100, p99 < 1 * s)
+
+    @verifiable
+    def should_not_sustain_failures(self):
+        ''' any failed call should be unmet, even if the statistics are met
+        '''
+        result = LoadResult([0.001] * 4, 1.0, 2, 1, 'should be 1, not 2')
+        spec = Spec(Sustain(p99 < 1 * s))
+        spec.verify(lambda: result).should_raise(UnmetSpecification)
+        spec = Spec(Sustain(p99 < 2 * ms))
+        spec.verify(lambda: LoadResult([0.001] * 4, 1.0, 2)).should_be(None)
+        spec.describe_constraint().should_be(
+            'should sustain load with p99 < 0.002')
+
+    @verifiable
+    def should_catch_contention(self):
+        ''' a lock serialising lookups should limit the throughput of a
+        cache shared by many workers '''
+        def sustain(contended):
+            ''' Specify the throughput of a (contended) cache '''
+            spec = Spec(SharedCache(contended))
+            spec.under_load(spec.get('key'), workers=4, duration=0.1,
+                            each='value')
+            spec.should_sustain(ops_per_sec > 1000)
+        Spec(sustain).sustain(True).should_raise(UnmetSpecification)
+        Spec(sustain).sustain(False).should_be(None)
+
+if __name__ == '__main__':
+    verify()
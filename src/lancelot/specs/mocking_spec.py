@@ -1,7 +1,11 @@
 ''' Specs for core library classes / behaviours ''' 
 
-from lancelot import MockSpec, Spec, grouping, verifiable, verify
-from lancelot.calling import MockCall, MockResult
+import asyncio
+import concurrent.futures
+
+from lancelot import MockSpec, Spec, SpySpec, grouping, verifiable, verify
+from lancelot.calling import MockCall, MockResult, SpyCall
+from lancelot.clocks import REAL_TIME, VirtualClock
 from lancelot.comparators import ExceptionValue, FloatValue, Type, \
                                  EqualsEquals, Nothing
 from lancelot.verification import UnmetSpecification
@@ -404,5 +408,224 @@ class MockResultBehaviour:
         spec.then(spec.next()).should_raise(exceptions[1])
         spec.then(spec.next()).should_raise(UnmetSpecification)
 
+class Repository:
+    ''' Simple class for collaborating with: a real object to spy on '''
+    def __init__(self):
+        ''' Some rows, keyed by id '''
+        self.rows = {1: 'spam', 2: 'eggs', 3: 'ham'}
+    def fetch(self, row_id):
+        ''' One row '''
+        return self.rows[row_id]
+    def fetch_all(self, row_ids):
+        ''' Many rows, at once '''
+        return [self.rows[row_id] for row_id in row_ids]
+    def name(self):
+        ''' The name of the repository '''
+        return 'rows'
+
+def one_by_one(repository, row_ids):
+    ''' Simple fn accessing a repository N+1 style '''
+    return [repository.fetch(row_id) for row_id in row_ids]
+
+@grouping
+class SpySpecBehaviour:
+    ''' A group of specifications for SpySpec and SpyCall '''
+
+    @verifiable
+    def should_forward_calls(self):
+        ''' a spy should forward calls and attributes to its target '''
+        spy = SpySpec(Repository())
+        spec = Spec(spy)
+        spec.fetch(2).should_be('eggs')
+        spec.fetch(4).should_raise(KeyError)
+        spec.fetch_all([1, 3]).should_be(['spam', 'ham'])
+        Spec(len(spy.rows)).it().should_be(3)
+        Spec(spy.fetch).it().should_be(Type(SpyCall))
+        Spec(spy.fetch).it().should_have(calls=2, items=2, max_items=1)
+
+    @verifiable
+    def should_count_calls_over_a_sequence(self):
+        ''' should_be_called() should check the calls recorded so far,
+        e.g. to trap N+1 access patterns '''
+        spy = SpySpec(Repository(), name='repo')
+        spec = Spec(one_by_one)
+        spec.when(spec.one_by_one(spy, [1, 2]), spec.one_by_one(spy, [3]))
+        spec = Spec(spy.fetch)
+        spec.should_be_called(times=3).should_be(spy.fetch)
+        spec.should_be_called(at_least=2, at_most=3).should_be(spy.fetch)
+        spec.should_be_called(at_most=1).should_raise(UnmetSpecification)
+        spec.description().should_be('repo.fetch()')
+        Spec(spy.fetch_all).should_be_called(times=0).should_be(spy.fetch_all)
+        spec.should_be_called().should_raise(ValueError)
+
+    @verifiable
+    def should_not_hide_methods(self):
+        ''' any method of the target, even name(), should be spied on '''
+        spy = SpySpec(Repository(), name='repo')
+        Spec(spy).name().should_be('rows')
+        Spec(spy.name).it().should_have(calls=1)
+        Spec(spy.name.description()).it().should_be('repo.name()')
+
+    @verifiable
+    def should_reset_calls(self):
+        ''' a reset SpyCall should have no calls recorded '''
+        spy = SpySpec(Repository())
+        spy.fetch(1)
+        spy.fetch.reset()
+        Spec(spy.fetch).it().should_have(calls=0, duration=0.0)
+        Spec(repr(spy)).it().should_be('<spy on Repository: fetch 0 calls>')
+
+def collaborate_concurrently(mock_spec, calls, threads=8):
+    ''' Descriptive fn: make calls, [(name, args)], to a collaborating
+    mock_spec from several threads, returning their results (or the
+    UnmetSpecifications raised) in order '''
+    def call(name_args):
+        ''' Make a call, returning its result '''
+        name, args = name_args
+        try:
+            return getattr(mock_spec, name)(*args)
+        except UnmetSpecification as unmet:
+            return unmet
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(call, calls))
+
+@grouping
+class ConcurrentCollaborationBehaviour:
+    ''' A group of specifications for collaborating from several threads '''
+
+    @verifiable
+    def should_count_calls_from_any_thread(self):
+        ''' every collaboration should be supplied exactly once, however
+        many threads collaborate at once '''
+        mock_spec = MockSpec(ordered=False)
+        mock_spec.foo().times(200).will_return(*range(200))
+        mock_spec.bar(1).times(100).will_return('bar')
+        mock_spec.start_collaborating()
+        results = collaborate_concurrently(
+            mock_spec, [('foo', ())] * 200 + [('bar', (1,))] * 100)
+        Spec(sorted(results[:200])).it().should_be(list(range(200)))
+        Spec(results[200:]).it().should_be(['bar'] * 100)
+        Spec(mock_spec).verify().should_not_raise(UnmetSpecification)
+        Spec(mock_spec).foo().should_raise(UnmetSpecification)
+
+    @verifiable
+    def should_trap_too_many_calls(self):
+        ''' collaborations beyond those specified should be unmet '''
+        mock_spec = MockSpec(ordered=False)
+        mock_spec.foo().times(10)
+        mock_spec.start_collaborating()
+        results = collaborate_concurrently(mock_spec, [('foo', ())] * 12)
+        unmet = [result for result in results if result is not None]
+        Spec(len(unmet)).it().should_be(2)
+        Spec(unmet[0]).it().should_be(Type(UnmetSpecification))
+
+    @verifiable
+    def should_match_unordered_collaborations(self):
+        ''' an unordered collaboration should match the first specified
+        collaboration that it meets '''
+        mock_spec = MockSpec(name='m', ordered=False)
+        mock_spec.foo(1).will_return('one')
+        mock_spec.foo(2).will_return('two')
+        mock_spec.start_collaborating()
+        spec = Spec(mock_spec)
+        spec.foo(2).should_be('two')
+        msg = 'should be collaborating with m.foo(1), not m.foo(3)'
+        spec.foo(3).should_raise(UnmetSpecification(msg))
+        spec.foo(1).should_be('one')
+
+    @verifiable
+    def should_limit_calls_in_flight(self):
+        ''' a collaboration in progress in more threads at once than
+        specified should be unmet '''
+        mock_spec = MockSpec(name='pool', ordered=False, clock=REAL_TIME)
+        connect = mock_spec.connect().times(8).will_take(0.05)
+        connect.concurrently(at_most=2)
+        mock_spec.start_collaborating()
+        results = collaborate_concurrently(mock_spec, [('connect', ())] * 8)
+        unmet = [str(result) for result in results if result is not None]
+        msg = 'should be collaborating with pool.connect() at most 2 ' \
+              'at once, not 3'
+        Spec(unmet).it().should_contain(msg)
+        Spec(mock_spec).verify().should_raise(UnmetSpecification(msg))
+
+        mock_spec = MockSpec(ordered=False, clock=REAL_TIME)
+        connect = mock_spec.connect().times(8).will_take(0.05)
+        connect.concurrently(at_most=8)
+        mock_spec.start_collaborating()
+        collaborate_concurrently(mock_spec, [('connect', ())] * 8)
+        Spec(mock_spec).verify().should_not_raise(UnmetSpecification)
+        Spec(connect.max_in_flight > 2).it().should_be(True)
+
+async def fan_out(service, count):
+    ''' Simple coroutine fetching from a service count times at once '''
+    return await asyncio.gather(*[service.fetch() for _ in range(count)])
+
+async def one_at_a_time(service, count):
+    ''' Simple coroutine fetching from a service count times, serially '''
+    fetches = [service.fetch() for _ in range(count)]
+    return [await fetch for fetch in fetches]
+
+def fetching(clock, at_least=None, seconds=1.0):
+    ''' Descriptive fn: an asynchronous MockSpec expecting 3 fetches, each
+    taking seconds (if any), of which at_least should be in progress at
+    once '''
+    service = MockSpec(name='service', clock=clock, asynchronous=True)
+    fetch = service.fetch().times(3).will_return('a', 'b', 'c')
+    if seconds:
+        fetch.will_take(seconds)
+    fetch.concurrently(at_least=at_least)
+    service.start_collaborating()
+    return service
+
+@grouping
+class AsyncCollaborationBehaviour:
+    ''' A group of specifications for asynchronous MockSpecs '''
+
+    @verifiable
+    def should_be_awaitable(self):
+        ''' collaborations should be awaited for their results, taking the
+        time specified in the event loop, without waiting in real time '''
+        clock = VirtualClock()
+        service = fetching(clock)
+        spec = Spec(clock)
+        spec.run(one_at_a_time(service, 3)).should_be(['a', 'b', 'c'])
+        Spec(clock.monotonic()).it().should_be(3.0)
+        Spec(service).verify().should_not_raise(UnmetSpecification)
+
+    @verifiable
+    def should_raise_when_awaited(self):
+        ''' collaborations that will_raise() should raise when awaited '''
+        service = MockSpec(asynchronous=True)
+        service.fetch().will_raise(KeyError)
+        service.start_collaborating()
+        Spec(VirtualClock()).run(service.fetch()).should_raise(KeyError)
+
+    @verifiable
+    def should_check_calls_overlapped(self):
+        ''' collaborations specified concurrently(at_least=...) should be
+        unmet unless they were in progress at once '''
+        clock = VirtualClock()
+        service = fetching(clock, at_least=3)
+        spec = Spec(clock)
+        spec.run(fan_out(service, 3)).should_be(['a', 'b', 'c'])
+        Spec(clock.monotonic()).it().should_be(1.0)
+        Spec(service).verify().should_not_raise(UnmetSpecification)
+
+        service = fetching(clock, at_least=3)
+        spec.run(one_at_a_time(service, 3)).should_be(['a', 'b', 'c'])
+        msg = 'should be collaborating with service.fetch() at least 3 ' \
+              'at once, not 1'
+        Spec(service).verify().should_raise(UnmetSpecification(msg))
+
+    @verifiable
+    def should_overlap_instant_calls(self):
+        ''' collaborations taking no time should still be in progress at
+        once when gathered '''
+        clock = VirtualClock()
+        service = fetching(clock, at_least=3, seconds=None)
+        spec = Spec(clock)
+        spec.run(fan_out(service, 3)).should_be(['a', 'b', 'c'])
+        Spec(service).verify().should_not_raise(UnmetSpecification)
+
 if __name__ == '__main__':
     verify()
\ No newline at end of file
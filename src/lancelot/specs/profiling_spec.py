@@ -0,0 +1,126 @@
+''' Specs for profiling verifiable functions '''
+
+import os
+import pstats
+import shutil
+import tempfile
+import time
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.comparators import GreaterThan, Type
+from lancelot.profiling import Profiling
+from lancelot.verification import AllVerifiable, UnmetSpecification
+from lancelot.specs.leaks_spec import OutcomeListener
+
+def slow_helper():
+    ''' Simple fn under test that takes a while '''
+    time.sleep(0.05)
+    return sum(range(1000))
+
+def slow():
+    ''' Simple verifiable fn calling the slow helper '''
+    Spec(slow_helper).slow_helper().should_be(499500)
+
+def unmet():
+    ''' Simple verifiable fn whose specification isn't met '''
+    Spec(slow_helper).slow_helper().should_be(0)
+
+def profile(directory, *fns, **kwds):
+    ''' Descriptive fn: verify fns with Profiling(directory, **kwds),
+    returning (the outcome of each, the executor) '''
+    listener = OutcomeListener()
+    all_verifiable = AllVerifiable(listener=listener)
+    for fn in fns:
+        all_verifiable.include(fn)
+    profiling = Profiling(directory, **kwds)
+    all_verifiable.verify(executor=profiling)
+    return listener.outcomes, profiling
+
+def functions_in(path):
+    ''' The names of the functions in a .pstats file '''
+    return set(name for filename, line, name in pstats.Stats(path).stats)
+
+def label(fn):
+    ''' The label of fn's frames in collapsed stacks '''
+    return '%s (profiling_spec.py:%d)' % (fn.__name__,
+                                          fn.__code__.co_firstlineno)
+
+@grouping
+class ProfilingBehaviour:
+    ''' A group of specifications for Profiling '''
+
+    def setup_grouping(self):
+        ''' A directory for the profiles '''
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_grouping(self):
+        ''' Remove the directory '''
+        shutil.rmtree(self.directory)
+
+    def check_profiles(self, mode):
+        ''' Profile slow() and unmet() in mode, checking the outcomes and
+        pstats written, and returning the collapsed stacks {stack: count} '''
+        directory = os.path.join(self.directory, mode)
+        outcomes, profiling = profile(directory, slow, unmet, mode=mode,
+                                      interval=0.002)
+        Spec(outcomes['slow']).it().should_be('met')
+        Spec(outcomes['unmet']).it().should_be(Type(UnmetSpecification))
+        Spec(list(profiling.pstats_paths)).it().should_be([slow, unmet])
+        for path in profiling.pstats_paths.values():
+            Spec(functions_in(path)).it().should_contain('slow_helper')
+        with open(profiling.collapsed_path) as collapsed:
+            lines = collapsed.read().splitlines()
+        stacks = dict((line.rsplit(' ', 1)[0], int(line.rsplit(' ', 1)[1]))
+                      for line in lines)
+        for name in ('verification.py', 'constraints.py', 'calling.py'):
+            Spec('\n'.join(stacks)).it().should_not_contain(name)
+        return stacks
+
+    @verifiable
+    def should_profile_deterministically(self):
+        ''' cProfile should profile each function, with the microseconds
+        spent apportioned along the stacks of code under test '''
+        stacks = self.check_profiles('deterministic')
+        stack = ';'.join([label(slow), label(slow_helper),
+                          '<built-in method time.sleep>'])
+        Spec(stacks[stack]).it().should_be(GreaterThan(40000))
+
+    @verifiable
+    def should_profile_by_sampling(self):
+        ''' sampling should find the function spending the time '''
+        stacks = self.check_profiles('sampling')
+        stack = ';'.join([label(slow), label(slow_helper)])
+        Spec(stacks[stack]).it().should_be(GreaterThan(5))
+
+    @verifiable
+    def should_profile_selected_fns(self):
+        ''' only fns chosen by select should be profiled '''
+        outcomes, profiling = profile(os.path.join(self.directory, 'select'),
+                                      slow, unmet,
+                                      select=lambda fn: fn is slow)
+        Spec(outcomes['unmet']).it().should_be(Type(UnmetSpecification))
+        Spec(list(profiling.pstats_paths)).it().should_be([slow])
+
+    @verifiable
+    def should_not_overwrite_profiles(self):
+        ''' fns with the same name, e.g. lambdas, should each have their own
+        pstats file, named after their module '''
+        directory = os.path.join(self.directory, 'same_name')
+        outcomes, profiling = profile(directory, lambda: slow_helper(),
+                                      lambda: slow_helper())
+        paths = list(profiling.pstats_paths.values())
+        Spec(len(set(paths))).it().should_be(2)
+        Spec(sorted(os.listdir(directory))).it().should_be(
+            sorted([os.path.basename(path) for path in paths]
+                   + ['profile.collapsed']))
+        for path in paths:
+            Spec(os.path.basename(path)).it().should_contain(__name__)
+
+    @verifiable
+    def should_check_mode(self):
+        ''' an unknown mode should be trapped '''
+        spec = Spec(lambda: Profiling(self.directory, mode='guessing'))
+        spec.__call__().should_raise(ValueError)
+
+if __name__ == '__main__':
+    verify()
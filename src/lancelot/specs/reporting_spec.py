@@ -0,0 +1,215 @@
+''' Specs for machine-readable reporting listeners '''
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree
+
+from lancelot import Spec, grouping, verifiable, verify
+from lancelot.comparators import GreaterThan, Length
+from lancelot.execution import ThreadedExecution
+from lancelot.reporting import JUnitXmlListener, NdjsonListener, \
+                               QueuedListener
+from lancelot.verification import AllVerifiable, UnmetSpecification
+from lancelot.specs.simple_fns import number_one, raise_index_error
+
+def unmet_specification():
+    ''' Simple fn that raises UnmetSpecification. '''
+    raise UnmetSpecification('should be spam')
+
+def unmet_in_colour():
+    ''' Simple fn that raises UnmetSpecification, with coloured output '''
+    raise UnmetSpecification('should be \x1b[31mspam\x1b[0m')
+
+def sleep_briefly():
+    ''' Simple fn that takes a little while '''
+    time.sleep(0.1)
+
+def verified_with(listener):
+    ''' Descriptive fn: verify a few simple fns, reporting to listener '''
+    all_verifiable = AllVerifiable(listener=listener)
+    all_verifiable.include(number_one)
+    all_verifiable.include(raise_index_error)
+    all_verifiable.include(unmet_specification)
+    all_verifiable.verify()
+
+@grouping
+class NdjsonListenerBehaviour:
+    ''' A group of specifications for NdjsonListener behaviour '''
+
+    @verifiable
+    def should_write_one_line_per_verifiable(self):
+        ''' a line per verifiable fn, between start and end lines '''
+        stream = io.StringIO()
+        verified_with(NdjsonListener(stream))
+        lines = stream.getvalue().splitlines()
+        Spec(lines).it().should_be(Length(5))
+        Spec(json.loads(lines[0])).get('event').should_be('start')
+        Spec(json.loads(lines[0])).get('total').should_be(3)
+        Spec(json.loads(lines[-1])).get('event').should_be('end')
+
+    @verifiable
+    def should_record_outcome_timing_and_traceback(self):
+        ''' records should include the outcome, duration and traceback '''
+        stream = io.StringIO()
+        verified_with(NdjsonListener(stream))
+        records = [json.loads(line)
+                   for line in stream.getvalue().splitlines()[1:-1]]
+        spec = Spec(records[0])
+        spec.get('name').should_be('lancelot.specs.simple_fns.number_one')
+        spec.get('outcome').should_be('met')
+        spec.__contains__('duration').should_be(True)
+        spec.__contains__('traceback').should_be(False)
+
+        spec = Spec(records[1])
+        spec.get('outcome').should_be('unexpected')
+        spec.get('exception').should_be('IndexError')
+        spec.get('traceback').should_be(Length(1))
+
+        spec = Spec(records[2])
+        spec.get('outcome').should_be('unmet')
+        spec.get('message').should_be('should be spam')
+
+    @verifiable
+    def should_use_executor_durations(self):
+        ''' durations measured by an executor (which reports each start
+        just before its outcome) should be recorded, even when delivered
+        later by a QueuedListener '''
+        for queued in (False, True):
+            stream = io.StringIO()
+            listener = NdjsonListener(stream)
+            if queued:
+                listener = QueuedListener(listener)
+            all_verifiable = AllVerifiable(listener=listener)
+            all_verifiable.include(sleep_briefly)
+            all_verifiable.verify(executor=ThreadedExecution(2))
+            record = json.loads(stream.getvalue().splitlines()[1])
+            Spec(record).get('duration').should_be(GreaterThan(0.05))
+
+    @verifiable
+    def should_buffer_until_flushed(self):
+        ''' records should only be flushed periodically '''
+        flushes = []
+        class FlushCountingStream(io.StringIO):
+            ''' Stream that counts the number of flush() calls '''
+            def flush(self):
+                ''' Count the flush '''
+                flushes.append(True)
+        spec = Spec(flushes)
+        verified_with(NdjsonListener(FlushCountingStream(),
+                                     flush_every=2, flush_interval=60))
+        spec.it().should_be(Length(2))
+
+    @verifiable
+    def should_open_path_for_each_run(self):
+        ''' a file path should be written afresh by each verification run
+        reported to the same listener '''
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'results.ndjson')
+            listener = NdjsonListener(path)
+            verified_with(listener)
+            verified_with(listener)
+            with open(path) as results:
+                Spec(results.read().splitlines()).it().should_be(Length(5))
+        finally:
+            shutil.rmtree(directory)
+
+@verifiable
+def junit_xml_listener_behaviour():
+    ''' JUnitXmlListener should write testcases with failures and errors '''
+    stream = io.StringIO()
+    verified_with(JUnitXmlListener(stream, suite_name='knights'))
+    spec = Spec(stream.getvalue())
+    spec.it().should_contain('<testsuite name="knights" tests="3"')
+    spec.it().should_contain('<testcase classname="lancelot.specs.simple_fns"'
+                             ' name="number_one"')
+    spec.it().should_contain('<error type="IndexError"')
+    spec.it().should_contain('<failure type="UnmetSpecification" '
+                             'message="should be spam">')
+    spec.it().should_contain('</testsuite>\n</testsuites>\n')
+
+@verifiable
+def junit_xml_characters_behaviour():
+    ''' characters XML does not allow, e.g. in coloured output, should be
+    replaced, so that the report can still be parsed '''
+    stream = io.StringIO()
+    all_verifiable = AllVerifiable(listener=JUnitXmlListener(stream))
+    all_verifiable.include(unmet_in_colour)
+    all_verifiable.verify()
+    report = xml.etree.ElementTree.fromstring(stream.getvalue())
+    failure = report.find('testsuite/testcase/failure')
+    Spec(failure.get('message')).it().should_be(
+        'should be \ufffd[31mspam\ufffd[0m')
+    Spec(failure.text).it().should_contain('unmet_in_colour')
+
+@grouping
+class QueuedListenerBehaviour:
+    ''' A group of specifications for QueuedListener behaviour '''
+
+    @verifiable
+    def should_deliver_from_background_thread(self):
+        ''' messages should be delivered in order, off the calling thread '''
+        threads = set()
+        class ThreadNotingListener(NdjsonListener):
+            ''' Listener that notes which threads deliver its records '''
+            def _write(self, record):
+                ''' Note the delivering thread before writing '''
+                threads.add(threading.current_thread())
+                super()._write(record)
+        stream = io.StringIO()
+        verified_with(QueuedListener(ThreadNotingListener(stream)))
+        Spec(stream.getvalue().splitlines()).it().should_be(Length(5))
+        spec = Spec(threads)
+        spec.__contains__(threading.current_thread()).should_be(False)
+        spec.it().should_be(Length(1))
+
+    @verifiable
+    def should_keep_tracebacks_intact(self):
+        ''' tracebacks should still be formatted when delivered later '''
+        stream = io.StringIO()
+        verified_with(QueuedListener(NdjsonListener(stream), maxsize=1))
+        record = json.loads(stream.getvalue().splitlines()[2])
+        spec = Spec(record)
+        spec.get('outcome').should_be('unexpected')
+        spec.get('traceback').should_be(Length(1))
+
+    @verifiable
+    def should_reraise_listener_errors_when_ending(self):
+        ''' errors raised by the listener should surface at the end '''
+        class BrokenListener(NdjsonListener):
+            ''' Listener that cannot write its records '''
+            def _write_record(self, verifiable_fn, outcome, duration, exc):
+                ''' Fail to write a record '''
+                raise IOError('stale NFS handle')
+        listener = QueuedListener(BrokenListener(io.StringIO()))
+        spec = Spec(verified_with)
+        spec.verified_with(listener).should_raise(IOError('stale NFS handle'))
+
+    @verifiable
+    def should_keep_delivering_after_interruptions(self):
+        ''' anything else raised by the listener should not end delivery
+        (and so block the verification once the queue is full), but also
+        surface at the end '''
+        class InterruptedListener(NdjsonListener):
+            ''' Listener interrupted while writing its first record '''
+            def _write_record(self, verifiable_fn, outcome, duration, exc):
+                ''' Be interrupted, once '''
+                if not self.interrupted:
+                    self.interrupted = True
+                    raise KeyboardInterrupt()
+                super()._write_record(verifiable_fn, outcome, duration, exc)
+        stream = io.StringIO()
+        interrupted = InterruptedListener(stream)
+        interrupted.interrupted = False
+        listener = QueuedListener(interrupted, maxsize=1)
+        spec = Spec(verified_with)
+        spec.verified_with(listener).should_raise(KeyboardInterrupt)
+        Spec(stream.getvalue().splitlines()).it().should_be(Length(4))
+
+if __name__ == '__main__':
+    verify()
@@ -1,7 +1,14 @@
 ''' Specs for core library classes / behaviours ''' 
 
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
 from lancelot import Spec, verifiable, verify
 from lancelot.calling import WrapFunction
+from lancelot.constraints import Source
 from lancelot.comparators import Type, Length
 from lancelot.verification import UnmetSpecification
 from lancelot.specs.simple_fns import dont_raise_index_error, number_one, \
@@ -110,5 +117,74 @@ def should_raise_optional_args():
     Spec(raise_index_error).raise_index_error().should_raise()
     Spec(dont_raise_index_error).dont_raise_index_error().should_not_raise()
     
+@verifiable
+def should_collect_at_most_behaviour():
+    ''' should_collect_at_most() and should_create_at_most() should pin an
+    action's garbage collections and objects created '''
+    spec = Spec(number_one)
+    spec.number_one().should_collect_at_most(gen2=0)
+    spec.number_one().should_create_at_most(objects=0)
+    spec = Spec(lambda: Spec(list).__call__().should_create_at_most(0))
+    spec.__call__().should_raise(UnmetSpecification)
+    spec = Spec(lambda: Spec(lambda: [[] for _ in range(10000)])
+                .__call__().should_collect_at_most(gen0=0))
+    spec.__call__().should_raise(UnmetSpecification)
+
+@verifiable
+def should_be_lazy_behaviour():
+    ''' should_be_lazy() should check that an action consumes its source
+    only as its own items are pulled '''
+    source = Source()
+    spec = Spec(lambda: map(str, source))
+    spec.__call__().should_be_lazy(source)
+    source = Source()
+    spec = Spec(lambda: Spec(lambda: list(source)).__call__()
+                .should_be_lazy(source, on_call=100))
+    spec.__call__().should_raise(UnmetSpecification)
+
+@verifiable
+def should_limit_io_behaviour():
+    ''' should_open_at_most() and the like should pin an action's I/O '''
+    spec = Spec(number_one)
+    spec.number_one().should_open_at_most(files=0)
+    spec.number_one().should_spawn_at_most(processes=0)
+    spec.number_one().should_not_touch_network()
+    spec = Spec(lambda: Spec(lambda: open(__file__).close()).__call__()
+                .should_open_at_most(files=0))
+    spec.__call__().should_raise(UnmetSpecification)
+
+@verifiable
+def should_not_block_loop_behaviour():
+    ''' should_not_block_loop() should run the awaitable an action returns,
+    checking that it never blocks the event loop for too long '''
+    async def wait():
+        ''' A coroutine waiting without blocking '''
+        await asyncio.sleep(0.05)
+    async def block():
+        ''' A coroutine blocking its loop '''
+        time.sleep(0.05)
+    Spec(wait).__call__().should_not_block_loop(threshold=0.02)
+    spec = Spec(lambda: Spec(block).__call__().should_not_block_loop(0.02))
+    spec.__call__().should_raise(UnmetSpecification)
+
+@verifiable
+def import_lightly_behaviour():
+    ''' importing lancelot should not import the modules only needed by
+    asyncio, load testing, baselines or executors, which are slow to
+    import '''
+    program = '\n'.join(['import sys, lancelot',
+                          'print(" ".join(sorted(sys.modules)))'])
+    environment = dict(os.environ,
+                       PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    modules = subprocess.run([sys.executable, '-c', program],
+                             env=environment, stdout=subprocess.PIPE,
+                             universal_newlines=True).stdout.split()
+    Spec(modules).it().should_contain('lancelot.specification')
+    heavy = ('asyncio', 'multiprocessing', 'lancelot.baselines',
+             'lancelot.benchmarking', 'lancelot.execution',
+             'lancelot.loadtesting')
+    spec = Spec([module for module in heavy if module in modules])
+    spec.it().should_be([])
+
 if __name__ == '__main__':
     verify()
\ No newline at end of file
@@ -1,9 +1,16 @@
 ''' Specs for core library classes / behaviours ''' 
 
+import os
+import subprocess
+import sys
+import time
+
 from lancelot import MockSpec, Spec, grouping, verifiable, verify
 from lancelot.comparators import Type
 from lancelot.verification import AllVerifiable, ConsoleListener, \
-                                  UnmetSpecification
+                                  MultiListener, UnmetSpecification, \
+                                  VerificationResult, format_traceback, \
+                                  qualified_name
 from lancelot.specs.simple_fns import dont_raise_index_error, number_one, \
                                       raise_index_error, string_abc
 
@@ -20,6 +27,20 @@ def silent_listener():
     ''' Descriptive fn: creates AllVerifiable instance with SilentListener '''
     return AllVerifiable(listener=SilentListener())
 
+class RecordingListener:
+    ''' AllVerifiable Listener that records the names of messages sent '''
+    def __init__(self):
+        ''' No messages recorded at instantiation '''
+        self.messages = []
+    def __getattr__(self, name):
+        ''' Record any message sent '''
+        return lambda *args: self.messages.append(name)
+
+def hang():
+    ''' Simple fn that never finishes of its own accord '''
+    while True:
+        time.sleep(0.01)
+
 def unmet_specification():
     ''' Simple fn that raises UnmetSpecification. ''' 
     raise UnmetSpecification()
@@ -223,5 +244,228 @@ def notification_behaviour():
                                        results),
         and_result = results)
 
+@verifiable
+def multiple_listeners_behaviour():
+    ''' every listener attached to AllVerifiable should be notified '''
+    first_listener = MockSpec(name='first')
+    second_listener = MockSpec(name='second')
+    all_verifiable = AllVerifiable([first_listener, second_listener])
+    results = {'total': 0, 'verified': 0, 'unverified': 0}
+    for listener in (first_listener, second_listener):
+        listener.all_verifiable_starting(all_verifiable)
+        listener.all_verifiable_ending(all_verifiable, results)
+        listener.start_collaborating()
+    spec = Spec(all_verifiable)
+    spec.verify().should_be(results)
+    Spec(first_listener).verify().should_not_raise(UnmetSpecification)
+    Spec(second_listener).verify().should_not_raise(UnmetSpecification)
+
+    spec = Spec(AllVerifiable(listener=SilentListener()))
+    spec.add_listener(SilentListener()).should_be(Type(AllVerifiable))
+    spec.add_listener(SilentListener()).should_be(Type(AllVerifiable))
+    spec.then(lambda: spec._spec_for._listener).should_be(Type(MultiListener))
+
+@grouping
+class AllVerifiableTimeoutBehaviour:
+    ''' A group of specifications for verifiable timeout behaviour '''
+
+    @verifiable
+    def should_abandon_hung_fn_and_continue(self):
+        ''' a fn taking longer than the default timeout should be abandoned,
+        and the remaining fns still verified '''
+        listener = RecordingListener()
+        spec = Spec(AllVerifiable(listener))
+        spec.when(spec.include(hang), spec.include(number_one))
+        spec.then(spec.verify(timeout=0.05))
+        spec.should_be({'total':2, 'verified':1, 'unverified':1})
+        Spec(listener.messages).it().should_be(
+            ['all_verifiable_starting', 
+             'verification_started', 'verification_timed_out',
+             'verification_started', 'specification_met',
+             'all_verifiable_ending'])
+
+    @verifiable
+    def should_use_verifiable_timeout(self):
+        ''' a timeout given to @verifiable should override the default '''
+        all_verifiable = silent_listener()
+        verifiable(timeout=0.05, collator=all_verifiable)(hang)
+        spec = Spec(all_verifiable)
+        spec.verify().should_be({'total':1, 'verified':0, 'unverified':1})
+
+    @verifiable
+    def should_use_verifiable_timeout_for_single_fn(self):
+        ''' verify(fn) should abandon fn after the timeout given to
+        @verifiable, as when verifying every fn '''
+        program = '\n'.join(['import time, lancelot',
+                              '@lancelot.verifiable(timeout=0.2)',
+                              'def slow():',
+                              '    time.sleep(0.5)',
+                              'print(lancelot.verify(slow))'])
+        environment = dict(os.environ,
+                           PYTHONPATH=os.pathsep.join(p for p in sys.path
+                                                      if p))
+        output = subprocess.run([sys.executable, '-c', program],
+                                env=environment, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL,
+                                universal_newlines=True).stdout
+        Spec(output).it().should_contain(
+            "{'total': 1, 'verified': 0, 'unverified': 1}")
+
+    @verifiable
+    def should_verify_fns_finishing_in_time(self):
+        ''' fns finishing within their timeout should verify as usual '''
+        spec = Spec(AllVerifiable, given=silent_listener)
+        spec.when(spec.include(number_one, timeout=5),
+                  spec.include(raise_index_error, timeout=5),
+                  spec.include(unmet_specification, timeout=5))
+        spec.then(spec.verify())
+        spec.should_be({'total':3, 'verified':1, 'unverified':2})
+
+class SetUpGroup:
+    ''' Simple grouping class with group setup and teardown '''
+    def __init__(self):
+        ''' Record setup, teardown and method calls '''
+        self.calls = []
+    def setup_grouping(self):
+        ''' Set up the group '''
+        self.calls.append('setup')
+    def teardown_grouping(self):
+        ''' Tear down the group '''
+        self.calls.append('teardown')
+    def first(self):
+        ''' Something verifiable '''
+        self.calls.append('first')
+    def second(self):
+        ''' Something else verifiable '''
+        self.calls.append('second')
+    def unmet(self):
+        ''' Something verifiable whose specification isn't met '''
+        self.calls.append('unmet')
+        raise UnmetSpecification('unmet by the method')
+
+def set_up_group(*methods):
+    ''' Descriptive fn: AllVerifiable including SetUpGroup methods, and
+    the grouping instance holding the record of calls '''
+    all_verifiable = silent_listener()
+    grouping(SetUpGroup, all_verifiable)
+    for method in methods:
+        verifiable(method, all_verifiable)
+    group = all_verifiable._fn_groups[SetUpGroup.first].__self__
+    return all_verifiable, group
+
+@grouping
+class GroupingLifecycleBehaviour:
+    ''' A group of specifications for grouping setup / teardown behaviour '''
+
+    @verifiable
+    def should_set_up_and_tear_down_once(self):
+        ''' setup_grouping() before the first, teardown_grouping() after the
+        last method verified '''
+        all_verifiable, group = set_up_group(SetUpGroup.first,
+                                             SetUpGroup.second)
+        spec = Spec(all_verifiable)
+        spec.verify().should_be({'total':2, 'verified':2, 'unverified':0})
+        Spec(group.calls).it().should_be(
+            ['setup', 'first', 'second', 'teardown'])
+
+    @verifiable
+    def should_tear_down_when_stopping_early(self):
+        ''' teardown_grouping() should be called even if the verification
+        run stops before the last method '''
+        all_verifiable, group = set_up_group(SetUpGroup.first,
+                                             SetUpGroup.second)
+        all_verifiable._fn_list.insert(1, raise_index_error)
+        spec = Spec(all_verifiable)
+        spec.verify(fail_fast=True).should_be(
+            {'total':3, 'verified':1, 'unverified':2, 'fail_fast':True})
+        Spec(group.calls).it().should_be(['setup', 'first', 'teardown'])
+
+    @verifiable
+    def should_report_failed_setup_for_each_method(self):
+        ''' a failing setup_grouping() should be an unexpected exception
+        for each method, which are then not called '''
+        all_verifiable, group = set_up_group(SetUpGroup.first,
+                                             SetUpGroup.second)
+        group.setup_grouping = raise_index_error
+        spec = Spec(all_verifiable)
+        spec.verify().should_be({'total':2, 'verified':0, 'unverified':2})
+        Spec(group.calls).it().should_be([])
+
+    @verifiable
+    def should_report_failed_teardown_with_failed_method(self):
+        ''' a failing teardown_grouping() should be reported after the
+        exception raised by the method verified before it '''
+        all_verifiable, group = set_up_group(SetUpGroup.unmet)
+        group.teardown_grouping = raise_index_error
+        unmet = all_verifiable._call(SetUpGroup.unmet)
+        Spec(unmet).it().should_be(Type(UnmetSpecification))
+        Spec(unmet.teardown_failure).it().should_be(Type(IndexError))
+        spec = Spec(''.join(format_traceback(unmet)))
+        spec.it().should_contain('unmet by the method')
+        spec.it().should_contain(
+            'Tearing down the grouping also raised: '
+            "IndexError('with message')")
+        spec.it().should_contain('raise_index_error')
+
+def results_of(all_verifiable, **kwds):
+    ''' Descriptive fn: the (name, status, exception) of each result
+    yielded by all_verifiable.verify_iter(**kwds), in order of name '''
+    return sorted((result.name, result.status, result.exception)
+                  for result in all_verifiable.verify_iter(**kwds))
+
+@grouping
+class VerifyIterBehaviour:
+    ''' A group of specifications for AllVerifiable.verify_iter()
+    behaviour '''
+
+    @verifiable
+    def should_yield_each_result(self):
+        ''' a result should be yielded for each function verified '''
+        all_verifiable = silent_listener()
+        all_verifiable.include(number_one).include(raise_index_error)
+        spec = Spec(results_of)
+        spec.results_of(all_verifiable).should_be(
+            [('lancelot.specs.simple_fns.number_one', 'met', None),
+             ('lancelot.specs.simple_fns.raise_index_error', 'unexpected',
+              'IndexError: with message')])
+
+    @verifiable
+    def should_yield_as_verified(self):
+        ''' each result should be yielded before the next fn is verified '''
+        all_verifiable = silent_listener()
+        listener = RecordingListener()
+        all_verifiable.add_listener(listener)
+        all_verifiable.include(number_one).include(raise_index_error)
+        results = all_verifiable.verify_iter()
+        next(results)
+        spec = Spec(listener.messages)
+        spec.it().should_be(['all_verifiable_starting',
+                             'verification_started', 'specification_met'])
+        results.close()
+        spec = Spec(lambda: listener.messages[-1])
+        spec.__call__().should_be('all_verifiable_ending')
+
+    @verifiable
+    def should_return_outcome(self):
+        ''' the outcome of the run should be the generator's return value '''
+        all_verifiable = silent_listener().include(number_one)
+        results = all_verifiable.verify_iter()
+        Spec(results).__next__().should_be(Type(VerificationResult))
+        try:
+            next(results)
+        except StopIteration as stop:
+            outcome = stop.value
+        spec = Spec(lambda: outcome)
+        spec.__call__().should_be({'total':1, 'verified':1, 'unverified':0})
+
+    @verifiable
+    def should_report_timeouts(self):
+        ''' a function that did not finish in time should be timed_out '''
+        all_verifiable = silent_listener().include(hang, timeout=0.05)
+        spec = Spec(results_of)
+        spec.results_of(all_verifiable).should_be(
+            [(qualified_name(hang), 'timed_out',
+              'VerificationTimeout: timed out after 0.05s')])
+
 if __name__ == '__main__':
     verify()
\ No newline at end of file
@@ -2,18 +2,27 @@
 Functionality for collating together verifiable functions and verifying them.
 
 Intended public interface:
- Classes: UnmetSpecification, ConsoleListener, AllVerifiable
+ Classes: UnmetSpecification, VerificationTimeout, WorkerCrashed,
+     ConsoleListener, MultiListener, AllVerifiable, VerificationResult
  Functions: verifiable [used as "@verifiable" in client code], verify(),
-     grouping [used as "@grouping" in Python3 client code]
+     verify_iter(), grouping [used as "@grouping" in Python3 client code],
+     qualified_name(), format_traceback()
  Variables: -
 
 Intended for internal use:
+ Classes: VerificationRun, GroupingLifecycle, ResultListener
+ Functions: running(), format_teardown_failure(), with_teardown_failure()
  Variables: ALL_VERIFIABLE (the default collation of verifiable functions)
 
 Copyright 2009 by the author(s). All rights reserved
 '''
 
+import collections
+import contextlib
+import contextvars
 import sys
+import threading
+import time
 import traceback
 import types
 
@@ -23,6 +32,16 @@ class UnmetSpecification(Exception):
     pass
 
 
+class VerificationTimeout(Exception):
+    ''' Indicator that a verifiable function did not finish in time '''
+    pass
+
+
+class WorkerCrashed(Exception):
+    ''' Indicator that a worker process died while verifying a function '''
+    pass
+
+
 class ConsoleListener:
     ''' Listener for verification messages that prints to the console '''
 
@@ -53,10 +72,7 @@ class ConsoleListener:
     def _exception_raised(self, msg, exception):
         ''' Print an exception msg and traceback to the console'''
         self._print(msg, to_console=self._stderr)
-        tb_items = traceback.extract_tb(exception.__traceback__)
-        if len(tb_items) > 1:
-            tb_items.pop(0)  # remove AllVerifiable._verify_fn
-        for item in traceback.format_list(tb_items):
+        for item in format_traceback(exception):
             self._print(item, end='', to_console=self._stderr)
 
     def unexpected_exception(self, verifiable_fn, exception):
@@ -64,6 +80,13 @@ class ConsoleListener:
         msg = 'Unexpected exception: %r' % exception
         self._exception_raised(msg, exception)
 
+    def verification_timed_out(self, verifiable_fn, timeout):
+        ''' A verification of a function did not finish within timeout
+        seconds, and has been abandoned '''
+        name = qualified_name(verifiable_fn)
+        msg = 'Timed out after %ss: %s' % (timeout, name)
+        self._print(msg, to_console=self._stderr)
+
     def all_verifiable_ending(self, all_verifiable, outcome):
         ''' A verification run is ending '''
         self._print('\n%s' % outcome, to_console=self._stdout)
@@ -74,26 +97,331 @@ class ConsoleListener:
             console = to_console
         else:
             console = self._stdout
-        print >>console, msg
+        print(msg, end=end, file=console)
+
+
+class MultiListener:
+    ''' Listener that forwards verification messages to several listeners,
+    e.g. to the console, a results file and a CI report in the same run '''
+
+    def __init__(self, *listeners):
+        ''' Messages are forwarded to the listeners in the order given '''
+        self._listeners = list(listeners)
+
+    def add(self, listener):
+        ''' Forward messages to another listener as well '''
+        self._listeners.append(listener)
+        return self
+
+    def __getattr__(self, name):
+        ''' Return a callable forwarding the named message to all listeners '''
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def forward(*args):
+            ''' Send the message on to each listener in turn '''
+            for listener in self._listeners:
+                getattr(listener, name)(*args)
+        return forward
+
+
+VerificationResult = collections.namedtuple('VerificationResult',
+                                            'name status duration exception')
+VerificationResult.__doc__ = ''' The result of verifying one function:
+its qualified name, status ('met', 'unmet', 'unexpected' or 'timed_out'),
+duration in seconds and exception summary (e.g. "IndexError: empty"),
+which is None if the specification was met '''
+
+
+class ResultListener:
+    ''' Listener that keeps a VerificationResult for each function verified,
+    until they are taken by verify_iter() '''
+
+    def __init__(self, all_verifiable):
+        ''' Durations reported by all_verifiable (e.g. measured in worker
+        processes) are preferred to those measured by this listener '''
+        self._all_verifiable = all_verifiable
+        self._started = {}
+        self.results = collections.deque()
+
+    def all_verifiable_starting(self, all_verifiable):
+        ''' A verification run is starting '''
+        pass
+
+    def verification_started(self, verifiable_fn):
+        ''' A verification of a single function is starting '''
+        self._started[verifiable_fn] = time.perf_counter()
+
+    def specification_met(self, verifiable_fn):
+        ''' A verification of a function has completed successfully '''
+        self._result(verifiable_fn, 'met', None)
+
+    def specification_unmet(self, verifiable_fn, unmet):
+        ''' A verification of a function has completed unsuccessfully '''
+        self._result(verifiable_fn, 'unmet', _summary(unmet))
+
+    def unexpected_exception(self, verifiable_fn, exception):
+        ''' An unexpected exception was raised from a function '''
+        self._result(verifiable_fn, 'unexpected', _summary(exception))
+
+    def verification_timed_out(self, verifiable_fn, timeout):
+        ''' A verification of a function did not finish in time '''
+        summary = 'VerificationTimeout: timed out after %ss' % timeout
+        self._result(verifiable_fn, 'timed_out', summary)
+
+    def all_verifiable_ending(self, all_verifiable, outcome):
+        ''' A verification run is ending '''
+        pass
+
+    def _result(self, verifiable_fn, status, summary):
+        ''' Keep the result of verifying a function '''
+        started = self._started.pop(verifiable_fn, None)
+        duration = self._all_verifiable.duration_of(verifiable_fn)
+        if duration is None:
+            duration = 0.0 if started is None \
+                else time.perf_counter() - started
+        self.results.append(VerificationResult(qualified_name(verifiable_fn),
+                                               status, duration, summary))
+
+
+def _summary(exception):
+    ''' A one line summary of an exception, e.g. "IndexError: empty" '''
+    message = str(exception).strip().split('\n')[0]
+    name = type(exception).__name__
+    if message:
+        return '%s: %s' % (name, message)
+    return name
+
+
+def qualified_name(verifiable_fn):
+    ''' The module-qualified name of a verifiable function, for reports '''
+    name = getattr(verifiable_fn, '__qualname__', None) \
+        or getattr(verifiable_fn, '__name__', None) \
+        or repr(verifiable_fn)
+    module = getattr(verifiable_fn, '__module__', None)
+    if module:
+        return '%s.%s' % (module, name)
+    return name
+
+
+def format_traceback(exception):
+    ''' Formatted traceback lines for an exception raised during
+    verification, excluding the AllVerifiable.verify_fn frames '''
+    remote_traceback = getattr(exception, 'remote_traceback', None)
+    if remote_traceback is not None:  # raised in another process
+        lines = list(remote_traceback)
+    else:
+        tb_items = traceback.extract_tb(exception.__traceback__)
+        while len(tb_items) > 1 and tb_items[0].filename == __file__:
+            tb_items.pop(0)  # remove AllVerifiable.verify_fn and helpers
+        lines = traceback.format_list(tb_items)
+    teardown_failure = getattr(exception, 'teardown_failure', None)
+    if teardown_failure is not None:
+        lines.extend(format_teardown_failure(teardown_failure))
+    return lines
+
+
+def format_teardown_failure(teardown_failure):
+    ''' Formatted lines reporting an exception raised tearing down a group
+    after one of its methods had raised an exception itself '''
+    lines = ['Tearing down the grouping also raised: %r\n' % teardown_failure]
+    return lines + format_traceback(teardown_failure)
+
+
+def with_teardown_failure(exception, teardown_failure):
+    ''' The exception raised by a grouped method, with any exception then
+    raised tearing down its group attached (as its teardown_failure, which
+    format_traceback() reports after the method's own traceback) '''
+    if teardown_failure is not None:
+        exception.teardown_failure = teardown_failure
+    return exception
+
+
+class VerificationRun:
+    ''' A single run of AllVerifiable.verify(), collecting statistics that
+    are added to the outcome of the run '''
+
+    def __init__(self, within=None):
+        ''' No statistics at instantiation. A run collecting the statistics
+        of one function (e.g. called by an executor) within another run
+        shares that run's scope, identifying state built once per run. '''
+        self._statistics = {}
+        self._lock = threading.Lock()
+        self.scope = self if within is None else within.scope
+
+    def add_statistic(self, name, amount):
+        ''' Add an amount to a named statistic '''
+        with self._lock:
+            self._statistics[name] = self._statistics.get(name, 0) + amount
+
+    def statistics(self):
+        ''' The statistics collected so far '''
+        with self._lock:
+            return dict(self._statistics)
+
+
+class GroupingLifecycle:
+    ''' Runs the optional setup_grouping() and teardown_grouping() methods
+    of @grouping instances: setup lazily before the first of the group's
+    methods to be verified, and teardown after the last of them, so that
+    resources shared by the group are only built once '''
+
+    def __init__(self, fn_groups, verifiable_fns):
+        ''' Methods in fn_groups (as in AllVerifiable) are going to be
+        verified if they are in verifiable_fns '''
+        self._lock = threading.Lock()
+        self._remaining = {}  # id(group) -> {verifiable fn or hold...}
+        self._set_up = {}
+        self._is_frozen = False
+        for verifiable_fn in verifiable_fns:
+            if verifiable_fn in fn_groups:
+                key = id(fn_groups[verifiable_fn].__self__)
+                self._remaining.setdefault(key, set()).add(verifiable_fn)
+
+    def set_up(self, group):
+        ''' Set up a group unless it already has been. Re-raises the
+        exception from setup_grouping() if setting up the group failed. '''
+        key = id(group)
+        with self._lock:
+            if key not in self._set_up and not self._is_frozen:
+                self._set_up[key] = (group, self._hook(group, 'setup'))
+            if key not in self._set_up:
+                return
+            failure = self._set_up[key][1]
+        if failure is not None:
+            raise failure
+
+    def freeze(self):
+        ''' Stop setting up or tearing down any more groups: used in worker
+        processes forked after their groups have been set up '''
+        self._is_frozen = True
+
+    def set_up_failure(self, group):
+        ''' The exception raised setting up a group, if any '''
+        with self._lock:
+            return self._set_up.get(id(group), (group, None))[1]
+
+    def finished(self, group, verifiable_fn):
+        ''' One of the group's methods, verifiable_fn, has been verified
+        (each counts once, however often it is verified). Tear the group
+        down after the last of them, returning any exception raised. '''
+        return self._done(group, verifiable_fn)
+
+    @contextlib.contextmanager
+    def repeating(self, group):
+        ''' Within a with statement, keep a group set up (once it has
+        been), e.g. while its methods are verified repeatedly, tearing it
+        down at the end if all its methods have been verified by then. Any
+        exception raised tearing it down is raised at the end (attached to
+        any exception raised within the with statement). '''
+        hold = object()
+        with self._lock:
+            self._remaining.setdefault(id(group), set()).add(hold)
+        try:
+            yield
+        except BaseException as exception:
+            teardown_failure = self._done(group, hold)
+            raise with_teardown_failure(exception, teardown_failure)
+        teardown_failure = self._done(group, hold)
+        if teardown_failure is not None:
+            raise teardown_failure
+
+    def _done(self, group, member):
+        ''' Discard a member of the group's remaining methods (and holds),
+        tearing it down if none remain, returning any exception raised '''
+        key = id(group)
+        if self._is_frozen:
+            return None
+        with self._lock:
+            remaining = self._remaining.setdefault(key, set())
+            remaining.discard(member)
+            if remaining or key not in self._set_up:
+                return None
+            failure = self._set_up.pop(key)[1]
+        if failure is not None:
+            return None
+        return self._hook(group, 'teardown')
+
+    def close(self):
+        ''' Tear down any groups still set up (e.g. when a verification
+        run stops early), returning [(teardown method, exception)...] '''
+        with self._lock:
+            set_up, self._set_up = self._set_up, {}
+        failures = []
+        for group, failure in set_up.values():
+            if failure is None:
+                failure = self._hook(group, 'teardown')
+                if failure is not None:
+                    failures.append((group.teardown_grouping, failure))
+        return failures
+
+    def _hook(self, group, stage):
+        ''' Call a group's setup_grouping() or teardown_grouping() method,
+        if it has one, returning any exception raised '''
+        hook = getattr(group, '%s_grouping' % stage, None)
+        if hook is None:
+            return None
+        try:
+            hook()
+        except Exception as exception:
+            return exception
+        return None
+
+
+_RUNNING = contextvars.ContextVar('running verifiable', default=None)
+
+
+def running():
+    ''' The (run, verifiable_fn, grouping_class) being verified currently,
+    or None. run is None if verify_fn() was called outside of verify(),
+    and grouping_class is None if the function is not in a grouping. '''
+    return _RUNNING.get()
 
 
 class AllVerifiable:
     ''' A collation of verifiable functions and the ability to verify them '''
 
     def __init__(self, listener=ConsoleListener()):
-        ''' Events notified by this instance are sent to the listener '''
+        ''' Events notified by this instance are sent to the listener.
+        A list or tuple of listeners may be given to notify them all. '''
         self._fn_list = []
         self._fn_groups = {}
+        self._timeouts = {}
+        self._run = None
+        self._groupings = None
+        self._executor = None
+        self._durations = {}
+        self.set_listener(listener)
+
+    def add_listener(self, listener):
+        ''' Send notified events to another listener as well '''
+        if not isinstance(self._listener, MultiListener):
+            self._listener = MultiListener(self._listener)
+        self._listener.add(listener)
+        return self
+
+    def set_listener(self, listener):
+        ''' Send notified events to listener, instead of those given so far.
+        A list or tuple of listeners may be given to notify them all. '''
+        if isinstance(listener, (list, tuple)):
+            listener = MultiListener(*listener)
         self._listener = listener
+        return self
 
-    def include(self, verifiable_fn):
-        ''' Add a verifiable function to the collation '''
+    def include(self, verifiable_fn, timeout=None):
+        ''' Add a verifiable function to the collation. If a timeout (in
+        seconds) is specified it overrides any default timeout in verify() '''
         if verifiable_fn not in self._fn_list:
             self._fn_list.append(verifiable_fn)
+        if timeout is not None:
+            self._timeouts[verifiable_fn] = timeout
         return self
 
     def include_grouping(self, grouping_class):
-        ''' Include a group of verifiable functions as bound class methods '''
+        ''' Include a group of verifiable functions as bound class methods.
+        The grouping class may define setup_grouping() and
+        teardown_grouping() methods, which are called once per verification
+        run before the first and after the last of its methods verified. '''
         class_attrs = grouping_class.__dict__.values()
         functions = [item
                      for item in class_attrs
@@ -106,51 +434,259 @@ class AllVerifiable:
         ''' The number of verifiable functions in the collation '''
         return len(self._fn_list)
 
-    def verify(self, fail_fast=False):
+    def timeout_for(self, verifiable_fn, default=None):
+        ''' The timeout for a verifiable function, or default if none '''
+        return self._timeouts.get(verifiable_fn, default)
+
+    def grouping_of(self, verifiable_fn):
+        ''' The grouping instance verifiable_fn is a method of, or None '''
+        bound_method = self._fn_groups.get(verifiable_fn)
+        if bound_method is None:
+            return None
+        return bound_method.__self__
+
+    def executor(self):
+        ''' The executor of the verification run in progress, or None (also
+        when the functions are verified in turn, without one) '''
+        return self._executor
+
+    def groupings(self):
+        ''' The GroupingLifecycle of the current verification run, or a new
+        one for the given verifiable functions outside of a run '''
+        if self._groupings is None:
+            return GroupingLifecycle(self._fn_groups, self._fn_list)
+        return self._groupings
+
+    def verify(self, fail_fast=False, timeout=None, executor=None):
         ''' Verify all the verifiable functions in the collation.
-        Entry point for usage in module verify() function. '''
+        Entry point for usage in module verify() function.
+        If a default timeout (in seconds) is specified, then each function
+        that has no timeout of its own is abandoned after that long.
+        If an executor is specified (see lancelot.execution) then it is used
+        to verify the functions, e.g. each in its own process. '''
+        steps = self._verification(fail_fast, timeout, executor)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def verify_iter(self, fail_fast=False, timeout=None, executor=None):
+        ''' Verify all the verifiable functions in the collation, as for
+        verify(), yielding a VerificationResult for each as soon as it has
+        been verified. The outcome verify() would return is the return value
+        of the generator. Closing the generator early ends the run, as if
+        fail_fast had stopped it. '''
+        collector = ResultListener(self)
+        listener = self._listener
+        self._listener = MultiListener(listener, collector)
+        steps = self._verification(fail_fast, timeout, executor)
+        try:
+            while True:
+                try:
+                    next(steps)
+                except StopIteration as stop:
+                    outcome = stop.value
+                    break
+                while collector.results:
+                    yield collector.results.popleft()
+            while collector.results:
+                yield collector.results.popleft()
+        finally:
+            steps.close()
+            self._listener = listener
+        return outcome
+
+    def _verification(self, fail_fast, timeout, executor):
+        ''' Generator verifying the functions in the collation, yielding
+        after each one and returning the outcome. If closed early, the run
+        is ended (without yielding again) as if it had failed fast. '''
         verified = 0
-        self._listener.all_verifiable_starting(self)
-        for verifiable_fn in self._fn_list:
-            fn_verified = self.verify_fn(verifiable_fn)
-            verified += fn_verified
-            if fail_fast and not fn_verified:
-                break
+        self._run = VerificationRun()
+        self._groupings = GroupingLifecycle(self._fn_groups, self._fn_list)
+        self._executor = executor
+        if executor is None:
+            results = (self.verify_fn(verifiable_fn, timeout)
+                       for verifiable_fn in self._fn_list)
+        else:
+            results = executor.verify_each(self, self._fn_list, timeout)
+        try:
+            self._listener.all_verifiable_starting(self)
+            for fn_verified in results:
+                verified += fn_verified
+                if fail_fast and not fn_verified:
+                    break
+                yield
+        except GeneratorExit:
+            pass
+        finally:
+            if hasattr(results, 'close'):
+                results.close()
+        for teardown, exception in self._groupings.close():
+            self._listener.unexpected_exception(teardown, exception)
+        self._groupings = None
+        self._executor = None
         outcome = {'total': self.total(),
                    'verified': verified,
                    'unverified': self.total() - verified}
         if fail_fast:
             outcome['fail_fast'] = True
+        outcome.update(self._run.statistics())
+        self._run = None
         self._listener.all_verifiable_ending(self, outcome)
         return outcome
 
-    def verify_fn(self, verifiable_fn):
-        ''' Verify a single verifiable function (for internal use). '''
+    def verify_fn(self, verifiable_fn, timeout=None):
+        ''' Verify a single verifiable function (for internal use).
+        If a timeout applies the function is run under a watchdog, and
+        abandoned if it has not finished within timeout seconds. '''
+        timeout = self.timeout_for(verifiable_fn, timeout)
+        self.report_started(verifiable_fn)
+        if timeout is None:
+            exception = self._call(verifiable_fn)
+            return self.report_outcome(verifiable_fn, exception)
+        outcome = self._call_with_watchdog(verifiable_fn, timeout)
+        if not outcome:
+            return self.report_outcome(verifiable_fn, timed_out=timeout)
+        return self.report_outcome(verifiable_fn, outcome[0])
+
+    def call_fn(self, verifiable_fn, timeout=None):
+        ''' Call a verifiable function without notifying the listener
+        (for internal use by executors running functions in workers, or
+        in threads). If timeout is specified the function is abandoned
+        after that long, and VerificationTimeout returned as its exception.
+        Returns (exception raised or None, statistics collected). '''
+        run = VerificationRun(within=self._run)
+        if timeout is None:
+            return self._call(verifiable_fn, run), run.statistics()
+        outcome = self._call_with_watchdog(verifiable_fn, timeout, run)
+        if not outcome:
+            outcome = [VerificationTimeout('timed out after %ss' % timeout)]
+        return outcome[0], run.statistics()
+
+    def report_started(self, verifiable_fn):
+        ''' Notify the listener that verifying a function is starting '''
         self._listener.verification_started(verifiable_fn)
+
+    def add_statistics(self, statistics):
+        ''' Add statistics (e.g. collected in a worker) to the current run '''
+        if statistics and self._run is not None:
+            for name, amount in statistics.items():
+                self._run.add_statistic(name, amount)
+
+    def duration_of(self, verifiable_fn):
+        ''' The duration reported with the outcome of verifying a function,
+        while its listener is being notified, or None if not reported '''
+        return self._durations.get(verifiable_fn)
+
+    def report_outcome(self, verifiable_fn, exception=None, timed_out=None,
+                       statistics=None, duration=None):
+        ''' Notify the listener of the outcome of verifying a function:
+        the exception raised if any, or the timeout if it did not finish.
+        Any statistics collected are added to those of the current run, and
+        any duration measured (e.g. in a worker) is given by duration_of().
+        Returns 1 if the function was verified, otherwise 0. '''
+        self.add_statistics(statistics)
+        if duration is None:
+            return self._notify_outcome(verifiable_fn, exception, timed_out)
+        self._durations[verifiable_fn] = duration
         try:
-            if verifiable_fn in self._fn_groups:
-                self._fn_groups[verifiable_fn]()
-            else:
-                verifiable_fn()
+            return self._notify_outcome(verifiable_fn, exception, timed_out)
+        finally:
+            del self._durations[verifiable_fn]
+
+    def _notify_outcome(self, verifiable_fn, exception, timed_out):
+        ''' Notify the listener of the outcome of verifying a function '''
+        if timed_out is not None:
+            self._listener.verification_timed_out(verifiable_fn, timed_out)
+            return 0
+        if exception is None:
             self._listener.specification_met(verifiable_fn)
             return 1
-        except UnmetSpecification as unmet:
-            self._listener.specification_unmet(verifiable_fn, unmet)
-            return 0
-        except Exception as exception:
+        if isinstance(exception, UnmetSpecification):
+            self._listener.specification_unmet(verifiable_fn, exception)
+        else:
             self._listener.unexpected_exception(verifiable_fn, exception)
-            return 0
+        return 0
+
+    def _call(self, verifiable_fn, run=None):
+        ''' Call a verifiable function, returning any exception raised.
+        Statistics are collected in run, by default the current run. '''
+        bound_method = self._fn_groups.get(verifiable_fn)
+        grouping_class = None
+        if bound_method is not None:
+            grouping_class = type(bound_method.__self__)
+        token = _RUNNING.set((run or self._run, verifiable_fn,
+                              grouping_class))
+        try:
+            if bound_method is not None:
+                self._call_grouped(verifiable_fn, bound_method)
+            else:
+                verifiable_fn()
+        except Exception as exception:
+            return exception
+        finally:
+            _RUNNING.reset(token)
+        return None
+
+    def _call_grouped(self, verifiable_fn, bound_method):
+        ''' Call a grouped method, setting up and tearing down its group '''
+        groupings = self._groupings
+        if groupings is None:  # not within verify()
+            groupings = GroupingLifecycle(self._fn_groups, [verifiable_fn])
+        group = bound_method.__self__
+        try:
+            groupings.set_up(group)
+            bound_method()
+        except BaseException as exception:
+            teardown_failure = groupings.finished(group, verifiable_fn)
+            raise with_teardown_failure(exception, teardown_failure)
+        teardown_failure = groupings.finished(group, verifiable_fn)
+        if teardown_failure is not None:
+            raise teardown_failure
+
+    def _call_with_watchdog(self, verifiable_fn, timeout, run=None):
+        ''' Call a verifiable function in a separate thread, returning
+        [exception raised or None], or [] if it did not finish in time '''
+        outcome = []
+        worker = threading.Thread(
+            target=lambda: outcome.append(self._call(verifiable_fn, run)),
+            name='lancelot-verify %s' % qualified_name(verifiable_fn),
+            daemon=True)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            _interrupt(worker)
+            return []
+        return outcome
+
+
+def _interrupt(thread):
+    ''' Raise VerificationTimeout within an abandoned thread. This only takes
+    effect when the thread next executes Python code, so a thread blocked in
+    a system call is simply left to run on as a daemon. '''
+    try:
+        import ctypes
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+            ctypes.c_ulong(thread.ident),
+            ctypes.py_object(VerificationTimeout))
+    except (ImportError, AttributeError):
+        pass
 
 
 ALL_VERIFIABLE = AllVerifiable()  # Default collection to verify
 
 
-def verifiable(decorated_fn, collator=ALL_VERIFIABLE):
-    ''' Function decorator: collates functions for later verification '''
+def verifiable(decorated_fn=None, collator=ALL_VERIFIABLE, timeout=None):
+    ''' Function decorator: collates functions for later verification.
+    Used as @verifiable, or as @verifiable(timeout=seconds) to abandon the
+    verification of the function if it has not finished in that time. '''
+    if decorated_fn is None:
+        return lambda fn: verifiable(fn, collator, timeout)
     if not hasattr(decorated_fn, '__call__'):
         msg = '%r is not callable, so it cannot be verifiable'
         raise TypeError(msg % decorated_fn)
-    collator.include(decorated_fn)
+    collator.include(decorated_fn, timeout)
     return decorated_fn
 
 
@@ -163,11 +699,38 @@ def grouping(decorated_class, collator=ALL_VERIFIABLE):
     return decorated_class
 
 
-def verify(single_verifiable_fn=None, fail_fast=False):
+def _verifying_single(verifiable_fn):
+    ''' A collation of a single function, with any timeout it was declared
+    with by @verifiable(timeout=seconds) '''
+    timeout = ALL_VERIFIABLE.timeout_for(verifiable_fn)
+    return AllVerifiable().include(verifiable_fn, timeout)
+
+
+def verify_iter(single_verifiable_fn=None, fail_fast=False, timeout=None,
+                executor=None):
+    ''' Verify either a single specified function or the default collection,
+    as for verify(), yielding a VerificationResult for each function as
+    soon as it has been verified, e.g.
+        for result in verify_iter(executor=ProcessPoolExecution()):
+            show_progress(result.name, result.status, result.duration) '''
+    if single_verifiable_fn:
+        all_verifiable = _verifying_single(single_verifiable_fn)
+        return all_verifiable.verify_iter(fail_fast, timeout, executor)
+    else:
+        return ALL_VERIFIABLE.verify_iter(fail_fast, timeout, executor)
+
+
+def verify(single_verifiable_fn=None, fail_fast=False, timeout=None,
+           executor=None):
     ''' Verify either a single specified function or the default collection.
     If fail_fast is True then the verification run will stop as soon as
-    the first unmet specification or unexpected exception occurs.'''
+    the first unmet specification or unexpected exception occurs.
+    If timeout is specified then any function taking longer than timeout
+    seconds (or than the timeout it was declared with, if any) is
+    abandoned, and the verification run continues.
+    If executor is specified then it is used to verify the functions.'''
     if single_verifiable_fn:
-        return AllVerifiable().include(single_verifiable_fn).verify(fail_fast)
+        all_verifiable = _verifying_single(single_verifiable_fn)
+        return all_verifiable.verify(fail_fast, timeout, executor)
     else:
-        return ALL_VERIFIABLE.verify(fail_fast)
+        return ALL_VERIFIABLE.verify(fail_fast, timeout, executor)